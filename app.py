@@ -5,6 +5,9 @@ import os
 import logging
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
+from utils.text_utils import register_sqlite_functions
+from utils.query_counter import install_query_budget
+from services.chat_provider import get_chat_client
 
 # Cargar variables de entorno de forma robusta
 try:
@@ -40,7 +43,7 @@ except ImportError:
 
 
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
     app.secret_key = 'rdeart_super_secret_key_2025'
     # Ensure instance folder exists and use absolute DB path to avoid SQLite open errors
@@ -50,12 +53,86 @@ def create_app():
     db_uri = 'sqlite:///' + os.path.abspath(db_file).replace('\\', '/')
     app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Max SQL statements per request; exceeding it fails the request in debug (see utils/query_counter.py)
+    app.config['SQL_QUERY_BUDGET'] = os.environ.get('SQL_QUERY_BUDGET')
+    # Content-addressed media store (see services/media_service.py)
+    app.config['MEDIA_ROOT'] = os.environ.get('MEDIA_ROOT') or os.path.join(instance_dir, 'media')
+    # Origin added to /media URLs in API responses (the DB stores them relative); default: the request's host
+    app.config['MEDIA_BASE_URL'] = os.environ.get('MEDIA_BASE_URL')
+    # Largest PDF accepted by /article/<id>/upload_pdf (bytes)
+    app.config['MAX_PDF_UPLOAD_BYTES'] = int(os.environ.get('MAX_PDF_UPLOAD_BYTES', 50 * 1024 * 1024))
+    # PDF render process pool (see services/render_service.py); the memory cap and the timeout
+    # apply to each worker process and job
+    app.config['RENDER_WORKERS'] = int(os.environ.get('RENDER_WORKERS') or os.cpu_count() or 1)
+    app.config['RENDER_TIMEOUT_SECONDS'] = float(os.environ.get('RENDER_TIMEOUT_SECONDS', 60))
+    app.config['RENDER_MEMORY_MB'] = int(os.environ.get('RENDER_MEMORY_MB', 1024))
+    # Pooled upstream HTTP client for /proxy and remote PDFs (see services/http_client.py)
+    app.config['UPSTREAM_CONNECT_TIMEOUT'] = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 5))
+    app.config['UPSTREAM_READ_TIMEOUT'] = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 30))
+    app.config['UPSTREAM_POOL_SIZE'] = int(os.environ.get('UPSTREAM_POOL_SIZE', 10))
+    app.config['UPSTREAM_MAX_HOSTS'] = int(os.environ.get('UPSTREAM_MAX_HOSTS', 20))
+    # Make the white background of uploaded profile photos transparent (see utils/image_utils.py)
+    app.config['AVATAR_REMOVE_WHITE_BG'] = os.environ.get('AVATAR_REMOVE_WHITE_BG', '0') == '1'
+    app.config['AVATAR_WHITE_BG_THRESHOLD'] = int(os.environ.get('AVATAR_WHITE_BG_THRESHOLD', 240))
+    app.config['AVATAR_WHITE_BG_SOFTNESS'] = int(os.environ.get('AVATAR_WHITE_BG_SOFTNESS', 24))
+    # Threads serving the Flask app under asgi.py (a2wsgi's pool); behind another WSGI server, its thread count
+    app.config['WSGI_THREADS'] = int(os.environ.get('WSGI_THREADS', 16))
+    # Concurrent upstream connections of the asyncio /proxy handler (see asgi.py)
+    app.config['ASYNC_PROXY_MAX_CONNECTIONS'] = int(os.environ.get('ASYNC_PROXY_MAX_CONNECTIONS', 100))
+    # Google Drive link resolutions cache (see services/drive_resolver.py)
+    app.config['DRIVE_RESOLVE_TTL_SECONDS'] = float(os.environ.get('DRIVE_RESOLVE_TTL_SECONDS', 86400))
+    app.config['DRIVE_RESOLVE_FAILURE_TTL_SECONDS'] = float(os.environ.get('DRIVE_RESOLVE_FAILURE_TTL_SECONDS', 300))
+    # Disk cache for /proxy (see services/proxy_cache.py); PROXY_CACHE_MAX_BYTES=0 disables it
+    app.config['PROXY_CACHE_DIR'] = os.environ.get('PROXY_CACHE_DIR') or os.path.join(instance_dir, 'proxy_cache')
+    app.config['PROXY_CACHE_MAX_BYTES'] = int(os.environ.get('PROXY_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+    app.config['PROXY_CACHE_MAX_OBJECT_BYTES'] = int(os.environ.get('PROXY_CACHE_MAX_OBJECT_BYTES', 200 * 1024 * 1024))
+    app.config['PROXY_CACHE_TTL_SECONDS'] = float(os.environ.get('PROXY_CACHE_TTL_SECONDS', 300))
+    # Chat provider client, created once per process (see services/chat_provider.py)
+    app.config['CHAT_MODEL_URL'] = os.environ.get('CHAT_MODEL_URL') or 'https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash'
+    app.config['CHAT_CONNECT_TIMEOUT'] = float(os.environ.get('CHAT_CONNECT_TIMEOUT', 10))
+    app.config['CHAT_READ_TIMEOUT'] = float(os.environ.get('CHAT_READ_TIMEOUT', 60))
+    app.config['CHAT_POOL_SIZE'] = int(os.environ.get('CHAT_POOL_SIZE', 10))
+    app.config['CHAT_MAX_RETRIES'] = int(os.environ.get('CHAT_MAX_RETRIES', 2))
+    app.config['CHAT_RETRY_BACKOFF'] = float(os.environ.get('CHAT_RETRY_BACKOFF', 0.5))
+    # Longest Retry-After from the provider that a retry waits for (seconds)
+    app.config['CHAT_RETRY_AFTER_MAX'] = float(os.environ.get('CHAT_RETRY_AFTER_MAX', 10))
+    # Commercial chatbot: send the core blocks of the system instruction plus only the top-k
+    # relevant sections (see services/knowledge_retrieval.py); 0 sends the whole instruction
+    app.config['CHAT_RETRIEVAL_TOP_K'] = int(os.environ.get('CHAT_RETRIEVAL_TOP_K', 6))
+    app.config['CHAT_CORE_BLOCKS'] = [int(n) for n in os.environ.get('CHAT_CORE_BLOCKS', '1,3,5').split(',') if n.strip()]
+    # Server-side chat history sent with each turn (estimated tokens); older turns are summarized
+    # (see services/conversation_service.py)
+    app.config['CHAT_HISTORY_TOKEN_BUDGET'] = int(os.environ.get('CHAT_HISTORY_TOKEN_BUDGET', 3000))
+    app.config['CHAT_SUMMARY_MAX_TOKENS'] = int(os.environ.get('CHAT_SUMMARY_MAX_TOKENS', 400))
+    # In-memory cache of chat replies (see services/chat_cache.py); CHAT_CACHE_TTL_SECONDS=0 disables it
+    app.config['CHAT_CACHE_TTL_SECONDS'] = float(os.environ.get('CHAT_CACHE_TTL_SECONDS', 3600))
+    app.config['CHAT_CACHE_MAX_ENTRIES'] = int(os.environ.get('CHAT_CACHE_MAX_ENTRIES', 1000))
+    # Chat requests in flight at once (by default half the WSGI threads); beyond these limits they
+    # get 429 + Retry-After (see services/chat_limiter.py)
+    app.config['CHAT_MAX_CONCURRENT'] = int(os.environ.get('CHAT_MAX_CONCURRENT') or max(1, app.config['WSGI_THREADS'] // 2))
+    app.config['CHAT_MAX_PER_USER'] = int(os.environ.get('CHAT_MAX_PER_USER', 2))
+    app.config['CHAT_RETRY_AFTER_SECONDS'] = int(os.environ.get('CHAT_RETRY_AFTER_SECONDS', 5))
+    # Chatbot system instructions, loaded at startup and reloaded when their files change
+    # (see services/prompt_registry.py); without a file, KAT_SYSTEM_INSTRUCTION or the built-in text
+    app.config['CHAT_PROMPT_FILES'] = {
+        name: os.path.join(app.root_path, path)
+        for name, path in (('comercial', os.environ.get('KAT_SYSTEM_INSTRUCTION_FILE')),
+                           ('training', os.environ.get('TRAINING_SYSTEM_INSTRUCTION_FILE')))
+        if path
+    }
+    app.config['CHAT_PROMPT_RELOAD_SECONDS'] = float(os.environ.get('CHAT_PROMPT_RELOAD_SECONDS', 2))
+    # Thumbnail jobs the background worker runs at once
+    app.config['THUMBNAIL_CONCURRENCY'] = int(os.environ.get('THUMBNAIL_CONCURRENCY') or app.config['RENDER_WORKERS'])
     
     # Cookie configuration for CORS
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
     app.config['SESSION_COOKIE_SECURE'] = False  # False para HTTP en desarrollo
     app.config['SESSION_COOKIE_HTTPONLY'] = True
+    # Overrides for the test suite (tests/conftest.py): a throwaway DB, media root, ...
+    if test_config:
+        app.config.update(test_config)
 
+    register_sqlite_functions()
     db.init_app(app)
 
     CORS(app,
@@ -120,6 +197,26 @@ def create_app():
                     print('[startup] photo_url missing, attempting ALTER TABLE to add it')
                     db.session.execute(text("ALTER TABLE user ADD COLUMN photo_url TEXT;"))
                     db.session.commit()
+            # Precomputed excerpt/reading time for ?view=summary listings
+            if 'excerpt' not in columns:
+                print('[startup] excerpt column missing, attempting ALTER TABLE to add it')
+                db.session.execute(text("ALTER TABLE article ADD COLUMN excerpt TEXT;"))
+                db.session.commit()
+            if 'reading_time' not in columns:
+                print('[startup] reading_time column missing, attempting ALTER TABLE to add it')
+                db.session.execute(text("ALTER TABLE article ADD COLUMN reading_time INTEGER;"))
+                db.session.commit()
+            if 'image_renditions' not in columns:
+                print('[startup] image_renditions column missing, attempting ALTER TABLE to add it')
+                db.session.execute(text("ALTER TABLE article ADD COLUMN image_renditions TEXT;"))
+                db.session.commit()
+            # Keyset pagination of GET /articles walks (created_at, id)
+            db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_article_created_at_id ON article (created_at, id);"))
+            db.session.commit()
+            from services.article_service import backfill_article_summaries
+            filled = backfill_article_summaries()
+            if filled:
+                print(f'[startup] computed excerpt/reading_time for {filled} articles')
         except SQLAlchemyError:
             # If anything fails here, avoid crashing the app on startup but log error
             logging.exception('[startup] Error ensuring DB columns')
@@ -127,12 +224,25 @@ def create_app():
                 db.session.rollback()
             except Exception:
                 pass
+        # Full-text search index for ?q= (populated on first run for existing DBs)
+        try:
+            from services.search_service import ensure_search_index, rebuild_search_index
+            if ensure_search_index():
+                print(f'[startup] article_fts created, indexed {rebuild_search_index()} articles')
+        except SQLAlchemyError:
+            logging.exception('[startup] Error ensuring full-text search index (search will fall back to scanning)')
+            db.session.rollback()
 
 
-    from routes import auth_roustes, article_routes, chat_routes
+    from routes import auth_roustes, article_routes, chat_routes, media_routes
     app.register_blueprint(auth_roustes.bp)
     app.register_blueprint(article_routes.bp)
     app.register_blueprint(chat_routes.bp)
+    app.register_blueprint(media_routes.bp)
+    with app.app_context():
+        chat_routes.prompt_registry()
+        get_chat_client()  # a missing GOOGLE_API_KEY is logged now, not on the first chat
+    install_query_budget(app)
 
     # Root route to serve the chat UI template
     @app.route('/')
@@ -0,0 +1,53 @@
+"""ASGI entry point: the Flask app plus the asyncio /proxy handler.
+
+    uvicorn asgi:app --port 5000
+
+GET /proxy is streamed on the event loop by routes/async_proxy.py, so proxied
+videos don't each hold a worker thread; every other path is served by the Flask
+app through a2wsgi's WSGI adapter, which runs each request on its own thread
+from a pool of WSGI_THREADS, so slow Flask requests don't wait for each other.
+`python run.py` keeps working as before with the synchronous /proxy route.
+
+Requires the optional packages in requirements.txt (httpx, a2wsgi, uvicorn).
+"""
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from app import create_app
+from routes.async_proxy import PATH as PROXY_PATH, AsyncProxy
+from services.thumbnail_queue import start_worker
+
+
+class ProxyDispatcher:
+    """Send /proxy to the async handler and everything else to Flask."""
+
+    def __init__(self, flask_app):
+        self.flask = WSGIMiddleware(flask_app, workers=flask_app.config['WSGI_THREADS'])
+        self.proxy = AsyncProxy(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['path'] == PROXY_PATH and scope['method'] == 'GET':
+            return await self.proxy(scope, receive, send)
+        return await self.flask(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.proxy.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+flask_app = create_app()
+
+# Background thumbnail worker (set THUMBNAIL_WORKER=0 when a separate process drains the queue)
+if os.environ.get('THUMBNAIL_WORKER', '1') != '0':
+    start_worker(flask_app)
+
+app = ProxyDispatcher(flask_app)
@@ -11,5 +11,8 @@ from .comment import Comment
 from .reaction import Reaction
 from .comment_reaction import CommentReaction
 from .notification import Notification
+from .thumbnail_job import ThumbnailJob
+from .drive_resolution import DriveResolution
+from .chat_conversation import ChatConversation, ChatMessage
 
-__all__ = ['User', 'Article', 'Favorite', 'Comment', 'Reaction', 'CommentReaction', 'Notification']
\ No newline at end of file
+__all__ = ['User', 'Article', 'Favorite', 'Comment', 'Reaction', 'CommentReaction', 'Notification', 'ThumbnailJob', 'DriveResolution', 'ChatConversation', 'ChatMessage']
\ No newline at end of file
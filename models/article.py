@@ -1,5 +1,9 @@
 from datetime import datetime
+import json
+from sqlalchemy import case, literal
+from sqlalchemy.orm import column_property
 from models import db
+from utils.text_utils import make_excerpt, reading_time_minutes
 
 
 # Modelo
@@ -14,6 +18,28 @@ class Article(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     is_favorite = db.Column(db.Boolean, nullable=False, default=False)
+    # Precomputed for list views (?view=summary) so they don't ship the full content
+    excerpt = db.Column(db.Text, nullable=True)
+    reading_time = db.Column(db.Integer, nullable=True)
+    # JSON rendition map of image_url at several widths/formats (services/rendition_service.py)
+    image_renditions = db.Column(db.Text, nullable=True)
+    # 'inline' when image_url holds a data: URL (served by /article/<id>/thumbnail), else the URL itself.
+    # Computed in SQL so summaries never load the inline image bytes.
+    thumbnail_ref = column_property(
+        case((image_url.like('data:%'), literal('inline')), else_=image_url),
+        deferred=True,
+    )
+
+    def refresh_summary(self):
+        self.excerpt = make_excerpt(self.content)
+        self.reading_time = reading_time_minutes(self.content)
+
+    @property
+    def renditions(self):
+        try:
+            return json.loads(self.image_renditions) if self.image_renditions else None
+        except ValueError:
+            return None
 
     def __repr__(self): 
         return f'<Article {self.title}>'
\ No newline at end of file
@@ -0,0 +1,51 @@
+from datetime import datetime
+from models import db
+
+
+class ChatConversation(db.Model):
+    """Server-side chatbot history of one user for one chat_type ('comercial' | 'training').
+    Messages up to `summarized_upto` (a ChatMessage id) are folded into `summary`."""
+    __tablename__ = 'chat_conversation'
+    __table_args__ = (db.UniqueConstraint('user_id', 'chat_type', name='uq_chat_conversation_user_type'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    chat_type = db.Column(db.String(32), nullable=False, default='comercial')
+    summary = db.Column(db.Text, nullable=True)
+    summarized_upto = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'chat_type': self.chat_type,
+            'summary': self.summary,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def __repr__(self):
+        return f'<ChatConversation {self.id} user:{self.user_id} {self.chat_type}>'
+
+
+class ChatMessage(db.Model):
+    """One turn of a ChatConversation; `tokens` is the estimate used for the history budget."""
+    __tablename__ = 'chat_message'
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('chat_conversation.id'), nullable=False, index=True)
+    # 'user' | 'model'
+    role = db.Column(db.String(16), nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    tokens = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'role': self.role,
+            'text': self.text,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f'<ChatMessage {self.id} conversation:{self.conversation_id} {self.role}>'
@@ -0,0 +1,35 @@
+from datetime import datetime
+from models import db
+
+
+class DriveResolution(db.Model):
+    """Cached mapping of a Google Drive link (file, open?id= or folder URL) to its
+    direct download URL, with the content type and size seen when it was resolved.
+    Rows expire at `expires_at`; failed resolutions are cached for a shorter time."""
+    __tablename__ = 'drive_resolution'
+    source_url = db.Column(db.String(2048), primary_key=True)
+    file_id = db.Column(db.String(128), nullable=True)
+    direct_url = db.Column(db.String(2048), nullable=True)
+    content_type = db.Column(db.String(255), nullable=True)
+    content_length = db.Column(db.BigInteger, nullable=True)
+    # 'ok' | 'failed'
+    status = db.Column(db.String(16), nullable=False, default='ok')
+    error = db.Column(db.Text, nullable=True)
+    resolved_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            'source_url': self.source_url,
+            'file_id': self.file_id,
+            'direct_url': self.direct_url,
+            'content_type': self.content_type,
+            'content_length': self.content_length,
+            'status': self.status,
+            'error': self.error,
+            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+    def __repr__(self):
+        return f'<DriveResolution {self.file_id} {self.status}>'
@@ -0,0 +1,39 @@
+from datetime import datetime
+from models import db
+
+
+class ThumbnailJob(db.Model):
+    """Durable queue entry: render the PDF thumbnail of an article in the background.
+    status: 'pending' -> 'running' -> 'done' | 'failed' (retried with backoff until max_attempts)."""
+    __tablename__ = 'thumbnail_job'
+    id = db.Column(db.Integer, primary_key=True)
+    article_id = db.Column(db.Integer, db.ForeignKey('article.id'), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default='pending', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    # replace an existing image_url (e.g. a new PDF was uploaded) instead of skipping
+    overwrite = db.Column(db.Boolean, nullable=False, default=False)
+    last_error = db.Column(db.Text, nullable=True)
+    # earliest time the job may run (pushed forward by the retry backoff)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # set when a worker claims the job; stale locks are reclaimed
+    locked_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'article_id': self.article_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'overwrite': self.overwrite,
+            'last_error': self.last_error,
+            'run_after': self.run_after.isoformat() if self.run_after else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def __repr__(self):
+        return f'<ThumbnailJob {self.id} article:{self.article_id} {self.status}>'
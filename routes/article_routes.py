@@ -1,16 +1,16 @@
-from flask import Blueprint, request, session, jsonify, Response, stream_with_context
-from services.article_service import get_article, delete_article, update_article, create_article, get_all_articles, get_favorites, toggle_favorite
-import urllib.request
-import urllib.error
-import urllib.parse
-import base64
+from flask import Blueprint, request, session, jsonify, Response, stream_with_context, current_app
+from services.article_service import get_article, delete_article, update_article, create_article, get_all_articles, get_favorites, toggle_favorite, get_article_thumbnail
 import uuid
 from models import db, Comment, Reaction, CommentReaction, Notification
 from models.article import Article
 from datetime import datetime
-import os
-from werkzeug.utils import secure_filename
-from services.article_service import _generate_pdf_thumbnail_dataurl
+from services.thumbnail_queue import enqueue_thumbnail, notify_worker, get_job, latest_job_for_article
+from services.media_service import store_stream, public_url, InvalidMediaType, MediaTooLarge
+from services.rendition_service import pick as pick_rendition
+from services.proxy_cache import get_proxy_cache, cached_response, NotCacheable
+from services.http_client import open_url
+from services.proxy_service import LOGGED_HEADERS, forward_request_headers, response_headers as proxy_response_headers
+from services.drive_resolver import is_drive_url, resolve as resolve_drive_url, DriveResolutionError
 import logging
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -54,7 +54,13 @@ def get_articles_route():
     q = request.args.get('q')
     tag = request.args.get('tag')
     tag_slug = request.args.get('tag_slug')
-    return get_all_articles(q, tag, tag_slug)
+    # Optional keyset pagination: ?limit=N&cursor=<next_cursor of the previous page>
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    # Lightweight listings: ?view=summary and/or ?fields=id,title,...
+    view = request.args.get('view', 'full')
+    fields = request.args.get('fields')
+    return get_all_articles(q, tag, tag_slug, limit=limit, cursor=cursor, view=view, fields=fields)
 
 
 
@@ -69,8 +75,15 @@ def toggle_favorite_route(article_id):
 @bp.route('/favorites', methods=['GET'])
 def get_favorites_route():
     user_id = session.get('user_id')
-    
-    return get_favorites(user_id)
+    view = request.args.get('view', 'full')
+    fields = request.args.get('fields')
+    return get_favorites(user_id, view=view, fields=fields)
+
+
+# Imagen del articulo (para vistas resumidas que no incluyen el data URL)
+@bp.route('/article/<int:article_id>/thumbnail', methods=['GET'])
+def article_thumbnail_route(article_id):
+    return get_article_thumbnail(article_id)
 
 
 
@@ -79,58 +92,50 @@ def proxy_route():
     """Simple proxy to stream external resources (for video CORS/RANGE).
     Use with ?url=<encoded-url>. For production be careful: this can be abused.
     Consider restricting domains or adding auth.
-    Implements streaming using urllib to avoid external dependencies.
+    Streams through the shared pooled upstream client (services/http_client.py).
     """
     url = request.args.get('url')
     if not url:
         return jsonify({'error': 'url query parameter required'}), 400
 
     # Build headers to forward where helpful
-    headers = {}
-    range_hdr = request.headers.get('Range')
-    if range_hdr:
-        headers['Range'] = range_hdr
-    ua = request.headers.get('User-Agent')
-    if ua:
-        headers['User-Agent'] = ua
-    ref = request.headers.get('Referer')
-    if ref:
-        headers['Referer'] = ref
+    headers = forward_request_headers(request.headers)
+    ua = headers.get('User-Agent')
 
     try:
-        # If the URL is a Google Drive folder link, try to extract a /file/d/<id> link
-        # and use the direct-download endpoint. This helps when users paste a folder URL.
+        # Google Drive links (file, open?id= or folder URLs) are mapped to their direct
+        # download URL once and cached (services/drive_resolver.py)
+        if is_drive_url(url):
+            try:
+                resolution = resolve_drive_url(url)
+                url = resolution.direct_url
+                logging.debug('proxy: drive link resolved -> %s', url)
+            except DriveResolutionError as exc:
+                return jsonify({'error': str(exc)}), 422
+            except OSError as exc:
+                logging.exception('proxy: could not reach Google Drive to resolve %s: %s', url, exc)
+
+        # Serve from the disk cache (one upstream fetch per object, Range answered locally);
+        # objects it can't hold (too large, HTML, upstream errors) are proxied directly below
+        cache = get_proxy_cache()
+        if cache is not None:
+            try:
+                return cached_response(cache.get(url, user_agent=ua), url)
+            except NotCacheable:
+                pass
+
+        # Open the remote URL on a pooled keep-alive connection (services/http_client.py).
+        # Opened without `with`: the body is streamed after this function returns, and
+        # the generator closes the response when it is done
+        resp = open_url(url, headers=headers, timeout=15)
+        streaming = False
         try:
-            if 'drive.google.com/drive/folders/' in (url or ''):
-                try:
-                    folder_req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'}, method='GET')
-                    with urllib.request.urlopen(folder_req, timeout=10) as fr:
-                        body = fr.read(32768).decode('utf-8', errors='replace')
-                        import re
-                        m = re.search(r'/file/d/([A-Za-z0-9_-]+)', body)
-                        if m:
-                            fid = m.group(1)
-                            url = f'https://drive.google.com/uc?export=download&id={fid}'
-                            print(f"[proxy] detected drive folder -> trying file id={fid}")
-                        else:
-                            # If folder HTML doesn't contain a file id, inform the client
-                            return jsonify({'error': 'Google Drive folder URL detected but no file found in folder HTML. Provide a direct file link (use "Compartir -> Obtener enlace" on the file) or upload the PDF.'}), 422
-                except (urllib.error.URLError, urllib.error.HTTPError, OSError) as exc:
-                    # If we couldn't fetch the folder page, return informative error
-                    logging.exception('proxy: failed to fetch Google Drive folder page: %s', exc)
-                    return jsonify({'error': 'Unable to fetch Google Drive folder page. Ensure the folder is public or provide a direct file link.'}), 422
-        except (urllib.error.URLError, urllib.error.HTTPError, OSError) as exc:
-            logging.exception('proxy: ignored inner error while handling drive folder detection: %s', exc)
-
-        req = urllib.request.Request(url, headers=headers, method='GET')
-        # Open the remote URL (this returns an HTTPResponse-like object)
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            status = resp.getcode()
+            status = resp.status
             # Collect headers from remote
-            remote_headers = dict(resp.getheaders())
+            remote_headers = dict(resp.headers)
             try:
                 print(f"[proxy] requested url={url} status={status}")
-                interesting = {k: v for k, v in remote_headers.items() if k.lower() in ['content-type', 'content-length', 'accept-ranges', 'content-range', 'access-control-allow-origin']}
+                interesting = {k: v for k, v in remote_headers.items() if k.lower() in LOGGED_HEADERS}
                 print(f"[proxy] remote headers={interesting}")
             except (AttributeError, TypeError, ValueError) as exc:
                 logging.exception('proxy: failed to inspect remote headers: %s', exc)
@@ -141,94 +146,23 @@ def proxy_route():
                     detail = resp.read(1000).decode('utf-8', errors='replace')
                 except (OSError, ValueError):
                     detail = '<no body>'
-                # If upstream returned 404 and the url looks like Google Drive, try alternative direct-download formats
-                try:
-                    if status == 404 and 'drive.google.com' in url:
-                        import re
-                        m = re.search(r'/file/d/([A-Za-z0-9_-]+)', url)
-                        if not m:
-                            from urllib.parse import urlparse, parse_qs
-                            q = urlparse(url).query
-                            qs = parse_qs(q)
-                            m_id = qs.get('id', [None])[0]
-                        else:
-                            m_id = m.group(1)
-                        if m_id:
-                            alt = f'https://drive.google.com/uc?export=download&id={m_id}'
-                            try:
-                                with urllib.request.urlopen(urllib.request.Request(alt, headers=headers), timeout=15) as resp2:
-                                    status2 = resp2.getcode()
-                                    if status2 < 400:
-                                        remote_headers = dict(resp2.getheaders())
-                                        excluded = ['content-encoding', 'transfer-encoding', 'connection', 'x-frame-options', 'content-disposition', 'set-cookie', 'x-content-type-options']
-                                        response_headers = {}
-                                        for k, v in remote_headers.items():
-                                            if k.lower() in excluded:
-                                                continue
-                                            response_headers[k] = v
-                                        response_headers['Access-Control-Allow-Origin'] = '*'
-                                        if response_headers.get('Content-Type', '').lower().startswith('application/pdf'):
-                                            response_headers['Content-Disposition'] = 'inline'
-                                        def stream2():
-                                            try:
-                                                chunk_size = 8192
-                                                while True:
-                                                    chunk = resp2.read(chunk_size)
-                                                    if not chunk:
-                                                        break
-                                                    yield chunk
-                                            except GeneratorExit:
-                                                return
-                                        return Response(stream_with_context(stream2()), status=status2, headers=response_headers)
-                            except (urllib.error.URLError, urllib.error.HTTPError, OSError) as exc:
-                                logging.exception('proxy: drive fallback fetch failed: %s', exc)
-                except (urllib.error.URLError, urllib.error.HTTPError, OSError) as exc:
-                    logging.exception('proxy: error handling 404 drive fallback: %s', exc)
-
                 return jsonify({'error': 'upstream error', 'status': status, 'detail': detail}), status
 
-            # Excluir cabeceras que puedan interferir con embed/streaming en el cliente
-            excluded = ['content-encoding', 'transfer-encoding', 'connection', 'x-frame-options', 'content-disposition', 'set-cookie', 'x-content-type-options']
-            response_headers = {}
-            for k, v in remote_headers.items():
-                if k.lower() in excluded:
-                    continue
-                response_headers[k] = v
-            # Si el recurso parece un PDF y no se devolvió content-type, forzarlo
-            ct_keys = [k for k in remote_headers.keys() if k.lower() == 'content-type']
-            if not ct_keys:
-                if url.lower().endswith('.pdf'):
-                    response_headers['Content-Type'] = 'application/pdf'
-
-            # Forzar inline para PDFs para que el navegador los muestre incrustados
-            try:
-                if response_headers.get('Content-Type', '').lower().startswith('application/pdf'):
-                    response_headers['Content-Disposition'] = 'inline'
-            except (KeyError, ValueError, OSError) as exc:
-                logging.exception('proxy: error while forcing PDF disposition: %s', exc)
-
-            response_headers['Access-Control-Allow-Origin'] = '*'
+            response_headers = proxy_response_headers(remote_headers, url)
 
             def stream():
                 try:
-                    chunk_size = 8192
-                    while True:
-                        chunk = resp.read(chunk_size)
-                        if not chunk:
-                            break
-                        yield chunk
-                except GeneratorExit:
-                    return
+                    yield from resp.iter_chunks()
+                finally:
+                    resp.close()
 
+            streaming = True
             return Response(stream_with_context(stream()), status=status, headers=response_headers)
+        finally:
+            if not streaming:
+                resp.close()
 
-    except urllib.error.HTTPError as e:
-        try:
-            detail = e.read(1000).decode('utf-8', errors='replace')
-        except (OSError, ValueError):
-            detail = '<no body>'
-        return jsonify({'error': 'upstream error', 'status': e.code, 'detail': detail}), e.code
-    except (urllib.error.URLError, OSError, ValueError) as e:
+    except (OSError, ValueError) as e:
         logging.exception('proxy: unexpected error: %s', e)
         return jsonify({'error': 'proxy error', 'detail': str(e)}), 500
 
@@ -511,7 +445,7 @@ def get_notifications():
                 if a:
                     actor_username = a.username
                     try:
-                        actor_photo = a.photo_url
+                        actor_photo = public_url(a.photo_url)
                     except AttributeError:
                         actor_photo = None
         except SQLAlchemyError:
@@ -522,7 +456,8 @@ def get_notifications():
                 if art:
                     article_title = art.title
                     try:
-                        article_thumb = art.image_url
+                        # smallest rendition that fits the notification avatar
+                        article_thumb = public_url(pick_rendition(art.renditions, 160) or art.image_url)
                     except AttributeError:
                         article_thumb = None
         except SQLAlchemyError:
@@ -573,8 +508,8 @@ def delete_notification(notification_id):
 
 @bp.route('/article/<int:article_id>/upload_pdf', methods=['POST'])
 def upload_pdf_for_article(article_id):
-    """Upload a PDF file for an article, save it under static/uploads/pdfs/,
-    update article.pdf_url to the hosted static URL and generate a thumbnail.
+    """Upload a PDF file for an article, save it in the media store,
+    update article.pdf_url to its /media URL and queue thumbnail generation.
     Only the article owner can upload.
     """
     user_id = session.get('user_id')
@@ -585,41 +520,55 @@ def upload_pdf_for_article(article_id):
     if article.user_id != user_id:
         return jsonify({'error': 'No autorizado'}), 403
 
+    # Reject oversized bodies before the multipart form is parsed
+    max_bytes = current_app.config.get('MAX_PDF_UPLOAD_BYTES')
+    if max_bytes and request.content_length and request.content_length > max_bytes + 64 * 1024:
+        return jsonify({'error': f'El PDF supera el máximo de {max_bytes} bytes'}), 413
+
     if 'file' not in request.files:
         return jsonify({'error': 'Campo file faltante'}), 400
     f = request.files['file']
     if f.filename == '':
         return jsonify({'error': 'Nombre de archivo inválido'}), 400
 
-    filename = secure_filename(f.filename)
-    upload_dir = os.path.join(os.path.dirname(__file__), '..', 'static', 'uploads', 'pdfs')
-    os.makedirs(upload_dir, exist_ok=True)
-    save_path = os.path.join(upload_dir, filename)
-    f.save(save_path)
-
-    # Build public URL for static file
-    from flask import url_for
-    public_url = url_for('static', filename=f'uploads/pdfs/{filename}', _external=False)
-
-    # Update article and try to generate thumbnail
+    # Stream the PDF into the content-addressed media store (hashed while written,
+    # size-bounded, and rejected on the first bytes if it is not a PDF)
     try:
-        article.pdf_url = public_url
+        pdf_media_url = store_stream(f.stream, 'application/pdf', max_bytes=max_bytes, signature=b'%PDF')
+    except InvalidMediaType:
+        return jsonify({'error': 'El archivo no es un PDF'}), 415
+    except MediaTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except OSError as e:
+        logging.exception('upload_pdf_for_article: failed to store PDF: %s', e)
+        return jsonify({'error': 'No se pudo guardar el archivo'}), 500
+
+    # Update article and queue thumbnail generation from the stored file
+    try:
+        article.pdf_url = pdf_media_url
+        job = enqueue_thumbnail(article.id, overwrite=True)
         db.session.commit()
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({'error': 'No se pudo guardar en DB: ' + str(e)}), 500
+    notify_worker()
+
+    return jsonify({'pdf_url': public_url(article.pdf_url), 'image_url': public_url(article.image_url),
+                    'thumbnail_job': job.to_dict()}), 200
+
+
+# --- Estado de la generación de miniaturas en segundo plano ---
+@bp.route('/thumbnail_jobs/<int:job_id>', methods=['GET'])
+def thumbnail_job_route(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Tarea no encontrada'}), 404
+    return jsonify(job.to_dict())
 
-    # Generate thumbnail from saved file by reading bytes and calling generator
-    try:
-        with open(save_path, 'rb') as fh:
-            b = fh.read()
-            data_url = 'data:application/pdf;base64,' + base64.b64encode(b).decode('ascii')
-            thumb = _generate_pdf_thumbnail_dataurl(data_url, target_width=800)
-            if thumb:
-                article.image_url = thumb
-                db.session.commit()
-    except (OSError, ValueError, SQLAlchemyError) as exc:
-        db.session.rollback()
-        logging.exception('upload_pdf_for_article: thumbnail generation or DB save failed: %s', exc)
 
-    return jsonify({'pdf_url': article.pdf_url, 'image_url': article.image_url}), 200
\ No newline at end of file
+@bp.route('/article/<int:article_id>/thumbnail_job', methods=['GET'])
+def article_thumbnail_job_route(article_id):
+    job = latest_job_for_article(article_id)
+    if not job:
+        return jsonify({'error': 'Tarea no encontrada'}), 404
+    return jsonify(job.to_dict())
@@ -0,0 +1,225 @@
+"""Asyncio implementation of /proxy for ASGI servers (see asgi.py).
+
+The Flask route holds a worker thread for the whole playback of a proxied
+video. This handler streams upstream responses on the event loop instead, so
+many viewers share one thread:
+
+- upstream bodies are read with httpx (pooled keep-alive connections, limits
+  from UPSTREAM_* / ASYNC_PROXY_MAX_CONNECTIONS) and forwarded chunk by chunk;
+- backpressure: the next chunk is only read once `send()` of the previous one
+  returned, and ASGI servers pause `send()` while the client socket is full;
+- a client disconnect cancels the upstream read;
+- bodies are requested with `Accept-Encoding: identity`, since Content-Encoding
+  isn't forwarded; an upstream that compresses anyway is relayed decoded.
+
+Drive resolution, the disk cache and the header rules are the same as in the
+Flask route (services/drive_resolver.py, services/proxy_cache.py,
+services/proxy_service.py); their blocking parts run in worker threads. A body
+served from the disk cache is read by one thread per response, which hands
+READ_SIZE chunks to the event loop through a queue of READ_AHEAD chunks (and
+waits there while the client is slower than the disk).
+"""
+import asyncio
+import json
+import logging
+import threading
+from urllib.parse import parse_qs
+
+import httpx
+
+from services.drive_resolver import DriveResolutionError, is_drive_url, resolve as resolve_drive_url
+from services.proxy_cache import NotCacheable, get_proxy_cache, plan_response
+from services.proxy_service import forward_request_headers, response_headers
+
+logger = logging.getLogger(__name__)
+
+PATH = '/proxy'
+# Bytes read from the disk cache at a time, and chunks read ahead of the client
+READ_SIZE = 256 * 1024
+READ_AHEAD = 4
+
+
+class _Headers:
+    """Case-insensitive read access to ASGI request headers."""
+
+    def __init__(self, raw):
+        self._headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in raw}
+
+    def get(self, name, default=None):
+        return self._headers.get(name.lower(), default)
+
+
+def _encode_headers(headers: dict):
+    return [(k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in headers.items()]
+
+
+class AsyncProxy:
+    """ASGI app answering GET /proxy?url=... for the Flask `app`."""
+
+    def __init__(self, app):
+        self.app = app
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            config = self.app.config
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=httpx.Timeout(float(config.get('UPSTREAM_READ_TIMEOUT') or 30),
+                                      connect=float(config.get('UPSTREAM_CONNECT_TIMEOUT') or 5)),
+                limits=httpx.Limits(max_connections=int(config.get('ASYNC_PROXY_MAX_CONNECTIONS') or 100),
+                                    max_keepalive_connections=int(config.get('UPSTREAM_POOL_SIZE') or 10)),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _in_app(self, fn, *args, **kwargs):
+        # DB and config access of the shared services needs an app context (runs in a thread)
+        with self.app.app_context():
+            return fn(*args, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        request_headers = _Headers(scope.get('headers', []))
+        url = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('url', [None])[0]
+        if not url:
+            return await self._json(send, 400, {'error': 'url query parameter required'})
+
+        if is_drive_url(url):
+            try:
+                url = (await asyncio.to_thread(self._in_app, resolve_drive_url, url)).direct_url
+            except DriveResolutionError as exc:
+                return await self._json(send, 422, {'error': str(exc)})
+            except OSError as exc:
+                logger.warning('async proxy: could not reach Google Drive to resolve %s: %s', url, exc)
+
+        entry = await asyncio.to_thread(self._in_app, self._cache_get, url, request_headers.get('User-Agent'))
+        if entry is not None:
+            try:
+                plan = plan_response(entry, url, request_headers)
+            except NotCacheable:
+                plan = None  # a Range of an object whose size isn't known yet
+            if plan is not None:
+                return await self._send_cached(entry, plan, receive, send)
+        return await self._send_upstream(url, request_headers, receive, send)
+
+    @staticmethod
+    def _cache_get(url, user_agent):
+        cache = get_proxy_cache()
+        if cache is None:
+            return None
+        try:
+            return cache.get(url, user_agent=user_agent)
+        except NotCacheable:
+            return None
+
+    async def _send_cached(self, entry, plan, receive, send):
+        status, headers, byte_range = plan
+        await send({'type': 'http.response.start', 'status': status, 'headers': _encode_headers(headers)})
+        if byte_range is None:
+            entry.close()
+            return await send({'type': 'http.response.body', 'body': b''})
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=READ_AHEAD)
+        stop = threading.Event()
+        threading.Thread(target=self._read_cached, args=(entry, byte_range, loop, queue, stop),
+                         name='proxy-cache-reader', daemon=True).start()
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            while not disconnected.done():
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            else:
+                return
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            stop.set()
+            # frees the reader if it is waiting on a full queue; it puts at most one more chunk
+            while not queue.empty():
+                queue.get_nowait()
+
+    @staticmethod
+    def _read_cached(entry, byte_range, loop, queue, stop):
+        """Reader thread of _send_cached: file reads may wait for an in-progress download."""
+        def put(item):
+            # blocks while the queue is full; False once the response is over
+            if stop.is_set():
+                return False
+            try:
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+            except RuntimeError:  # the event loop is closed
+                return False
+            return True
+
+        chunks = entry.iter_range(*byte_range, chunk_size=READ_SIZE)
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+        except OSError as exc:
+            logger.warning('async proxy: reading cached %s failed: %s', entry.key, exc)
+        finally:
+            chunks.close()
+            put(None)
+
+    async def _send_upstream(self, url, request_headers, receive, send):
+        client = self._get_client()
+        upstream_headers = forward_request_headers(request_headers)
+        # the body is relayed as it comes and Content-Encoding is not forwarded
+        upstream_headers['Accept-Encoding'] = 'identity'
+        try:
+            resp = await client.send(client.build_request('GET', url, headers=upstream_headers), stream=True)
+        except httpx.HTTPError as exc:
+            logger.exception('async proxy: unexpected error: %s', exc)
+            return await self._json(send, 500, {'error': 'proxy error', 'detail': str(exc)})
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            if resp.status_code >= 400:
+                detail = b''
+                async for chunk in resp.aiter_raw():
+                    detail += chunk
+                    if len(detail) >= 1000:
+                        break
+                return await self._json(send, resp.status_code, {
+                    'error': 'upstream error', 'status': resp.status_code,
+                    'detail': detail[:1000].decode('utf-8', errors='replace'),
+                })
+            headers = response_headers(resp.headers, url)
+            encoded = resp.headers.get('Content-Encoding', 'identity').lower() != 'identity'
+            if encoded:
+                # compressed anyway: relay it decoded, a length not known up front
+                headers = {k: v for k, v in headers.items() if k.lower() != 'content-length'}
+            await send({'type': 'http.response.start', 'status': resp.status_code, 'headers': _encode_headers(headers)})
+            async for chunk in (resp.aiter_bytes() if encoded else resp.aiter_raw()):
+                if disconnected.done():
+                    return
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        except httpx.HTTPError as exc:
+            # headers are already sent: all we can do is end the body early
+            logger.warning('async proxy: upstream %s failed mid-stream: %s', url, exc)
+        finally:
+            disconnected.cancel()
+            await resp.aclose()
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    @staticmethod
+    async def _json(send, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+        ]})
+        await send({'type': 'http.response.body', 'body': body})
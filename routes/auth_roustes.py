@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, session
 from models import User, db
 from models.article import Article
 from services.auth_service import register_user, login_user, logout_user, get_profile, update_profile
+from services.article_service import get_user_articles
+from services.media_service import public_url
 from sqlalchemy.exc import SQLAlchemyError
 import logging
 
@@ -64,20 +66,8 @@ def update_profile_route():
 
 @bp.route('/user/<int:user_id>/articles', methods=['GET'])
 def user_articles_route(user_id):
-    # reuse article_service to return all articles but filter by user
-    articles = Article.query.filter_by(user_id=user_id).all()
-    result = []
-    for a in articles:
-        result.append({
-            'id': a.id,
-            'title': a.title,
-            'content': a.content,
-            'image_url': a.image_url,
-            'pdf_url': a.pdf_url,
-            'tag': a.tag,
-            'created_at': a.created_at.strftime('%d-%m-%Y') if a.created_at else None
-        })
-    return jsonify(result), 200
+    # reuse article_service to return the user's articles (supports ?view=summary and ?fields=)
+    return get_user_articles(user_id, view=request.args.get('view', 'full'), fields=request.args.get('fields'))
 
 
 @bp.route('/user/<int:user_id>', methods=['GET'])
@@ -92,7 +82,7 @@ def get_user_profile_route(user_id):
             'first_name': user.first_name,
             'last_name': user.last_name,
             'area': user.area,
-            'photo_url': user.photo_url
+            'photo_url': public_url(user.photo_url)
         }
         return jsonify(data), 200
     except SQLAlchemyError as e:
@@ -1,9 +1,22 @@
-from flask import Blueprint, request, jsonify, current_app, session
-import os
+from flask import Blueprint, request, jsonify, current_app, session, Response
 import json
+import logging
+import time
+import requests
+from models import db, ChatConversation
+from services import conversation_service
+from services import chat_cache
+from services.chat_cache import get_response_cache
+from services.chat_provider import get_chat_client
+from services.knowledge_retrieval import select_system_text
+from services.chat_limiter import get_chat_limiter
+from services.chat_metrics import error_class, get_chat_metrics
+from services.prompt_registry import PromptSource, get_prompt_registry, system_block
 from utils.auth_decorators import login_required
+from utils.chat_decorators import bounded_chat
 
 bp = Blueprint('chat', __name__)
+logger = logging.getLogger(__name__)
 
 # Load system instruction from a file or environment; for simplicity we embed a short default
 # You can replace this content with the long SYSTEM_INSTRUCTION provided by the frontend constants.
@@ -199,81 +212,133 @@ INITIAL_GREETING = "Hola, soy KAT IA. Estoy lista para apoyarte. ¿Quieres prepa
 # Saludo inicial para el Asistente de Capacitación
 TRAINING_INITIAL_GREETING = "Hola, soy tu Instructor Digital de Cure LATAM. Estoy aquí para capacitarte en nuestro portafolio de productos: Natrox, Endoform, Pretiva y Myriad Matrix. ¿En qué puedo ayudarte hoy?"
 
+# System instruction of each chat type (services/prompt_registry.py); any other chat_type is 'comercial'.
+# A file in CHAT_PROMPT_FILES takes precedence over the environment variable and the text above.
+PROMPT_SOURCES = {
+    'comercial': PromptSource(DEFAULT_SYSTEM_INSTRUCTION, env='KAT_SYSTEM_INSTRUCTION'),
+    'training': PromptSource(TRAINING_SYSTEM_INSTRUCTION),
+}
+
+
+def prompt_registry():
+    """The chatbots' PromptRegistry; created, and its prompts loaded, by create_app."""
+    return get_prompt_registry(PROMPT_SOURCES)
+
 
 @bp.route('/api/chat', methods=['POST'])
 @login_required
+@bounded_chat
 def chat_route():
     """POST /api/chat
     Expects JSON: { messages: [{ role: 'user'|'model', text: '...'}], chat_type: 'comercial'|'training' }
+    or, with the history kept on the server: { message: '...', chat_type: ... }
     Returns JSON: { reply: '...' }
 
     This implementation forwards the conversation to Google Generative AI API.
     Requires environment variable GOOGLE_API_KEY set on the server.
     """
-    print("DEBUG - Received request to /api/chat")
-    
     body = request.get_json() or {}
     messages = body.get('messages') or []
     chat_type = body.get('chat_type', 'comercial')  # Por defecto es comercial
-    
+    if 'messages' not in body and 'message' in body:
+        return _stored_conversation_turn(body, chat_type)
+
     if not isinstance(messages, list):
         return jsonify({'error': 'messages must be a list'}), 400
 
-    print(f"DEBUG - Chat type: {chat_type}")
-    print(f"DEBUG - Messages received: {json.dumps(messages, indent=2)}")
-
-    # Build chat messages for the API, starting with the system instruction
-    api_messages = []
-    
-    # Seleccionar el system instruction según el tipo de chatbot
-    if chat_type == 'training':
-        system_text = TRAINING_SYSTEM_INSTRUCTION
-        initial_greeting = TRAINING_INITIAL_GREETING
-        print(f"DEBUG - Usando chatbot de capacitación. Saludo: {initial_greeting}")
-    else:
-        system_text = os.environ.get('KAT_SYSTEM_INSTRUCTION') or DEFAULT_SYSTEM_INSTRUCTION
-        initial_greeting = INITIAL_GREETING
-        print(f"DEBUG - Usando chatbot comercial. Saludo: {initial_greeting}")
-    
-    print(f"DEBUG - System instruction seleccionado: {system_text[:100]}...")
-    api_messages.append({'role': 'system', 'content': system_text})
-
-    # Process messages from user
+    api_messages, initial_greeting = _build_api_messages(messages, chat_type)
     if not messages:
         # No hay mensajes del usuario, devolver saludo inicial directamente
         return jsonify({'reply': initial_greeting})
-    else:
-        for m in messages:
-            role = m.get('role')
-            text = m.get('text')
-            if not role or not text:
-                continue
-            # Map frontend roles to OpenAI roles
-            if role == 'user':
-                api_messages.append({'role': 'user', 'content': text})
-            elif role == 'model' or role == 'assistant':
-                api_messages.append({'role': 'assistant', 'content': text})
-            else:
-                # fallback to user
-                api_messages.append({'role': 'user', 'content': text})
-
-    print(f"DEBUG - Final API messages: {json.dumps(api_messages, indent=2)}")
-    
-    # Use helper to call provider
-    return _call_google_and_respond(api_messages)
-
-
-# Ruta para eliminar el chatbot (limpiar conversación del localStorage)
+
+    return _call_google_and_respond(api_messages, cache_key=_response_cache_key(body, chat_type, api_messages))
+
+
+@bp.route('/api/chat/stream', methods=['POST'])
+@login_required
+@bounded_chat
+def chat_stream_route():
+    """POST /api/chat/stream
+    Same JSON body as /api/chat (client history or { message }). Replies with Server-Sent Events while the model
+    generates the answer:
+        data: {"delta": "..."}              one per chunk of text
+        event: done   data: {"reply": "..."}  the full reply, last event
+        event: error  data: {"error": "...", "detail": "..."}
+    Errors before the first chunk (missing API key, upstream 4xx/5xx) are returned
+    as JSON with an error status, like /api/chat. If the client disconnects, the
+    upstream request is closed so Google stops generating.
+    """
+    body = request.get_json() or {}
+    messages = body.get('messages') or []
+    chat_type = body.get('chat_type', 'comercial')
+    if 'messages' not in body and 'message' in body:
+        return _stored_conversation_turn(body, chat_type, stream=True)
+    if not isinstance(messages, list):
+        return jsonify({'error': 'messages must be a list'}), 400
+
+    api_messages, initial_greeting = _build_api_messages(messages, chat_type)
+    if len(api_messages) == 1:
+        # sin mensajes del usuario: el saludo inicial como un único evento
+        return _sse_response(iter([_sse({'delta': initial_greeting}), _sse({'reply': initial_greeting}, 'done')]))
+    return _stream_google_response(api_messages, initial_greeting,
+                                   cache_key=_response_cache_key(body, chat_type, api_messages))
+
+
+# Historial guardado en el servidor
+@bp.route('/api/chat/history', methods=['GET'])
+@login_required
+def chat_history_route():
+    """GET /api/chat/history?chat_type=comercial
+    Returns JSON: { summary: '...'|null, messages: [{ id, role, text, created_at }] }
+    (the messages not folded into the summary yet)
+    """
+    chat_type = request.args.get('chat_type', 'comercial')
+    conversation = ChatConversation.query.filter_by(user_id=session.get('user_id'), chat_type=chat_type).first()
+    if conversation is None:
+        return jsonify({'summary': None, 'messages': []})
+    return jsonify({
+        'summary': conversation.summary,
+        'messages': [m.to_dict() for m in conversation_service.pending_messages(conversation)],
+    })
+
+
+# Estadísticas de la caché de respuestas
+@bp.route('/api/chat/cache', methods=['GET'])
+@login_required
+def chat_cache_stats_route():
+    """GET /api/chat/cache
+    Returns JSON: { enabled, entries, hits, misses, hit_rate, stores, evictions, ..., limiter: { in_flight, rejected, ... } }
+    """
+    return jsonify({**get_response_cache().stats(), 'limiter': get_chat_limiter().stats()})
+
+
+@bp.route('/api/chat/metrics', methods=['GET'])
+@login_required
+def chat_metrics_route():
+    """GET /api/chat/metrics[?format=prometheus]
+    Returns JSON: { calls: {mode: {outcome: n}}, errors, events, histograms: {name: {mode: {count, p50, p95, p99, ...}}},
+    cache, limiter, prompts: {name: {version, source, bytes}} }; with format=prometheus, the metrics in the Prometheus text format.
+    """
+    metrics = get_chat_metrics()
+    if request.args.get('format') == 'prometheus':
+        return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify({**metrics.snapshot(), 'cache': get_response_cache().stats(),
+                    'limiter': get_chat_limiter().stats(), 'prompts': prompt_registry().versions()})
+
+
+# Ruta para eliminar el chatbot (limpiar conversación del localStorage y del servidor)
 @bp.route('/api/chat/clear', methods=['DELETE'])
 @login_required
 def clear_chat_route():
-    """DELETE /api/chat/clear
-    Elimina la conversación del chatbot del localStorage del usuario
+    """DELETE /api/chat/clear[?chat_type=comercial]
+    Elimina la conversación del chatbot guardada en el servidor (la de chat_type, o todas);
+    el frontend limpia su localStorage
     Returns JSON: { success: true }
     """
     try:
-        # Esta ruta simplemente confirma que el usuario puede limpiar su chat
-        # La limpieza real se hace en el frontend (localStorage)
+        chat_type = request.args.get('chat_type') or (request.get_json(silent=True) or {}).get('chat_type')
+        conversation_service.clear_conversations(session.get('user_id'), chat_type)
+        db.session.commit()
         return jsonify({
             'success': True, 
             'message': 'Conversación eliminada correctamente'
@@ -344,85 +409,72 @@ def get_current_user():
         }), 500
 
 
-def _call_google_and_respond(api_messages):
-    """Internal helper used by endpoints to call Google Generative AI and return a Flask Response-like JSON."""
-    
-    # Verificación robusta de la API key con múltiples fallbacks
-    GOOGLE_API_KEY = None
-    
-    # Intentar obtener de múltiples fuentes
-    sources = [
-        os.environ.get('GOOGLE_API_KEY'),
-        os.environ.get('google_api_key'),
-        os.environ.get('GOOGLEAI_API_KEY'),
-    ]
-    
-    for source in sources:
-        if source and len(source.strip()) > 10:  # Validación básica de longitud
-            GOOGLE_API_KEY = source.strip()
-            break
-    
-    # Último recurso: leer directamente del archivo .env
-    if not GOOGLE_API_KEY:
-        try:
-            env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-            if os.path.exists(env_path):
-                with open(env_path, 'r') as f:
-                    for line in f:
-                        if line.startswith('GOOGLE_API_KEY='):
-                            GOOGLE_API_KEY = line.split('=', 1)[1].strip()
-                            break
-        except Exception as e:
-            print(f'❌ Error leyendo .env directamente: {e}')
-    
-    if not GOOGLE_API_KEY:
-        example = (
-            "Para usar el servicio real debes definir la variable de entorno GOOGLE_API_KEY.\n"
-            "Crea un archivo .env en la raíz del proyecto con: GOOGLE_API_KEY=...\n"
-            "O define la variable en la sesión: $env:GOOGLE_API_KEY = \"...\"\n"
-            "Se ha incluido .env loading en `app.py` (usa python-dotenv)."
-        )
-        print('❌ GOOGLE_API_KEY no encontrada en ninguna fuente')
-        return jsonify({'error': 'GOOGLE_API_KEY no configurada', 'detail': example}), 500
-
-    print(f'✅ GOOGLE_API_KEY encontrada, longitud: {len(GOOGLE_API_KEY)}')
+def _missing_key_response():
+    example = (
+        "Para usar el servicio real debes definir la variable de entorno GOOGLE_API_KEY.\n"
+        "Crea un archivo .env en la raíz del proyecto con: GOOGLE_API_KEY=...\n"
+        "O define la variable en la sesión: $env:GOOGLE_API_KEY = \"...\"\n"
+        "Se ha incluido .env loading en `app.py` (usa python-dotenv)."
+    )
+    logger.error('GOOGLE_API_KEY no encontrada en ninguna fuente')
+    return jsonify({'error': 'GOOGLE_API_KEY no configurada', 'detail': example}), 500
 
-    try:
-        import requests
-    except ModuleNotFoundError:
-        return jsonify({'error': 'Server misconfiguration: python package "requests" is not installed. Run `pip install requests` in the project virtualenv.'}), 500
 
+def _google_payload(api_messages):
+    """Request body for generateContent/streamGenerateContent from OpenAI-style messages."""
     # Convert OpenAI format to Google format
     contents = []
     for msg in api_messages:
         if msg['role'] == 'system':
-            contents.append({'role': 'user', 'parts': [{'text': f"System instruction: {msg['content']}"}]})
+            contents.append(msg.get('block') or system_block(msg['content']))
         elif msg['role'] == 'user':
             contents.append({'role': 'user', 'parts': [{'text': msg['content']}]})
         elif msg['role'] == 'assistant':
             contents.append({'role': 'model', 'parts': [{'text': msg['content']}]})
 
-    payload = {
+    return {
         'contents': contents,
         'generationConfig': {
             'temperature': 0.2,
             'maxOutputTokens': 2048,
         }
     }
-    
+
+
+def _call_google_and_respond(api_messages, on_reply=None, cache_key=None):
+    """Internal helper used by endpoints to call Google Generative AI and return a Flask Response-like JSON.
+    `on_reply(text)` is called with the model's reply when there is one. With a `cache_key`, a
+    cached reply is returned without calling Google ({reply, cached: true}) and new replies are cached."""
+    metrics = get_chat_metrics()
+    cache = get_response_cache()
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            metrics.count('cache_hit')
+            if on_reply is not None:
+                on_reply(cached)
+            return jsonify({'reply': cached, 'cached': True})
+
+    client = get_chat_client()
+    if not client.configured:
+        return _missing_key_response()
+
+    system_bytes = _system_bytes(api_messages)
+    started = time.monotonic()
     try:
-        resp = requests.post(
-            f'https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash:generateContent?key={GOOGLE_API_KEY}',
-            headers={
-                'Content-Type': 'application/json'
-            },
-            json=payload,
-            timeout=60
-        )
+        resp = client.generate(_google_payload(api_messages))
     except requests.RequestException as e:
+        metrics.observe_call('generate', error=error_class(e), latency=time.monotonic() - started,
+                             system_bytes=system_bytes)
+        logger.warning('Google API request failed: %s', e)
         return jsonify({'error': 'Error connecting to Google API', 'detail': str(e), 'retry': True}), 502
+    latency = time.monotonic() - started
+    ttfb = resp.elapsed.total_seconds()
 
     if resp.status_code >= 400:
+        metrics.observe_call('generate', resp.status_code, error_class(status=resp.status_code), ttfb, latency,
+                             system_bytes=system_bytes)
+        logger.warning('Google API answered %s', resp.status_code)
         try:
             error_detail = resp.json()
             return jsonify({'error': 'Upstream error', 'detail': error_detail, 'status': resp.status_code, 'text': resp.text}), resp.status_code
@@ -430,10 +482,7 @@ def _call_google_and_respond(api_messages):
             return jsonify({'error': 'Upstream error', 'detail': resp.text, 'status': resp.status_code}), resp.status_code
 
     data = resp.json()
-    
-    print("DEBUG - Full response from Google API:")
-    print(json.dumps(data, indent=2))
-    
+
     try:
         candidate = data.get('candidates', [])[0]
         content = candidate.get('content') if candidate else None
@@ -442,58 +491,216 @@ def _call_google_and_respond(api_messages):
     except (IndexError, KeyError, AttributeError, TypeError):
         text = None
 
-    print(f"DEBUG - Extracted text: {text}")
-
+    metrics.observe_call('generate', resp.status_code, None if text else 'empty_reply', ttfb, latency,
+                         usage=data.get('usageMetadata'), system_bytes=system_bytes)
     if not text:
         # Si no hay texto, devolver el saludo inicial
-        print("DEBUG - No text received, returning initial greeting")
+        logger.warning('Google API reply without text (finishReason %s)',
+                       (data.get('candidates') or [{}])[0].get('finishReason'))
         return jsonify({'reply': INITIAL_GREETING, 'raw': data})
 
-    print(f"DEBUG - Returning response: {text}")
+    if cache_key is not None:
+        cache.put(cache_key, text)
+    if on_reply is not None:
+        on_reply(text)
     return jsonify({'reply': text, 'raw': data})
 
 
+def _system_bytes(api_messages):
+    """UTF-8 size of the system instruction in api_messages."""
+    return sum(len(m['content'].encode('utf-8')) for m in api_messages if m['role'] == 'system')
+
+
+def _system_message(chat_type, messages):
+    """System message for this turn: {role, content, version, block}, `block` being the instruction
+    already in Gemini format and `version` identifying its text. The commercial instruction is cut
+    to its core blocks plus the sections relevant to the latest user messages
+    (services/knowledge_retrieval.py)."""
+    registry = prompt_registry()
+    prompt = registry.get('training' if chat_type == 'training' else 'comercial')
+    text, version, block = prompt.text, prompt.version, prompt.system_block
+    if prompt.name == 'comercial':
+        config = current_app.config
+        selected, sections = select_system_text(prompt.text, messages, config.get('CHAT_RETRIEVAL_TOP_K', 0),
+                                                config.get('CHAT_CORE_BLOCKS'))
+        if sections is not None:
+            text, version = selected, f"{prompt.version}:{','.join(map(str, sections))}"
+            block = registry.block(version, text)
+    return {'role': 'system', 'content': text, 'version': version, 'block': block}
+
+
+def _build_api_messages(messages, chat_type):
+    """(api_messages, initial_greeting) for a frontend conversation and chat type."""
+    initial_greeting = TRAINING_INITIAL_GREETING if chat_type == 'training' else INITIAL_GREETING
+    api_messages = [_system_message(chat_type, messages)]
+    for m in messages:
+        role = m.get('role')
+        text = m.get('text')
+        if not role or not text:
+            continue
+        api_messages.append({'role': 'assistant' if role in ('model', 'assistant') else 'user', 'content': text})
+    return api_messages, initial_greeting
+
+
+def _stored_conversation_turn(body, chat_type, stream=False):
+    """Reply to body['message'], a new message of the user's server-side conversation
+    (services/conversation_service.py): the stored history (summary + newest turns within
+    CHAT_HISTORY_TOKEN_BUDGET) is sent with it, and the turn is stored once the model replied."""
+    text = body.get('message')
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({'error': 'message no puede estar vacío'}), 400
+    text = text.strip()
+    conversation = conversation_service.get_conversation(session.get('user_id'), chat_type)
+    summary, messages = conversation_service.history(
+        conversation, current_app.config.get('CHAT_HISTORY_TOKEN_BUDGET', 3000),
+        reserve=conversation_service.estimate_tokens(text))
+    db.session.commit()
+    messages.append({'role': 'user', 'text': text})
+
+    api_messages, initial_greeting = _build_api_messages(messages, chat_type)
+    if summary:
+        api_messages.insert(1, {'role': 'user', 'content': f'Resumen de la conversación anterior:\n{summary}'})
+    conversation_id = conversation.id
+
+    def save(reply):
+        conversation_service.save_turn(conversation_id, text, reply)
+
+    key = _response_cache_key(body, chat_type, api_messages)
+    if stream:
+        return _stream_google_response(api_messages, initial_greeting, on_reply=save, cache_key=key)
+    return _call_google_and_respond(api_messages, on_reply=save, cache_key=key)
+
+
+def _response_cache_key(body, chat_type, api_messages):
+    """Key of this conversation in the reply cache (services/chat_cache.py); None when the cache
+    is disabled or the request opted out with {"cache": false} or Cache-Control: no-cache."""
+    if not get_response_cache().enabled or body.get('cache') is False:
+        return None
+    if 'no-cache' in request.headers.get('Cache-Control', ''):
+        return None
+    return chat_cache.cache_key(chat_type, api_messages)
+
+
+def _sse(data, event=None):
+    """One Server-Sent Events message."""
+    prefix = f'event: {event}\n' if event else ''
+    return f'{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def _sse_response(events):
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # no buffering in nginx
+    })
+
+
+def _chunk_text(data):
+    """Text of one streamGenerateContent chunk (all parts of the first candidate)."""
+    try:
+        parts = data['candidates'][0]['content'].get('parts') or []
+    except (IndexError, KeyError, AttributeError, TypeError):
+        return ''
+    return ''.join(p.get('text') or '' for p in parts)
+
+
+def _stream_google_response(api_messages, greeting, on_reply=None, cache_key=None):
+    """Call streamGenerateContent and relay its chunks to the client as SSE; an empty reply
+    ends with the chat type's `greeting`. `on_reply(text)` is called with the full reply once the stream completes. With a
+    `cache_key`, a cached reply is sent as a single chunk and completed replies are cached."""
+    metrics = get_chat_metrics()
+    cache = get_response_cache()
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            metrics.count('cache_hit')
+            if on_reply is not None:
+                on_reply(cached)
+            return _sse_response(iter([_sse({'delta': cached}), _sse({'reply': cached, 'cached': True}, 'done')]))
+
+    client = get_chat_client()
+    if not client.configured:
+        return _missing_key_response()
+
+    system_bytes = _system_bytes(api_messages)
+    started = time.monotonic()
+    try:
+        resp = client.stream(_google_payload(api_messages))
+    except requests.RequestException as e:
+        metrics.observe_call('stream', error=error_class(e), latency=time.monotonic() - started,
+                             system_bytes=system_bytes)
+        logger.warning('Google API stream request failed: %s', e)
+        return jsonify({'error': 'Error connecting to Google API', 'detail': str(e), 'retry': True}), 502
+
+    if resp.status_code >= 400:
+        try:
+            error_detail = resp.json()
+        except ValueError:
+            error_detail = resp.text
+        resp.close()
+        metrics.observe_call('stream', resp.status_code, error_class(status=resp.status_code),
+                             resp.elapsed.total_seconds(), time.monotonic() - started, system_bytes=system_bytes)
+        logger.warning('Google API stream answered %s', resp.status_code)
+        return jsonify({'error': 'Upstream error', 'detail': error_detail, 'status': resp.status_code}), resp.status_code
+
+    # SSE is UTF-8; without a charset in Content-Type requests would decode it as ISO-8859-1
+    resp.encoding = 'utf-8'
+    app = current_app._get_current_object()
+
+    def generate():
+        reply = []
+        usage = None
+        ttfb = None
+        error = 'client_disconnected'  # until the stream completes or fails
+        try:
+            for line in resp.iter_lines(decode_unicode=True):
+                # SSE from Google: "data: {GenerateContentResponse}" lines separated by blank lines
+                if not line or not line.startswith('data:'):
+                    continue
+                if ttfb is None:
+                    ttfb = time.monotonic() - started
+                try:
+                    data = json.loads(line[5:])
+                except ValueError:
+                    continue
+                # each chunk carries the usage so far; the last one has the totals
+                usage = data.get('usageMetadata') or usage
+                text = _chunk_text(data)
+                if text:
+                    reply.append(text)
+                    yield _sse({'delta': text})
+            error = None if reply else 'empty_reply'
+            if reply and cache_key is not None:
+                cache.put(cache_key, ''.join(reply))
+            if reply and on_reply is not None:
+                with app.app_context():
+                    on_reply(''.join(reply))
+            yield _sse({'reply': ''.join(reply) or greeting}, 'done')
+        except requests.RequestException as e:
+            error = 'stream_interrupted'
+            logger.warning('Google API stream interrupted: %s', e)
+            yield _sse({'error': 'Error reading Google API stream', 'detail': str(e), 'retry': True}, 'error')
+        finally:
+            # also runs on GeneratorExit when the client disconnects: stop the upstream generation
+            resp.close()
+            metrics.observe_call('stream', resp.status_code, error, ttfb, time.monotonic() - started,
+                                 usage=usage, system_bytes=system_bytes)
+
+    return _sse_response(generate())
+
+
 # Simple POST route for classic Flask template JS to call
 @bp.route('/get_response', methods=['POST'])
 @login_required
+@bounded_chat
 def get_response_route():
     data = request.get_json() or {}
     chat_type = data.get('chat_type', 'comercial')  # Por defecto es comercial
-    print(f"DEBUG - get_response - Chat type: {chat_type}")
-    
-    # Accept either {message: '...'} or {messages: [...]}
+
+    # Accept either {messages: [...]} (client history) or {message: '...'} (history kept on the server)
     if 'messages' in data and isinstance(data['messages'], list):
         messages = data['messages']
     else:
-        text = data.get('message') or ''
-        messages = [{'role': 'user', 'text': text}]
-
-    # Build api_messages like chat_route
-    api_messages = []
-    
-    # Seleccionar el system instruction y saludo inicial según el tipo de chatbot
-    if chat_type == 'training':
-        system_text = TRAINING_SYSTEM_INSTRUCTION
-        initial_greeting = TRAINING_INITIAL_GREETING
-        print(f"DEBUG - get_response - Usando chatbot de capacitación. Saludo: {initial_greeting}")
-    else:
-        system_text = os.environ.get('KAT_SYSTEM_INSTRUCTION') or DEFAULT_SYSTEM_INSTRUCTION
-        initial_greeting = INITIAL_GREETING
-        print(f"DEBUG - get_response - Usando chatbot comercial. Saludo: {initial_greeting}")
-    
-    print(f"DEBUG - get_response - System instruction seleccionado: {system_text[:100]}...")
-    api_messages.append({'role': 'system', 'content': system_text})
-    
-    for m in messages:
-        role = m.get('role')
-        text = m.get('text')
-        if not role or not text:
-            continue
-        if role == 'user':
-            api_messages.append({'role': 'user', 'content': text})
-        elif role in ('model', 'assistant'):
-            api_messages.append({'role': 'assistant', 'content': text})
-        else:
-            api_messages.append({'role': 'user', 'content': text})
+        return _stored_conversation_turn(data, chat_type)
 
-    return _call_google_and_respond(api_messages)
+    api_messages, _ = _build_api_messages(messages, chat_type)
+    return _call_google_and_respond(api_messages, cache_key=_response_cache_key(data, chat_type, api_messages))
@@ -0,0 +1,27 @@
+from flask import Blueprint, jsonify, send_file
+import mimetypes
+from services.media_service import INLINE_EXTENSIONS, MEDIA_NAME_RE, path_for_name
+import os
+
+bp = Blueprint('media', __name__)
+
+# A media name is the sha256 of its content, so responses can be cached forever
+ONE_YEAR = 365 * 24 * 3600
+
+
+@bp.route('/media/<name>', methods=['GET'])
+def media_file(name):
+    m = MEDIA_NAME_RE.match(name)
+    path = path_for_name(name)
+    if not m or not path or not os.path.exists(path):
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    response = send_file(path, mimetype=mimetype, etag=m.group(1), max_age=ONE_YEAR, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    if m.group(2) not in INLINE_EXTENSIONS:
+        # stored before types were allow-listed (svg, html, ...): never render it on this origin
+        response.headers['Content-Disposition'] = 'attachment'
+    return response
@@ -1,8 +1,17 @@
 from app import create_app
+import os
+from services.thumbnail_queue import start_worker
 
 
-app = create_app()
+# Render worker processes started with spawn/forkserver re-import this module as
+# '__mp_main__'; they must not build another app or start another queue worker.
+if __name__ != '__mp_main__':
+    app = create_app()
+
+    # Background thumbnail worker (set THUMBNAIL_WORKER=0 when a separate process drains the queue)
+    if os.environ.get('THUMBNAIL_WORKER', '1') != '0':
+        start_worker(app)
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
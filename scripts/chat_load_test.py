@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Load test for the chat endpoints.
+
+Usage:
+    python scripts/chat_load_test.py [--base-url http://127.0.0.1:5000] [--concurrency 20]
+                                     [--requests 200 | --duration 60] [--endpoint chat|get_response|both]
+                                     [--users 10] [--mode messages|message] [--allow-cache]
+
+Offline, against scripts/mock_gemini.py:
+    python scripts/mock_gemini.py --latency lognormal:2,0.5 &
+    CHAT_MODEL_URL=http://127.0.0.1:8090/v1/models/gemini-2.5-flash GOOGLE_API_KEY=mock-key-123 python run.py &
+    python scripts/chat_load_test.py --concurrency 30 --duration 60
+
+--users test accounts (loadtest-N@example.test) are registered if missing and
+logged in; the --concurrency client threads take turns over them, since the
+server limits concurrent chats per user (CHAT_MAX_PER_USER). Each request sends
+one of the SOP opening commands. With --mode messages it sends a one-turn client
+history; with --mode message, a single new message for the server-side
+conversation. Requests opt out of the reply cache unless --allow-cache is given.
+
+Reports per endpoint and overall: status counts, p50/p95/p99 latency (all
+requests and 200s only), throughput, and the chat limiter's saturation
+(in-flight requests sampled from GET /api/chat/cache).
+"""
+import argparse
+import itertools
+import math
+import random
+import sys
+import threading
+import time
+
+import requests
+
+PROMPTS = [
+    'Preparar visita',
+    'Tengo una objeción',
+    'Estoy en visita',
+    'Seguimiento',
+    'Mi desempeño',
+    '¿Cuáles son las contraindicaciones de Natrox?',
+    '¿Cómo trato a un médico con personalidad dominante?',
+    '¿Qué es Endoform y en qué heridas se usa?',
+]
+
+parser = argparse.ArgumentParser(description='Drive /api/chat and /get_response at a target concurrency.')
+parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+parser.add_argument('--concurrency', type=int, default=10, help='client threads sending requests')
+parser.add_argument('--requests', type=int, default=200, help='total requests (ignored with --duration)')
+parser.add_argument('--duration', type=float, help='run for this many seconds instead of --requests')
+parser.add_argument('--endpoint', choices=('chat', 'get_response', 'both'), default='both')
+parser.add_argument('--users', type=int, default=10, help='test accounts to spread the load over')
+parser.add_argument('--password', default='loadtest-password')
+parser.add_argument('--mode', choices=('messages', 'message'), default='messages',
+                    help='client-side history or server-side conversation')
+parser.add_argument('--chat-type', default='comercial')
+parser.add_argument('--allow-cache', action='store_true', help='let the server answer from its reply cache')
+parser.add_argument('--timeout', type=float, default=120.0, help='client timeout per request (seconds)')
+parser.add_argument('--sample-every', type=float, default=0.5, help='seconds between limiter samples')
+args = parser.parse_args()
+
+ENDPOINTS = {'chat': '/api/chat', 'get_response': '/get_response'}
+
+
+def login_sessions():
+    sessions = []
+    for i in range(max(1, args.users)):
+        email = f'loadtest-{i}@example.test'
+        s = requests.Session()
+        s.post(f'{args.base_url}/register', json={'username': f'loadtest-{i}', 'email': email,
+                                                  'password': args.password}, timeout=30)
+        r = s.post(f'{args.base_url}/login', json={'email': email, 'password': args.password}, timeout=30)
+        if r.status_code != 200:
+            sys.exit(f'login failed for {email}: {r.status_code} {r.text[:200]}')
+        sessions.append(s)
+    return sessions
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(math.ceil(p / 100 * len(sorted_values))) - 1)]
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []  # (endpoint, status, seconds)
+
+    def add(self, endpoint, status, seconds):
+        with self.lock:
+            self.samples.append((endpoint, status, seconds))
+
+
+def body_for(prompt):
+    body = {'chat_type': args.chat_type}
+    if args.mode == 'message':
+        body['message'] = prompt
+    else:
+        body['messages'] = [{'role': 'user', 'text': prompt}]
+    if not args.allow_cache:
+        body['cache'] = False
+    return body
+
+
+def worker(logged_in, next_index, stop, results):
+    # requests.Session is not thread-safe: each thread gets its own, with the users' cookies
+    sessions = []
+    for source in logged_in:
+        s = requests.Session()
+        s.cookies.update(source.cookies)
+        sessions.append(s)
+    while not stop.is_set():
+        i = next(next_index)
+        if args.duration is None and i >= args.requests:
+            return
+        endpoint = args.endpoint if args.endpoint != 'both' else ('chat', 'get_response')[i % 2]
+        session = sessions[i % len(sessions)]
+        started = time.monotonic()
+        try:
+            r = session.post(args.base_url + ENDPOINTS[endpoint], json=body_for(random.choice(PROMPTS)),
+                             timeout=args.timeout)
+            status = r.status_code
+        except requests.Timeout:
+            status = 'timeout'
+        except requests.RequestException:
+            status = 'error'
+        results.add(endpoint, status, time.monotonic() - started)
+
+
+def sample_limiter(session, stop, samples):
+    while not stop.is_set():
+        try:
+            data = session.get(f'{args.base_url}/api/chat/cache', timeout=5).json().get('limiter') or {}
+            samples.append(data)
+        except (requests.RequestException, ValueError):
+            pass
+        stop.wait(args.sample_every)
+
+
+def print_report(results, samples, elapsed):
+    print(f'\n{len(results.samples)} requests in {elapsed:.1f}s, concurrency {args.concurrency}, '
+          f'{args.users} users, mode {args.mode}')
+    groups = sorted({e for e, _, _ in results.samples}) + ['all']
+    for group in groups:
+        rows = [s for s in results.samples if group == 'all' or s[0] == group]
+        if not rows:
+            continue
+        statuses = {}
+        for _, status, _ in rows:
+            statuses[status] = statuses.get(status, 0) + 1
+        all_lat = sorted(s for _, _, s in rows)
+        ok_lat = sorted(s for _, status, s in rows if status == 200)
+        print(f'\n{group}: {len(rows)} requests, {len(rows) / elapsed:.2f} req/s, '
+              f'{len(ok_lat) / elapsed:.2f} ok/s, status {statuses}')
+        for label, lat in (('all', all_lat), ('200', ok_lat)):
+            if lat:
+                print(f'  latency {label:>3}: p50 {percentile(lat, 50):.3f}s  p95 {percentile(lat, 95):.3f}s  '
+                      f'p99 {percentile(lat, 99):.3f}s  max {lat[-1]:.3f}s')
+    if samples:
+        capacity = samples[-1].get('max_concurrent') or 0
+        in_flight = [s.get('in_flight', 0) for s in samples]
+        full = sum(1 for n in in_flight if capacity and n >= capacity) / len(in_flight)
+        print(f'\nchat limiter: {capacity} slots; in flight mean '
+              f'{sum(in_flight) / len(in_flight):.1f}, max {max(in_flight)}; all slots taken '
+              f'{full:.0%} of samples; {samples[-1].get("rejected", 0)} rejected since server start')
+    else:
+        print('\nchat limiter: no samples (GET /api/chat/cache unavailable)')
+
+
+sessions = login_sessions()
+results, samples = Results(), []
+stop = threading.Event()
+next_index = itertools.count()
+sampler = threading.Thread(target=sample_limiter, args=(sessions[0], stop, samples), daemon=True)
+threads = [threading.Thread(target=worker, args=(sessions, next_index, stop, results), daemon=True)
+           for _ in range(max(1, args.concurrency))]
+started = time.monotonic()
+sampler.start()
+for t in threads:
+    t.start()
+try:
+    if args.duration is not None:
+        time.sleep(args.duration)
+        stop.set()
+    for t in threads:
+        t.join()
+except KeyboardInterrupt:
+    stop.set()
+stop.set()
+print_report(results, samples, time.monotonic() - started)
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """Diagnóstico: prueba acceso a las URLs de PDF de los artículos.
 
-Usa el mismo entorno del servidor para intentar GET a cada `pdf_url` y variantes (Google Drive).
+Usa el mismo entorno del servidor para intentar GET a cada `pdf_url` y, para enlaces de Google Drive,
+la URL de descarga que obtiene services/drive_resolver.py.
 Imprime estado HTTP y Content-Type para cada intento.
 """
 import sys
@@ -11,7 +12,6 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 from app import create_app
-from urllib.parse import urlparse, parse_qs
 import urllib.request
 import urllib.error
 
@@ -19,6 +19,7 @@ app = create_app()
 
 with app.app_context():
     from models.article import Article
+    from services.drive_resolver import DriveResolutionError, extract_file_id, is_drive_url, resolve, thumbnail_url
     articles = Article.query.filter(Article.pdf_url != None).all()
     if not articles:
         print('No articles with pdf_url found')
@@ -29,28 +30,21 @@ with app.app_context():
         print(f'Article id={a.id} title="{a.title}"')
         print('pdf_url=', a.pdf_url)
         urls_to_try = [a.pdf_url]
-        u = a.pdf_url
-        if 'drive.google.com' in (u or ''):
-            # try common Drive variants
-            m = None
+        if is_drive_url(a.pdf_url):
+            # same resolver the server uses, bypassing its cache
             try:
-                import re
-                m = re.search(r'/file/d/([A-Za-z0-9_-]+)', u)
-            except Exception:
-                m = None
-            if m:
-                did = m.group(1)
-                urls_to_try.append(f'https://drive.google.com/uc?export=download&id={did}')
-                urls_to_try.append(f'https://drive.google.com/thumbnail?id={did}&sz=w800')
-            try:
-                parsed = urlparse(u)
-                qs = parse_qs(parsed.query)
-                if 'id' in qs:
-                    idv = qs['id'][0]
-                    urls_to_try.append(f'https://drive.google.com/uc?export=download&id={idv}')
-                    urls_to_try.append(f'https://drive.google.com/thumbnail?id={idv}&sz=w800')
-            except Exception:
-                pass
+                r = resolve(a.pdf_url, refresh=True)
+                print('drive: file id=', r.file_id, 'direct=', r.direct_url,
+                      'Content-Type=', r.content_type, 'size=', r.content_length)
+                urls_to_try.append(r.direct_url)
+                urls_to_try.append(thumbnail_url(r.file_id))
+            except DriveResolutionError as e:
+                print('drive: not downloadable:', e)
+                fid = extract_file_id(a.pdf_url)
+                if fid:
+                    urls_to_try.append(thumbnail_url(fid))
+            except OSError as e:
+                print('drive: ERROR reaching Google Drive:', e)
 
         tried = set()
         for tu in urls_to_try:
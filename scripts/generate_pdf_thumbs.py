@@ -2,43 +2,183 @@
 """Batch generate PDF thumbnails for articles.
 
 Usage: run this from repo root after installing PyMuPDF:
-    python scripts/generate_pdf_thumbs.py
+    python scripts/generate_pdf_thumbs.py [--workers N] [--batch-size N] [--dry-run] [--restart]
 
-It will iterate Article rows that have `pdf_url` and no `image_url`, try to generate a thumbnail
-using the helper in `services.article_service` and save it to the DB.
+Articles that have `pdf_url` and no `image_url`, or a media-store image without
+WebP/JPEG renditions, are processed in batches of --batch-size (by id). For each
+batch a thumbnail job (services.thumbnail_queue) is queued per article in one
+commit, then the queue is drained with --workers jobs at a time: fetches run in
+threads and renders in the render process pool (services/render_service.py).
+Remote PDFs are read through the /proxy disk cache, so PDFs viewers already
+opened are not downloaded again.
+
+Progress is checkpointed to --checkpoint after every batch; an interrupted run
+resumes after the last finished batch, and the jobs it left running are put back
+in the queue. Jobs that fail are left pending with a backoff and will be retried
+by the worker or by the next run of this script.
+
+--dry-run only counts the remaining work by source type (with known sizes) and
+estimates its duration from the throughput measured by the previous run.
 """
+import argparse
+import json
 import sys
 import os
-import logging
+import time
+from datetime import datetime
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 from app import create_app
+from models import db
+from models.article import Article
+from models.drive_resolution import DriveResolution
+from services import media_service
+from services.article_service import needs_image_job
+from services.drive_resolver import is_drive_url
+from services.thumbnail_queue import enqueue_thumbnail, release_jobs, run_pending
+
+
+def load_checkpoint(args):
+    if not os.path.exists(args.checkpoint):
+        return {}
+    with open(args.checkpoint, 'r', encoding='utf-8') as fh:
+        state = json.load(fh)
+    if args.restart or state.get('complete'):
+        # only the measured throughput carries over to a new run
+        return {'rate': state.get('rate')}
+    return state
+
+
+def save_checkpoint(path, state):
+    state['updated_at'] = datetime.utcnow().isoformat()
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(state, fh, indent=2)
+    os.replace(tmp, path)
+
+
+def needs_pdf_render(article):
+    return bool(article.pdf_url) and not article.image_url
+
+
+def source_kind(article):
+    if not needs_pdf_render(article):
+        return 'image renditions'
+    if media_service.local_path_for_url(article.pdf_url):
+        return 'PDF in media store'
+    if article.pdf_url.startswith('data:'):
+        return 'inline data: PDF'
+    if is_drive_url(article.pdf_url):
+        return 'Google Drive PDF'
+    return 'remote PDF'
+
+
+def known_size(article):
+    """Bytes to fetch/read for an article when known without downloading, else None."""
+    path = media_service.local_path_for_url(article.pdf_url if needs_pdf_render(article) else article.image_url)
+    if path:
+        return os.path.getsize(path)
+    if needs_pdf_render(article) and is_drive_url(article.pdf_url):
+        row = db.session.get(DriveResolution, article.pdf_url)
+        return row.content_length if row is not None else None
+    return None
+
+
+def candidate_batches(after_id, batch_size):
+    """(last id, articles needing work) in id order, `batch_size` at a time (keyset pagination)."""
+    needs_work = (((Article.pdf_url != None) & ((Article.image_url == None) | (Article.image_url == '')))
+                  | ((Article.image_url != None) & (Article.image_renditions == None)))
+    while True:
+        batch = (Article.query.filter(needs_work, Article.id > after_id)
+                 .order_by(Article.id).limit(batch_size).all())
+        if not batch:
+            return
+        after_id = batch[-1].id
+        yield after_id, [a for a in batch if needs_image_job(a)]
+
+
+def dry_run(state, batch_size):
+    kinds = {}
+    for _, articles in candidate_batches(state.get('last_article_id', 0), batch_size):
+        for a in articles:
+            kind = source_kind(a)
+            size = known_size(a)
+            count, total_size, unknown = kinds.get(kind, (0, 0, 0))
+            kinds[kind] = (count + 1, total_size + (size or 0), unknown + (size is None))
+        db.session.expunge_all()
+    total = sum(count for count, _, _ in kinds.values())
+    resume = f' (resuming after article id={state["last_article_id"]})' if state.get('last_article_id') else ''
+    print(f'{total} articles need thumbnails or renditions{resume}')
+    for kind, (count, total_size, unknown) in sorted(kinds.items()):
+        print(f'  {kind:20} {count:6d} articles, {total_size / 1e6:9.1f} MB known'
+              + (f', {unknown} of unknown size' if unknown else ''))
+    if state.get('rate'):
+        print(f'Estimated time at the last measured {state["rate"]:.2f} jobs/s: {total / state["rate"] / 60:.1f} min')
+    else:
+        print('No previous run to estimate the duration from.')
+
+
+def main():
+    app = create_app()
+
+    parser = argparse.ArgumentParser(description='Generate missing PDF thumbnails and image renditions.')
+    parser.add_argument('--workers', type=int, default=app.config['RENDER_WORKERS'],
+                        help='jobs fetched/rendered at once (default: RENDER_WORKERS)')
+    parser.add_argument('--batch-size', type=int, default=50, help='articles queued and committed per batch')
+    parser.add_argument('--checkpoint', default=os.path.join(app.instance_path, 'generate_pdf_thumbs.checkpoint.json'),
+                        help='progress file used to resume an interrupted run')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and start from the first article')
+    parser.add_argument('--dry-run', action='store_true', help='estimate the work without queuing or rendering anything')
+    args = parser.parse_args()
+
+    with app.app_context():
+        state = load_checkpoint(args)
+        if args.dry_run:
+            dry_run(state, args.batch_size)
+            return
+
+        if state.get('in_flight'):
+            released = release_jobs(state['in_flight'])
+            db.session.commit()
+            print(f'Resuming after article id={state.get("last_article_id", 0)}; {released} interrupted jobs re-queued')
+        state.setdefault('last_article_id', 0)
+        state.setdefault('done', 0)
+        state.setdefault('failed', 0)
+
+        started = time.monotonic()
+        processed = 0
+        for last_id, articles in candidate_batches(state['last_article_id'], args.batch_size):
+            jobs = [enqueue_thumbnail(a.id) for a in articles]
+            db.session.commit()
+            state['in_flight'] = [job.id for job in jobs]
+            save_checkpoint(args.checkpoint, state)
+
+            batch_started = time.monotonic()
+            ran = run_pending(concurrency=args.workers)
+            for job in ran:
+                if job.status == 'done':
+                    state['done'] += 1
+                else:
+                    state['failed'] += 1
+                    print(f'  article id={job.article_id} -> {job.status} (attempt {job.attempts}/{job.max_attempts}): {job.last_error}')
+            processed += len(ran)
+            elapsed = time.monotonic() - started
+            batch_time = time.monotonic() - batch_started
+            if processed and elapsed > 0:
+                state['rate'] = processed / elapsed
+            state['last_article_id'] = last_id
+            state['in_flight'] = []
+            save_checkpoint(args.checkpoint, state)
+            db.session.expunge_all()
+            print(f'Batch up to article id={last_id}: {len(ran)} jobs in {batch_time:.1f}s '
+                  f'({len(ran) / batch_time if batch_time > 0 else 0:.2f} jobs/s); '
+                  f'total {state["done"]} generated, {state["failed"]} failed, {state.get("rate") or 0:.2f} jobs/s overall')
+
+        state['complete'] = True
+        save_checkpoint(args.checkpoint, state)
+        print(f'Done. Generated {state["done"]} thumbnails, {state["failed"]} failed or pending retry.')
+
 
-APP = create_app()
-
-with APP.app_context():
-    from models import db
-    from models.article import Article
-    try:
-        from services.article_service import _generate_pdf_thumbnail_dataurl
-    except Exception as e:
-        print('Could not import thumbnail generator from services.article_service:', e)
-        sys.exit(1)
-
-    articles = Article.query.filter(Article.pdf_url != None).filter((Article.image_url == None) | (Article.image_url == '')).all()
-    print(f'Found {len(articles)} articles needing thumbnails')
-    success = 0
-    for a in articles:
-        print(f'Processing Article id={a.id} title="{a.title}" pdf_url={a.pdf_url}')
-        try:
-            thumb = _generate_pdf_thumbnail_dataurl(a.pdf_url, target_width=800)
-            if thumb:
-                a.image_url = thumb
-                db.session.commit()
-                success += 1
-                print('  -> thumbnail generated')
-            else:
-                print('  -> thumbnail generation failed')
-        except Exception as e:
-            db.session.rollback()
-            logging.exception('  -> error generating thumbnail for article id %s', a.id)
-
-    print(f'Done. Generated {success} thumbnails.')
+if __name__ == '__main__':
+    main()
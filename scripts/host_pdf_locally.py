@@ -1,139 +1,147 @@
 #!/usr/bin/env python3
-"""Save article PDF locally and generate thumbnail.
+"""Move article PDFs into the local media store and queue their thumbnails.
 
-Usage: python scripts/host_pdf_locally.py <article_id>
+Usage:
+    python scripts/host_pdf_locally.py <article_id> [<article_id> ...]
+    python scripts/host_pdf_locally.py --all [--workers 4] [--batch-size 50] [--dry-run]
 
-The script will:
-- read the article.pdf_url
-- if it's a data: URL, decode and save as PDF
-- if it's a Drive file link (/file/d/<id> or id=...), try uc?export=download and save
-- update article.pdf_url to local static path and generate thumbnail using service helper
+For every selected article whose pdf_url is not in the media store yet (remote
+link, Google Drive link, data: URL, or a file saved under /static by older
+versions of this script):
+- Drive links are resolved to their direct download URL (services/drive_resolver.py);
+- the PDF is streamed to disk chunk by chunk (never held in memory whole), with
+  --workers downloads at a time over pooled connections (services/http_client.py);
+- it is stored by content hash (services/media_service.py), so identical PDFs
+  share one file;
+- pdf_url is rewritten to the /media URL, --batch-size rows per transaction, and
+  only if it still holds the URL that was downloaded;
+- a thumbnail job is queued for articles that still need one; the server's
+  worker (or scripts/generate_pdf_thumbs.py) renders them.
 """
-import sys, os, base64, re
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 from app import create_app
+
 app = create_app()
 
-if len(sys.argv) < 2:
-    print('Usage: host_pdf_locally.py <article_id>')
+parser = argparse.ArgumentParser(description='Move article PDFs into the local media store.')
+parser.add_argument('article_ids', nargs='*', type=int, help='articles to migrate (default with --all: every article)')
+parser.add_argument('--all', action='store_true', help='migrate every article whose PDF is not hosted locally')
+parser.add_argument('--workers', type=int, default=4, help='concurrent downloads')
+parser.add_argument('--batch-size', type=int, default=50, help='pdf_url rewrites per transaction')
+parser.add_argument('--dry-run', action='store_true', help='only list the articles that would be migrated')
+args = parser.parse_args()
+if not args.article_ids and not args.all:
+    parser.print_usage()
     sys.exit(1)
 
-aid = int(sys.argv[1])
+
+def static_file_path(pdf_url):
+    """Disk path of a PDF saved under /static by the previous version of this script."""
+    if not pdf_url.startswith('/static/'):
+        return None
+    path = os.path.normpath(os.path.join(PROJECT_ROOT, pdf_url.lstrip('/')))
+    return path if path.startswith(os.path.join(PROJECT_ROOT, 'static')) and os.path.isfile(path) else None
+
+
+def needs_hosting(pdf_url):
+    if not pdf_url or media_service.local_path_for_url(pdf_url):
+        return False
+    return pdf_url.startswith(('http://', 'https://', 'data:')) or static_file_path(pdf_url) is not None
+
+
+def host_pdf(article_id, pdf_url):
+    """Store one article's PDF in the media store; returns (article_id, pdf_url, media_url, bytes)."""
+    with app.app_context():
+        max_bytes = app.config.get('MAX_PDF_UPLOAD_BYTES')
+        if pdf_url.startswith('data:'):
+            _, data = media_service.decode_data_url(pdf_url)
+            if data[:4] != b'%PDF':
+                raise ValueError('data URL is not a PDF')
+            return article_id, pdf_url, media_service.store_bytes(data, 'application/pdf'), len(data)
+        path = static_file_path(pdf_url)
+        if path:
+            with open(path, 'rb') as fh:
+                url = media_service.store_stream(fh, 'application/pdf', max_bytes, signature=b'%PDF')
+            return article_id, pdf_url, url, os.path.getsize(path)
+        source = drive_resolver.direct_url(pdf_url)
+        with http_client.open_url(source, timeout=30) as resp:
+            if resp.status >= 400:
+                raise OSError(f'HTTP {resp.status} from {source}')
+            url = media_service.store_stream(resp, 'application/pdf', max_bytes, signature=b'%PDF')
+        return article_id, pdf_url, url, os.path.getsize(media_service.local_path_for_url(url))
+
+
+def apply_batch(results):
+    """Rewrite pdf_url for a batch of hosted PDFs in one transaction and queue thumbnails."""
+    rewritten = 0
+    for article_id, old_url, new_url, _ in results:
+        # skip articles whose PDF was changed while it was downloading
+        rewritten += Article.query.filter(Article.id == article_id, Article.pdf_url == old_url).update(
+            {'pdf_url': new_url}, synchronize_session=False)
+    db.session.expire_all()
+    queued = 0
+    for article in Article.query.filter(Article.id.in_([r[0] for r in results])).all():
+        if needs_image_job(article):
+            enqueue_thumbnail(article.id)
+            queued += 1
+    db.session.commit()
+    return rewritten, queued
+
 
 with app.app_context():
-    from models.article import Article
     from models import db
-    from services.article_service import _generate_pdf_thumbnail_dataurl
-    from urllib.parse import urlparse, parse_qs
-    import urllib.request
-
-    a = Article.query.get(aid)
-    if not a:
-        print('Article not found')
-        sys.exit(2)
-
-    pdf_src = a.pdf_url
-    if not pdf_src:
-        print('No pdf_url for this article')
+    from models.article import Article
+    from services import drive_resolver, http_client, media_service
+    from services.article_service import needs_image_job
+    from services.thumbnail_queue import enqueue_thumbnail, notify_worker
+
+    query = db.session.query(Article.id, Article.pdf_url).filter(Article.pdf_url != None)
+    if args.article_ids:
+        query = query.filter(Article.id.in_(args.article_ids))
+    todo = [(aid, url) for aid, url in query.order_by(Article.id).all() if needs_hosting(url)]
+    print(f'{len(todo)} articles have PDFs to host locally')
+    if args.dry_run:
+        for aid, url in todo:
+            print(f'  article id={aid}: {url[:80]}')
         sys.exit(0)
 
-    upload_dir = os.path.join(PROJECT_ROOT, 'static', 'uploads', 'pdfs')
-    os.makedirs(upload_dir, exist_ok=True)
-
-    saved_path = None
-    # data: URL
-    if pdf_src.startswith('data:'):
-        try:
-            b64 = pdf_src.split(',',1)[1]
-            data = base64.b64decode(b64)
-            fname = f'article-{aid}.pdf'
-            saved_path = os.path.join(upload_dir, fname)
-            with open(saved_path, 'wb') as fh:
-                fh.write(data)
-            print('Saved data: PDF to', saved_path)
-        except Exception as e:
-            print('Failed to decode data URL:', e)
-    else:
-        # try Drive file id
-        if 'drive.google.com' in pdf_src:
-            m = re.search(r'/file/d/([A-Za-z0-9_-]+)', pdf_src)
-            fid = None
-            if m:
-                fid = m.group(1)
-            else:
-                try:
-                    qs = parse_qs(urlparse(pdf_src).query)
-                    fid = qs.get('id',[None])[0]
-                except Exception:
-                    fid = None
-            if fid:
-                alt = f'https://drive.google.com/uc?export=download&id={fid}'
-                print('Attempting to fetch drive file id=', fid)
-                try:
-                    req = urllib.request.Request(alt, headers={'User-Agent':'Mozilla/5.0'}, method='GET')
-                    with urllib.request.urlopen(req, timeout=20) as r:
-                        content = r.read()
-                        if content[:4] == b'%PDF':
-                            fname = f'article-{aid}.pdf'
-                            saved_path = os.path.join(upload_dir, fname)
-                            with open(saved_path, 'wb') as fh:
-                                fh.write(content)
-                            print('Saved drive PDF to', saved_path)
-                        else:
-                            print('Downloaded content is not a PDF (len=', len(content),')')
-                except Exception as e:
-                    print('Error fetching drive uc URL:', e)
-            else:
-                print('No drive file id found in URL; cannot auto-download')
-        else:
-            # try direct fetch
+    started = time.monotonic()
+    pending, hosted, failed, total_bytes, rewritten, queued = [], [], 0, 0, 0, 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(host_pdf, aid, url): aid for aid, url in todo}
+        for future in as_completed(futures):
+            aid = futures[future]
             try:
-                req = urllib.request.Request(pdf_src, headers={'User-Agent':'Mozilla/5.0'}, method='GET')
-                with urllib.request.urlopen(req, timeout=20) as r:
-                    content = r.read()
-                    if content[:4] == b'%PDF':
-                        fname = f'article-{aid}.pdf'
-                        saved_path = os.path.join(upload_dir, fname)
-                        with open(saved_path, 'wb') as fh:
-                            fh.write(content)
-                        print('Saved remote PDF to', saved_path)
-                    else:
-                        print('Remote content not a PDF; content-type=', r.headers.get('Content-Type'))
-            except Exception as e:
-                print('Error fetching remote URL:', e)
-
-    if not saved_path:
-        print('Could not save PDF for article', aid)
-        sys.exit(3)
-
-    # Update DB pdf_url to local static path
-    public_path = f'/static/uploads/pdfs/{os.path.basename(saved_path)}'
-    a.pdf_url = public_path
-    try:
-        db.session.commit()
-        print('Updated article.pdf_url ->', public_path)
-    except Exception as e:
-        db.session.rollback()
-        print('Failed to update DB:', e)
-
-    # generate thumbnail
-    try:
-        with open(saved_path, 'rb') as fh:
-            b = fh.read()
-            data_url = 'data:application/pdf;base64,' + base64.b64encode(b).decode('ascii')
-            thumb = _generate_pdf_thumbnail_dataurl(data_url, target_width=800)
-            if thumb:
-                a.image_url = thumb
-                db.session.commit()
-                print('Generated and saved thumbnail for article', aid)
-            else:
-                print('Thumbnail generation failed')
-    except Exception as e:
-        db.session.rollback()
-        print('Error generating thumbnail:', e)
-
-    print('Done')
+                result = future.result()
+            except (OSError, ValueError) as e:
+                failed += 1
+                print(f'  article id={aid}: failed: {e}')
+                continue
+            hosted.append(result)
+            pending.append(result)
+            total_bytes += result[3]
+            print(f'  article id={aid}: stored {result[3] / 1e6:.1f} MB -> {result[2]}')
+            if len(pending) >= args.batch_size:
+                r, q = apply_batch(pending)
+                rewritten, queued, pending = rewritten + r, queued + q, []
+    if pending:
+        r, q = apply_batch(pending)
+        rewritten, queued = rewritten + r, queued + q
+    notify_worker()
+
+    elapsed = time.monotonic() - started
+    files = len({r[2] for r in hosted})
+    print(f'Done in {elapsed:.1f}s: {len(hosted)} PDFs hosted ({files} distinct files, '
+          f'{total_bytes / 1e6:.1f} MB, {total_bytes / 1e6 / elapsed if elapsed > 0 else 0:.1f} MB/s), '
+          f'{rewritten} pdf_url rewritten, {failed} failed, {queued} thumbnail jobs queued.')
+    if queued:
+        print('Thumbnails are rendered by the server worker or: python scripts/generate_pdf_thumbs.py')
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Move inline data: URLs out of the DB into the content-addressed media store.
+
+Usage: python scripts/migrate_media_to_store.py [--dry-run]
+
+Rewrites article.image_url, article.pdf_url and user.photo_url from
+data:<mime>;base64,... to /media/<sha256>.<ext>. The stored URL is relative; the
+API adds MEDIA_BASE_URL (or the request's host) when it sends it. Absolute media
+URLs written by earlier versions (http://localhost:5000/media/..., also inside
+article.image_renditions) are made relative too. Identical blobs are stored once.
+Safe to re-run: rows that are already relative or not media are skipped.
+"""
+import argparse
+import json
+import os
+import sys
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app import create_app
+
+BATCH_SIZE = 50
+
+
+def migrate_column(db, model, column, dry_run=False):
+    from services.media_service import externalize
+    attr = getattr(model, column)
+    moved = 0
+    failed = 0
+    last_id = 0
+    while True:
+        # walk by id so rewritten rows (no longer data:) are never revisited
+        rows = (db.session.query(model.id, attr)
+                .filter(model.id > last_id, attr.like('data:%'))
+                .order_by(model.id).limit(BATCH_SIZE).all())
+        if not rows:
+            break
+        for row_id, value in rows:
+            last_id = row_id
+            try:
+                url = externalize(value) if not dry_run else None
+            except (ValueError, OSError) as e:
+                failed += 1
+                print(f'  {model.__tablename__}.{column} id={row_id}: {e}')
+                continue
+            moved += 1
+            if not dry_run:
+                db.session.query(model).filter(model.id == row_id).update({attr: url}, synchronize_session=False)
+        if not dry_run:
+            db.session.commit()
+    return moved, failed
+
+
+def relativize_column(db, model, column, dry_run=False):
+    """Rewrite absolute media store URLs (any host) in `column` to /media/<name>."""
+    from services.media_service import stored_url
+    attr = getattr(model, column)
+    rows = (db.session.query(model.id, attr)
+            .filter(attr.like('%://%/media/%')).order_by(model.id).all())
+    changed = 0
+    for row_id, value in rows:
+        url = stored_url(value)
+        if url == value:
+            continue
+        changed += 1
+        if not dry_run:
+            db.session.query(model).filter(model.id == row_id).update({attr: url}, synchronize_session=False)
+    if not dry_run:
+        db.session.commit()
+    return changed
+
+
+def relativize_renditions(db, dry_run=False):
+    """Rewrite absolute media store URLs inside article.image_renditions."""
+    from models import Article
+    from services.media_service import stored_url
+    rows = (db.session.query(Article.id, Article.image_renditions)
+            .filter(Article.image_renditions.like('%://%/media/%')).order_by(Article.id).all())
+    changed = 0
+    for row_id, value in rows:
+        try:
+            renditions = json.loads(value)
+        except ValueError:
+            continue
+        srcset = {}
+        for fmt, items in renditions.items():
+            if isinstance(items, list):
+                for r in items:
+                    r['url'] = stored_url(r.get('url'))
+                srcset[fmt] = ', '.join(f"{r['url']} {r['width']}w" for r in items)
+        if 'srcset' in renditions:
+            renditions['srcset'] = srcset
+        updated = json.dumps(renditions)
+        if updated == value:
+            continue
+        changed += 1
+        if not dry_run:
+            db.session.query(Article).filter(Article.id == row_id).update(
+                {Article.image_renditions: updated}, synchronize_session=False)
+    if not dry_run:
+        db.session.commit()
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help='only count the rows that would be moved')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        from models import db, Article, User
+        for model, column in ((Article, 'image_url'), (Article, 'pdf_url'), (User, 'photo_url')):
+            moved, failed = migrate_column(db, model, column, dry_run=args.dry_run)
+            verb = 'would move' if args.dry_run else 'moved'
+            print(f'{model.__tablename__}.{column}: {verb} {moved}, failed {failed}')
+            changed = relativize_column(db, model, column, dry_run=args.dry_run)
+            print(f'{model.__tablename__}.{column}: {"would make" if args.dry_run else "made"} '
+                  f'{changed} absolute media URLs relative')
+        changed = relativize_renditions(db, dry_run=args.dry_run)
+        print(f'article.image_renditions: {"would rewrite" if args.dry_run else "rewrote"} {changed} rendition maps')
+        if not args.dry_run:
+            # shrink the DB file now that the blobs are gone
+            from sqlalchemy import text
+            with db.engine.connect() as conn:
+                conn.execution_options(isolation_level='AUTOCOMMIT').execute(text('VACUUM'))
+    print('Done')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Gemini generateContent / streamGenerateContent endpoints.
+
+Usage:
+    python scripts/mock_gemini.py [--port 8090] [--latency lognormal:1.5,0.4] [--tokens-per-second 40]
+                                  [--reply-tokens uniform:80,400] [--error-rate 0.02] [--error-status 429,503]
+                                  [--hang-rate 0] [--seed N]
+
+Then point the app at it (any key longer than 10 characters is accepted):
+    CHAT_MODEL_URL=http://127.0.0.1:8090/v1/models/gemini-2.5-flash GOOGLE_API_KEY=mock-key-123 python run.py
+
+Each request waits --latency seconds (time to first token), then produces a reply
+of --reply-tokens tokens at --tokens-per-second: generateContent answers once the
+whole reply is "generated"; streamGenerateContent?alt=sse sends it in chunks as it
+goes. --error-rate of the requests fail with one of --error-status (429 replies
+carry Retry-After) and --hang-rate of them never answer, to exercise client
+timeouts. Distributions: fixed:X, uniform:A,B, normal:MEAN,SD, lognormal:MEDIAN,SIGMA.
+
+Per-status counts and latencies are printed every --report-every seconds.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ('el producto reduce el tiempo de cicatrización en heridas crónicas y mejora la oxigenación '
+         'del lecho de la herida según la evidencia clínica disponible para el médico').split()
+CHUNK_TOKENS = 8
+
+
+def parse_distribution(spec):
+    """A function returning one sample of `spec` (see the module docstring), never below 0."""
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',')] if params else []
+    if kind == 'fixed' and len(values) == 1:
+        return lambda: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'normal' and len(values) == 2:
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == 'lognormal' and len(values) == 2:
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise argparse.ArgumentTypeError(f'invalid distribution: {spec}')
+
+
+parser = argparse.ArgumentParser(description='Mock Gemini API for offline chat benchmarks.')
+parser.add_argument('--host', default='127.0.0.1')
+parser.add_argument('--port', type=int, default=8090)
+parser.add_argument('--latency', type=parse_distribution, default='lognormal:1.5,0.4',
+                    help='seconds before the first token (default lognormal:1.5,0.4)')
+parser.add_argument('--tokens-per-second', type=float, default=40.0, help='generation speed (0 = instant)')
+parser.add_argument('--reply-tokens', type=parse_distribution, default='uniform:80,400',
+                    help='reply length in tokens (default uniform:80,400)')
+parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with an error')
+parser.add_argument('--error-status', default='429,503', help='error statuses to pick from')
+parser.add_argument('--hang-rate', type=float, default=0.0, help='fraction of requests that never answer')
+parser.add_argument('--seed', type=int, help='random seed, for repeatable runs')
+parser.add_argument('--report-every', type=float, default=10.0, help='seconds between stats lines (0 = never)')
+args = parser.parse_args()
+if args.seed is not None:
+    random.seed(args.seed)
+ERROR_STATUSES = [int(s) for s in args.error_status.split(',') if s.strip()]
+
+stats_lock = threading.Lock()
+stats = {'requests': 0, 'in_flight': 0, 'by_status': {}, 'latencies': []}
+
+
+def record(status, seconds):
+    with stats_lock:
+        stats['by_status'][status] = stats['by_status'].get(status, 0) + 1
+        stats['latencies'].append(seconds)
+
+
+def reply_text(tokens):
+    return ' '.join(random.choice(WORDS) for _ in range(max(1, int(tokens))))
+
+
+def usage(prompt_tokens, reply_tokens):
+    return {'promptTokenCount': prompt_tokens, 'candidatesTokenCount': reply_tokens,
+            'totalTokenCount': prompt_tokens + reply_tokens}
+
+
+def chunk_json(text, usage_so_far, finish=False):
+    candidate = {'content': {'role': 'model', 'parts': [{'text': text}]}, 'index': 0}
+    if finish:
+        candidate['finishReason'] = 'STOP'
+    return json.dumps({'candidates': [candidate], 'usageMetadata': usage_so_far}, ensure_ascii=False)
+
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *a):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        started = time.monotonic()
+        request_bytes = len(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+        path = self.path.split('?', 1)[0]
+        if not (path.endswith(':generateContent') or path.endswith(':streamGenerateContent')):
+            return self._send_json(404, {'error': {'code': 404, 'message': f'unknown method {path}'}})
+        if not (self.headers.get('x-goog-api-key') or 'key=' in self.path):
+            return self._send_json(403, {'error': {'code': 403, 'message': 'API key missing'}})
+        with stats_lock:
+            stats['requests'] += 1
+            stats['in_flight'] += 1
+        try:
+            # about 4 bytes per token, like the app's own estimate
+            self._generate(path.endswith(':streamGenerateContent'), started, max(1, request_bytes // 4))
+        except (BrokenPipeError, ConnectionResetError):
+            record('disconnected', time.monotonic() - started)
+        finally:
+            with stats_lock:
+                stats['in_flight'] -= 1
+
+    def _generate(self, stream, started, prompt_tokens):
+        roll = random.random()
+        if roll < args.hang_rate:
+            time.sleep(3600)
+            return
+        time.sleep(args.latency())
+        if roll < args.hang_rate + args.error_rate and ERROR_STATUSES:
+            status = random.choice(ERROR_STATUSES)
+            headers = {'Retry-After': '1'} if status == 429 else None
+            self._send_json(status, {'error': {'code': status, 'message': 'mock error', 'status': 'UNAVAILABLE'}}, headers)
+            record(status, time.monotonic() - started)
+            return
+
+        tokens = max(1, int(args.reply_tokens()))
+        delay = CHUNK_TOKENS / args.tokens_per_second if args.tokens_per_second > 0 else 0
+        if not stream:
+            time.sleep(tokens * delay / CHUNK_TOKENS)
+            self._send_json(200, {'candidates': [{'content': {'role': 'model', 'parts': [{'text': reply_text(tokens)}]},
+                                                  'finishReason': 'STOP', 'index': 0}],
+                                  'usageMetadata': usage(prompt_tokens, tokens)})
+            record(200, time.monotonic() - started)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        sent = 0
+        while sent < tokens:
+            n = min(CHUNK_TOKENS, tokens - sent)
+            sent += n
+            words = reply_text(n) + ' '
+            chunk = chunk_json(words, usage(prompt_tokens, sent), finish=sent >= tokens)
+            self.wfile.write(f'data: {chunk}\r\n\r\n'.encode('utf-8'))
+            self.wfile.flush()
+            if sent < tokens:
+                time.sleep(delay)
+        record(200, time.monotonic() - started)
+        self.close_connection = True
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(math.ceil(p / 100 * len(sorted_values))) - 1)]
+
+
+def report():
+    while True:
+        time.sleep(args.report_every)
+        with stats_lock:
+            latencies = sorted(stats['latencies'])
+            line = (f"[mock] {stats['requests']} requests, {stats['in_flight']} in flight, "
+                    f"status {stats['by_status']}, p50 {percentile(latencies, 50):.2f}s "
+                    f"p99 {percentile(latencies, 99):.2f}s")
+        print(line, flush=True)
+
+
+server = ThreadingHTTPServer((args.host, args.port), MockGeminiHandler)
+server.daemon_threads = True
+print(f'Mock Gemini listening on http://{args.host}:{args.port}/v1/models/gemini-2.5-flash', flush=True)
+if args.report_every > 0:
+    threading.Thread(target=report, daemon=True).start()
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""Rebuild the full-text search index (article_fts) from the article table.
+
+Usage: python scripts/rebuild_search_index.py
+
+Run it after importing articles directly into the DB or if search results look stale.
+"""
+import os
+import sys
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app import create_app
+
+app = create_app()
+
+with app.app_context():
+    from services.search_service import rebuild_search_index
+    count = rebuild_search_index()
+    print(f'Indexed {count} articles')
@@ -1,44 +1,115 @@
 #!/usr/bin/env python3
 """
-Simple script to remove near-white background from a PNG and save a transparent version.
+Remove the near-white background from images and save transparent PNGs.
 Usage:
-  python scripts/remove_white_bg.py static/img/chatbot-avatar.png
-This will create a backup of the original file with .bak and overwrite the input with a transparent-background PNG.
-Requires: Pillow
-Install: pip install pillow
+  python scripts/remove_white_bg.py static/img/chatbot-avatar.png [out.png]
+  python scripts/remove_white_bg.py static/img/ 'uploads/avatars/*.jpg' --out-dir cleaned/ --soft 30 --workers 4
+Single files are overwritten in place (the original is kept as <file>.bak) unless an
+output path or --out-dir is given. Directories are expanded to the images they contain
+and glob patterns are expanded; files are processed in parallel in a process pool.
+The pixel work is done by utils/image_utils.remove_white_background (NumPy).
+Requires: Pillow, numpy
+Install: pip install pillow numpy
 """
+import argparse
+import glob
+import os
+import shutil
 import sys
-from PIL import Image
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from PIL import Image
+from utils.image_utils import remove_white_background
 
-def remove_white_bg(path, out_path=None, threshold=240):
-    img = Image.open(path).convert("RGBA")
-    datas = img.getdata()
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp')
 
-    newData = []
-    for item in datas:
-        r, g, b, a = item
-        if r >= threshold and g >= threshold and b >= threshold:
-            # make transparent
-            newData.append((255, 255, 255, 0))
-        else:
-            newData.append((r, g, b, a))
 
-    img.putdata(newData)
+def remove_white_bg(path, out_path=None, threshold=240, softness=0):
+    img = remove_white_background(Image.open(path), threshold, softness)
     if out_path is None:
         # backup original
         bak = path + ".bak"
-        import shutil
         shutil.copy2(path, bak)
         out_path = path
     img.save(out_path, "PNG")
-    print(f"Saved transparent image to {out_path}")
+    return out_path
 
 
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python scripts/remove_white_bg.py path/to/image.png [out.png]")
+def expand_inputs(patterns):
+    """Files named by `patterns`: plain files, directories (their images) and glob patterns."""
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in sorted(os.listdir(pattern))
+                       if name.lower().endswith(IMAGE_EXTENSIONS)]
+        elif os.path.exists(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(p for p in glob.glob(pattern, recursive=True) if p.lower().endswith(IMAGE_EXTENSIONS))
+        files.extend(m for m in matches if m not in files)
+    return files
+
+
+def _process(task):
+    path, out_path, threshold, softness = task
+    try:
+        return path, remove_white_bg(path, out_path, threshold, softness), None
+    except (OSError, ValueError) as e:
+        return path, None, str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Make the near-white background of images transparent.')
+    parser.add_argument('inputs', nargs='+', help='image files, directories or glob patterns')
+    parser.add_argument('--out-dir', help='write <name>.png here instead of overwriting the inputs')
+    parser.add_argument('--threshold', type=int, default=240, help='R, G and B at or above this are background (default 240)')
+    parser.add_argument('--soft', type=int, default=0,
+                        help='width of the soft alpha edge below the threshold (0 = hard edge)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='parallel processes')
+    args = parser.parse_args()
+
+    inputs = args.inputs
+    out_path = None
+    # original two-argument form: remove_white_bg.py in.png out.png (pass a directory or glob to batch two files)
+    if (len(inputs) == 2 and not args.out_dir and os.path.isfile(inputs[0])
+            and not os.path.isdir(inputs[1]) and not glob.has_magic(inputs[1])):
+        inputs, out_path = inputs[:1], inputs[1]
+
+    files = expand_inputs(inputs)
+    if not files:
+        print('No images found')
         sys.exit(1)
-    path = sys.argv[1]
-    out = sys.argv[2] if len(sys.argv) > 2 else None
-    remove_white_bg(path, out)
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+    tasks = [(f, os.path.join(args.out_dir, os.path.splitext(os.path.basename(f))[0] + '.png') if args.out_dir else out_path,
+              args.threshold, args.soft) for f in files]
+
+    started = time.monotonic()
+    failed = 0
+    pool = ProcessPoolExecutor(max_workers=args.workers) if len(tasks) > 1 and args.workers > 1 else None
+    try:
+        if pool is None:
+            results = map(_process, tasks)
+        else:
+            results = pool.map(_process, tasks, chunksize=max(1, len(tasks) // (args.workers * 4)))
+        for path, saved, error in results:
+            if error:
+                failed += 1
+                print(f"Failed {path}: {error}")
+            else:
+                print(f"Saved transparent image to {saved}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    elapsed = time.monotonic() - started
+    print(f"Processed {len(tasks) - failed}/{len(tasks)} images in {elapsed:.1f}s")
+    if failed:
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
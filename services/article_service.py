@@ -1,82 +1,95 @@
-from flask import jsonify, session
+from flask import Response, current_app, jsonify, redirect, request, session, url_for
 from models.article import Article
 from models.favorite import Favorite
 from models.user import User
 from models import db, Notification
-import unicodedata
-import urllib.request
-import urllib.error
+from services import drive_resolver, http_client, media_service, render_service, rendition_service
+from services.thumbnail_queue import enqueue_thumbnail, notify_worker
+from services.proxy_cache import NotCacheable, get_proxy_cache
+from services.search_service import index_article, match_subquery, remove_article
+from utils.text_utils import normalize_text as _normalize_text
 import base64
-import re
+import binascii
+import hashlib
+import json
 import logging
+from datetime import datetime
+from sqlalchemy import and_, func, or_
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import load_only, undefer
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# Page sizes for the paginated listing mode of get_all_articles
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
 
-def _generate_pdf_thumbnail_dataurl(pdf_src: str, target_width: int = 800) -> Optional[str]:
-    """Try to fetch the PDF (data URL or remote) and render first page to a JPEG data URL.
-    Returns data:image/jpeg;base64,... or None on failure.
-    Requires PyMuPDF (fitz)."""
-    try:
+# ?view=summary loads only these columns: no content, no inline image/PDF bytes
+SUMMARY_COLUMNS = (
+    Article.id, Article.title, Article.excerpt, Article.reading_time, Article.tag,
+    Article.video_url, Article.user_id, Article.created_at, Article.image_renditions,
+)
+VIEWS = ('full', 'summary')
+
+
+def _load_pdf_bytes(pdf_src: str) -> Optional[bytes]:
+    """Return the PDF bytes behind `pdf_src` (media store URL, data URL or remote link), or None."""
+    local_path = media_service.local_path_for_url(pdf_src)
+    if local_path:
+        with open(local_path, 'rb') as fh:
+            return fh.read()
+    if pdf_src.startswith('data:'):
+        # data:<mime>;base64,xxxxx
         try:
-            import fitz  # PyMuPDF
-        except ModuleNotFoundError as e:
-            logger.warning('PyMuPDF not available, cannot generate PDF thumbnails: %s', e)
+            return media_service.decode_data_url(pdf_src)[1]
+        except ValueError:
+            logger.exception('pdf thumbnail: failed to decode data URL')
             return None
+    # remote URL; Drive links go through the cached resolver instead of trying every variant
+    url = drive_resolver.direct_url(pdf_src)
+    try:
+        status, _, content = http_client.fetch_bytes(
+            url, max_bytes=current_app.config.get('MAX_PDF_UPLOAD_BYTES'), timeout=20)
+    except OSError as exc:
+        logger.exception('pdf thumbnail: failed to fetch URL %s: %s', url, exc)
+        return None
+    # quick check for PDF signature
+    if status >= 400 or content[:4] != b'%PDF':
+        return None
+    return content
+
 
-        pdf_bytes = None
-        if pdf_src.startswith('data:'):
-            # data:<mime>;base64,xxxxx
+def _pdf_source(pdf_src: str):
+    """File path or bytes of a PDF, for rendering.
+
+    Prefers files already on disk: the media store, then the /proxy disk cache
+    (shared with viewers, so a remote PDF is downloaded once); other sources are
+    fetched into memory by _load_pdf_bytes.
+    """
+    local_path = media_service.local_path_for_url(pdf_src)
+    if local_path:
+        return local_path
+    if pdf_src.startswith(('http://', 'https://')):
+        cache = get_proxy_cache()
+        if cache is not None:
             try:
-                b64 = pdf_src.split(',', 1)[1]
-                pdf_bytes = base64.b64decode(b64)
-            except (IndexError, ValueError, TypeError):
-                logger.exception('pdf thumbnail: failed to decode data URL')
-                return None
-        else:
-            # remote URL - try to fetch directly; handle common Google Drive variants
-            candidate_urls = [pdf_src]
-            if 'drive.google.com' in pdf_src:
-                m = re.search(r'/file/d/([A-Za-z0-9_-]+)', pdf_src)
-                if m:
-                    did = m.group(1)
-                    candidate_urls.append(f'https://drive.google.com/uc?export=download&id={did}')
-                # also try id= query
-                try:
-                    from urllib.parse import urlparse, parse_qs
-                    q = urlparse(pdf_src).query
-                    qs = parse_qs(q)
-                    mid = qs.get('id', [None])[0]
-                    if mid:
-                        candidate_urls.append(f'https://drive.google.com/uc?export=download&id={mid}')
-                except (ImportError, ValueError):
-                    pass
-
-            for u in candidate_urls:
-                try:
-                    req = urllib.request.Request(u, headers={'User-Agent': 'Mozilla/5.0'}, method='GET')
-                    with urllib.request.urlopen(req, timeout=20) as resp:
-                        status = resp.getcode()
-                        if status >= 400:
-                            continue
-                        content = resp.read()
-                        # quick check for PDF signature
-                        if content[:4] != b'%PDF':
-                            # not a PDF
-                            continue
-                        pdf_bytes = content
-                        break
-                except (urllib.error.URLError, urllib.error.HTTPError, OSError) as exc:
-                    logger.exception('pdf thumbnail: failed to fetch or validate URL %s: %s', u, exc)
-                    continue
+                return cache.local_path(drive_resolver.direct_url(pdf_src))
+            except NotCacheable:
+                pass
+    return _load_pdf_bytes(pdf_src)
 
-        if not pdf_bytes:
-            return None
 
-        # Render first page using PyMuPDF
-        doc = fitz.open(stream=pdf_bytes, filetype='pdf')
+def _render_pdf_thumbnail(pdf_source, target_width: int = 800) -> Optional[bytes]:
+    """Render the first page of a PDF (bytes, or a file path opened in place) to JPEG bytes.
+    Requires PyMuPDF (fitz)."""
+    try:
+        import fitz  # PyMuPDF
+    except ModuleNotFoundError as e:
+        logger.warning('PyMuPDF not available, cannot generate PDF thumbnails: %s', e)
+        return None
+    doc = rendition_service.open_pdf(fitz, pdf_source)
+    try:
         if doc.page_count < 1:
             return None
         page = doc.load_page(0)
@@ -85,14 +98,82 @@ def _generate_pdf_thumbnail_dataurl(pdf_src: str, target_width: int = 800) -> Op
         scale = target_width / rect.width if rect.width > 0 else 1.0
         mat = fitz.Matrix(scale, scale)
         pix = page.get_pixmap(matrix=mat, alpha=False)
-        img_bytes = pix.tobytes(output='jpeg')
-        data_url = 'data:image/jpeg;base64,' + base64.b64encode(img_bytes).decode('ascii')
-        return data_url
+        return pix.tobytes(output='jpeg')
+    finally:
+        doc.close()
+
+
+def _generate_pdf_thumbnail_dataurl(pdf_src: str, target_width: int = 800) -> Optional[str]:
+    """Try to fetch the PDF (data URL or remote) and render first page to a JPEG data URL.
+    Returns data:image/jpeg;base64,... or None on failure.
+    Requires PyMuPDF (fitz)."""
+    try:
+        pdf_bytes = _load_pdf_bytes(pdf_src)
+        if not pdf_bytes:
+            return None
+        img_bytes = _render_pdf_thumbnail(pdf_bytes, target_width)
+        if not img_bytes:
+            return None
+        return 'data:image/jpeg;base64,' + base64.b64encode(img_bytes).decode('ascii')
     except Exception as e:
         logger.exception('Error generating PDF thumbnail: %s', e)
         return None
 
 
+def generate_pdf_thumbnail_url(pdf_src: str, target_width: int = 800) -> Optional[str]:
+    """Like _generate_pdf_thumbnail_dataurl, but stores the JPEG in the media store
+    and returns its short URL (what should go into Article.image_url)."""
+    try:
+        pdf_source = _pdf_source(pdf_src)
+        if not pdf_source:
+            return None
+        img_bytes = _render_pdf_thumbnail(pdf_source, target_width)
+        if not img_bytes:
+            return None
+        return media_service.store_bytes(img_bytes, 'image/jpeg')
+    except Exception as e:
+        logger.exception('Error generating PDF thumbnail: %s', e)
+        return None
+
+
+def needs_image_job(article) -> bool:
+    """True when the article needs background image work: a PDF thumbnail, or
+    renditions of an image stored in the media store."""
+    if article.pdf_url and not article.image_url:
+        return True
+    return bool(article.image_url and not article.image_renditions
+                and media_service.local_path_for_url(article.image_url))
+
+
+def build_article_images(article, overwrite: bool = False) -> bool:
+    """Produce the article image and its renditions (used by the thumbnail queue).
+
+    - PDF without image (or `overwrite`): render page one into WebP/JPEG renditions
+      and point image_url at the 800px JPEG.
+    - Image in the media store without renditions: build them from that file.
+    Returns False when the work failed and should be retried.
+    """
+    if article.pdf_url and (overwrite or not article.image_url):
+        # PDFs on disk (media store, proxy cache) are rendered straight from their file
+        pdf_source = _pdf_source(article.pdf_url)
+        if not pdf_source:
+            return False
+        # rendered in the process pool: a stuck or oversized PDF raises RenderError
+        # (recorded on the job and retried) instead of blocking this worker
+        renditions = render_service.render_pdf_renditions(pdf_source)
+        if not renditions:
+            return False
+        article.image_url = rendition_service.pick(renditions, 800, 'jpeg')
+        article.image_renditions = json.dumps(renditions)
+        return True
+    local_path = media_service.local_path_for_url(article.image_url)
+    if local_path and not article.image_renditions:
+        with open(local_path, 'rb') as fh:
+            renditions = rendition_service.renditions_from_image(fh.read())
+        if renditions:
+            article.image_renditions = json.dumps(renditions)
+    return True
+
 
 def update_article(article_id, data):
     # Require authenticated user
@@ -110,42 +191,47 @@ def update_article(article_id, data):
         article.title = data.get('title')
     if 'content' in data:
         article.content = data.get('content').replace('\r\n', '\n').replace('\r', '\n')
-    if 'image_url' in data:
-        article.image_url = data.get('image_url')
-    if 'pdf_url' in data:
-        # store PDF (base64 data URL or link)
-        article.pdf_url = data.get('pdf_url')
+        article.refresh_summary()
+    try:
+        # inline data URLs go to the media store; the row only keeps the short URL
+        if 'image_url' in data:
+            article.image_url = media_service.externalize(data.get('image_url'))
+            article.image_renditions = None
+        if 'pdf_url' in data:
+            # store PDF (base64 data URL or link)
+            article.pdf_url = media_service.externalize(data.get('pdf_url'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     if 'tag' in data:
         article.tag = data.get('tag')
 
+    # Queue server-side thumbnail/rendition generation (PDF without image, new uploaded image)
+    thumbnail_job = None
+    if needs_image_job(article):
+        thumbnail_job = enqueue_thumbnail(article.id)
+
     try:
+        index_article(article)
         db.session.commit()
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
-
-    # After commit, if article has a pdf_url but no image_url, try to generate a thumbnail server-side
-    try:
-        if article.pdf_url and not article.image_url:
-            thumb = _generate_pdf_thumbnail_dataurl(article.pdf_url, target_width=800)
-            if thumb:
-                article.image_url = thumb
-                db.session.commit()
-    except (SQLAlchemyError, OSError, ValueError) as exc:
-        logger.exception('update_article: failed to generate thumbnail or commit: %s', exc)
-        db.session.rollback()
+    if thumbnail_job:
+        notify_worker()
 
     return jsonify({
         'id': article.id,
         'title': article.title,
         'content': article.content,
-        'image_url': article.image_url,
-        'pdf_url': article.pdf_url,
-        'author_photo_url': article.author.photo_url if article.author else None,
+        'image_url': media_service.public_url(article.image_url),
+        'image_renditions': media_service.public_renditions(article.renditions),
+        'pdf_url': media_service.public_url(article.pdf_url),
+        'author_photo_url': media_service.public_url(article.author.photo_url) if article.author else None,
         'tag': article.tag,
         'author': article.author.username if article.author else None,
         'created_at': article.created_at.strftime('%d-%m-%Y') if article.created_at else None,
-        'user_id': article.user_id
+        'user_id': article.user_id,
+        'thumbnail_job': thumbnail_job.to_dict() if thumbnail_job else None
     })
 
 def delete_article(article_id):
@@ -158,6 +244,7 @@ def delete_article(article_id):
         return jsonify({'message': 'No autorizado para eliminar este articulo'}), 403
     
     try:
+        remove_article(article.id)
         db.session.delete(article)
         db.session.commit()
         return jsonify({'message':f'Articulo eliminado con exito. Selimino {article.title}'})
@@ -168,23 +255,17 @@ def delete_article(article_id):
 def get_article(article_id):
     article = Article.query.get_or_404(article_id)
     current_user = session.get('user_id')
-    is_fav = False
-    if current_user:
-        fav = Favorite.query.filter_by(user_id=current_user, article_id=article.id).first()
-        is_fav = True if fav else False
-    # Fetch author username safely
-    try:
-        author_name = db.session.query(User.username).filter_by(id=article.user_id).scalar()
-    except SQLAlchemyError:
-        author_name = None
+    is_fav = article.id in _load_favorite_ids(current_user, [article.id])
+    author_name, author_photo = _load_authors({article.user_id}).get(article.user_id, (None, None))
     return jsonify({
         'id': article.id,
         'title': article.title,
         'content': article.content,
-        'image_url': article.image_url,
-        'pdf_url': article.pdf_url,
+        'image_url': media_service.public_url(article.image_url),
+        'image_renditions': media_service.public_renditions(article.renditions),
+        'pdf_url': media_service.public_url(article.pdf_url),
         'video_url': article.video_url if hasattr(article, 'video_url') else None,
-        'author_photo_url': article.author.photo_url if article.author else None,
+        'author_photo_url': author_photo,
         'tag': article.tag,
         'author': author_name,
         'created_at': article.created_at.strftime('%d-%m-%Y') if article.created_at else None,
@@ -196,112 +277,249 @@ def create_article(data, user_id):
     if not user_id:
         return jsonify({'error': 'El usuario no está autenticado o el ID de usuario no está en la sesión'}), 401
     content_with_newlines = data['content'].replace('\r\n', '\n').replace('\r', '\n')
+    try:
+        # inline data URLs go to the media store; the row only keeps the short URL
+        image_url = media_service.externalize(data['image_url'])
+        pdf_url = media_service.externalize(data.get('pdf_url'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     new_article = Article(
         title=data['title'], 
         content=content_with_newlines,
-        image_url=data['image_url'],
-        pdf_url=data.get('pdf_url'),
+        image_url=image_url,
+        pdf_url=pdf_url,
         video_url=data.get('video_url'),
         tag=data.get('tag'),
         user_id = user_id
     )
+    new_article.refresh_summary()
     db.session.add(new_article)
+    # flush to get the id, then index in the same transaction
+    db.session.flush()
+    index_article(new_article)
+    # Queue server-side thumbnail/rendition generation (PDF without image, uploaded image)
+    thumbnail_job = None
+    if needs_image_job(new_article):
+        thumbnail_job = enqueue_thumbnail(new_article.id)
     db.session.commit()
-    # If a PDF URL was provided and no image was set, try to generate a thumbnail server-side
-    try:
-        if new_article.pdf_url and not new_article.image_url:
-            thumb = _generate_pdf_thumbnail_dataurl(new_article.pdf_url, target_width=800)
-            if thumb:
-                new_article.image_url = thumb
-                db.session.commit()
-    except (SQLAlchemyError, OSError, ValueError) as exc:
-        logger.exception('create_article: failed to generate thumbnail or commit: %s', exc)
-        db.session.rollback()
+    if thumbnail_job:
+        notify_worker()
    
     return jsonify({
     'id': new_article.id, 
     'title': new_article.title,
     'content': new_article.content,
-    'image_url': new_article.image_url,
-    'pdf_url': new_article.pdf_url,
+    'image_url': media_service.public_url(new_article.image_url),
+    'pdf_url': media_service.public_url(new_article.pdf_url),
     'video_url': getattr(new_article, 'video_url', None),
-    'author_photo_url': new_article.author.photo_url if new_article.author else None,
+    'author_photo_url': media_service.public_url(new_article.author.photo_url) if new_article.author else None,
     'tag': new_article.tag,
-    'author': new_article.author.username
+    'author': new_article.author.username,
+    'thumbnail_job': thumbnail_job.to_dict() if thumbnail_job else None
 
    }), 201
 
-def _normalize_text(s: str) -> str:
-    if not s:
-        return ''
-    # decompose unicode characters and remove diacritics
-    nfkd = unicodedata.normalize('NFD', s)
-    without_accents = ''.join([c for c in nfkd if not unicodedata.combining(c)])
-    return without_accents.lower()
-
-
-def _slugify(s: str) -> str:
-    """Convert a string into a URL-friendly slug:
-    - remove diacritics
-    - lowercase
-    - replace non-alphanumeric groups with a single hyphen
-    - trim leading/trailing hyphens
+def _load_authors(user_ids):
+    """Map user id -> (username, photo_url) for `user_ids` in a single query.
+    Selects only those columns to avoid loading full User rows (prevents errors if columns missing)."""
+    if not user_ids:
+        return {}
+    try:
+        rows = db.session.query(User.id, User.username, User.photo_url).filter(User.id.in_(user_ids)).all()
+    except SQLAlchemyError:
+        logger.exception('articles: failed to fetch author info for users %s', sorted(user_ids))
+        return {}
+    return {row.id: (row.username, media_service.public_url(row.photo_url)) for row in rows}
+
+
+def _load_favorite_ids(user_id, article_ids):
+    """Return the subset of `article_ids` that `user_id` marked as favorite, in one query."""
+    if not user_id or not article_ids:
+        return set()
+    query = db.session.query(Favorite.article_id).filter(Favorite.user_id == user_id)
+    if len(article_ids) > MAX_PAGE_SIZE:
+        # unpaginated lists: read the user's favorites rather than bind one parameter per article
+        return {row.article_id for row in query.all()} & set(article_ids)
+    return {row.article_id for row in query.filter(Favorite.article_id.in_(article_ids)).all()}
+
+
+def _apply_view(query, view):
+    if view == 'summary':
+        return query.options(load_only(*SUMMARY_COLUMNS), undefer(Article.thumbnail_ref))
+    return query
+
+
+def _parse_fields(fields):
+    """`fields=id,title,...` -> list of keys, or None for all keys."""
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(',') if f.strip()]
+
+
+def _select_fields(item, fields):
+    if not fields:
+        return item
+    return {k: item[k] for k in fields if k in item}
+
+
+def _thumbnail_url(article):
+    """Short reference to the article image for cards: the 320px rendition when there is
+    one; inline data URLs are served by /article/<id>/thumbnail."""
+    card = rendition_service.pick(article.renditions, 320)
+    if card:
+        return media_service.public_url(card)
+    ref = article.thumbnail_ref
+    if ref == 'inline':
+        return url_for('articles.article_thumbnail_route', article_id=article.id)
+    return media_service.public_url(ref) or None
+
+
+def _summary_dict(article, author_name, author_photo, is_fav):
+    return {
+        'id': article.id,
+        'title': article.title,
+        'excerpt': article.excerpt or '',
+        'reading_time': article.reading_time,
+        'thumbnail_url': _thumbnail_url(article),
+        'image_renditions': media_service.public_renditions(article.renditions),
+        'video_url': article.video_url,
+        'tag': article.tag,
+        'author': author_name,
+        'author_photo_url': author_photo,
+        'created_at': article.created_at.strftime('%d-%m-%Y') if article.created_at else None,
+        'user_id': article.user_id,
+        'is_favorite': is_fav
+    }
+
+
+def get_article_thumbnail(article_id):
+    """Serve the article image when it is still stored inline as a data URL (rows not yet
+    moved by scripts/migrate_media_to_store.py); redirect otherwise."""
+    article = (Article.query.options(load_only(Article.id, Article.image_url))
+               .filter_by(id=article_id).first_or_404())
+    src = article.image_url
+    if not src:
+        return jsonify({'error': 'El artículo no tiene imagen'}), 404
+    if not src.startswith('data:'):
+        return redirect(src)
+    try:
+        mimetype, body = media_service.decode_data_url(src)
+    except ValueError:
+        logger.exception('article thumbnail: invalid data URL for article id %s', article_id)
+        return jsonify({'error': 'Imagen inválida'}), 500
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(hashlib.sha1(body).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response.make_conditional(request)
+
+
+def backfill_article_summaries(batch_size: int = 200) -> int:
+    """Fill excerpt/reading_time for rows created before those columns existed."""
+    count = 0
+    while True:
+        batch = Article.query.filter(Article.excerpt.is_(None)).limit(batch_size).all()
+        if not batch:
+            break
+        for article in batch:
+            article.refresh_summary()
+        db.session.commit()
+        count += len(batch)
+    return count
+
+
+def _encode_cursor(article) -> str:
+    """Opaque keyset cursor pointing just after `article` in (created_at, id) DESC order."""
+    raw = json.dumps([article.created_at.isoformat(), article.id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str):
+    """Return (created_at, id) from a cursor produced by _encode_cursor; raises ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        created_at, article_id = json.loads(raw.decode('utf-8'))
+        return datetime.fromisoformat(created_at), int(article_id)
+    except (TypeError, ValueError, UnicodeError, binascii.Error) as exc:
+        raise ValueError('cursor inválido') from exc
+
+
+def get_all_articles(search_term=None, tag=None, tag_slug=None, limit=None, cursor=None, view='full', fields=None):
+    """List articles, filtering by `q`, `tag` and `tag_slug` inside SQLite.
+
+    `q` is matched against the FTS index (services.search_service) and unpaginated
+    results are ranked by relevance. Without `limit`/`cursor` the whole (filtered)
+    list is returned. When either is given, a page of at most `limit` articles is
+    returned, newest first, as {'items': [...], 'next_cursor': str|None}; pass
+    `next_cursor` back as `cursor` to fetch the following page.
+
+    `view='summary'` returns excerpt/reading_time/thumbnail_url instead of the full
+    content and inline media; `fields` ("id,title,...") trims each item further.
     """
-    if not s:
-        return ''
-    # remove accents
-    nfkd = unicodedata.normalize('NFD', s)
-    without_accents = ''.join([c for c in nfkd if not unicodedata.combining(c)])
-    lowered = without_accents.lower()
-    # replace any sequence of non-alphanumeric characters with a hyphen
-    slug = re.sub(r'[^a-z0-9]+', '-', lowered)
-    slug = slug.strip('-')
-    return slug
-
-
-def get_all_articles(search_term=None, tag=None, tag_slug=None):
-    articles = Article.query.all()
-    # normalize search term once
-    norm_search = _normalize_text(search_term) if search_term else None
-    norm_tag = _normalize_text(tag) if tag else None
-    norm_tag_slug = tag_slug if tag_slug else None
+    if view not in VIEWS:
+        return jsonify({'error': f'view debe ser uno de: {", ".join(VIEWS)}'}), 400
+    fields = _parse_fields(fields)
+    paginated = limit is not None or cursor is not None
+    query = _apply_view(Article.query, view)
+    # fold_text()/slugify() are registered on the SQLite connection (utils.text_utils)
+    if tag_slug:
+        query = query.filter(func.slugify(Article.tag) == tag_slug)
+    if tag:
+        query = query.filter(func.fold_text(Article.tag) == _normalize_text(tag))
+    fts = None
+    if search_term:
+        fts = match_subquery(search_term)
+        if fts is not None:
+            query = query.join(fts, Article.id == fts.c.rowid)
+        else:
+            # No usable FTS index: accent-insensitive substring scan
+            norm_search = _normalize_text(search_term)
+            query = query.filter(or_(
+                func.instr(func.fold_text(Article.title), norm_search) > 0,
+                func.instr(func.fold_text(Article.content), norm_search) > 0,
+            ))
+
+    if paginated:
+        try:
+            limit = min(max(int(limit), 1), MAX_PAGE_SIZE) if limit is not None else DEFAULT_PAGE_SIZE
+        except (TypeError, ValueError):
+            return jsonify({'error': 'limit debe ser un entero'}), 400
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = _decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            query = query.filter(or_(
+                Article.created_at < cursor_created_at,
+                and_(Article.created_at == cursor_created_at, Article.id < cursor_id),
+            ))
+        # Fetch one extra row to know whether another page exists
+        articles = query.order_by(Article.created_at.desc(), Article.id.desc()).limit(limit + 1).all()
+        has_more = len(articles) > limit
+        articles = articles[:limit]
+    else:
+        # Full-text results come back best match first
+        order = (fts.c.score, Article.id) if fts is not None else (Article.id,)
+        articles = query.order_by(*order).all()
+
     current_user = session.get('user_id')
+    # One query for all authors of the page and one for the user's favorites (no N+1)
+    authors = _load_authors({a.user_id for a in articles})
+    favorite_ids = _load_favorite_ids(current_user, [a.id for a in articles])
     result = []
     for article in articles:
-        # If tag_slug provided, compare slugified article.tag
-        if norm_tag_slug:
-            article_tag_slug = _slugify(article.tag or '')
-            if norm_tag_slug != article_tag_slug:
-                continue
-        # If tag provided, filter by article.tag (accent-insensitive, exact match)
-        if norm_tag:
-            article_tag_norm = _normalize_text(article.tag)
-            if norm_tag != article_tag_norm:
-                continue
-        # If search term provided, filter articles by title/content (accent-insensitive)
-        if norm_search:
-            title_norm = _normalize_text(article.title)
-            content_norm = _normalize_text(article.content)
-            if norm_search not in title_norm and norm_search not in content_norm:
-                continue
-        is_fav = False
-        if current_user:
-            fav = Favorite.query.filter_by(user_id=current_user, article_id=article.id).first()
-            is_fav = True if fav else False
-        # Obtain author username via lightweight query to avoid loading full User row (prevents errors if columns missing)
-        try:
-            author_name = db.session.query(User.username).filter_by(id=article.user_id).scalar()
-            author_photo = db.session.query(User.photo_url).filter_by(id=article.user_id).scalar()
-        except SQLAlchemyError:
-            logger.exception('get_all_articles: failed to fetch author info for article id %s', article.id)
-            author_name = None
-            author_photo = None
-        result.append({
+        is_fav = article.id in favorite_ids
+        author_name, author_photo = authors.get(article.user_id, (None, None))
+        if view == 'summary':
+            result.append(_select_fields(_summary_dict(article, author_name, author_photo, is_fav), fields))
+            continue
+        result.append(_select_fields({
             'id': article.id,
             'title': article.title,
             'content': article.content,
-            'image_url': article.image_url,
-            'pdf_url': article.pdf_url,
+            'image_url': media_service.public_url(article.image_url),
+            'image_renditions': media_service.public_renditions(article.renditions),
+            'pdf_url': media_service.public_url(article.pdf_url),
             'video_url': article.video_url if hasattr(article, 'video_url') else None,
             'tag': article.tag,
             'author': author_name,
@@ -309,7 +527,10 @@ def get_all_articles(search_term=None, tag=None, tag_slug=None):
             'created_at': article.created_at.strftime('%d-%m-%Y'),
             'user_id': article.user_id,
             'is_favorite': is_fav
-        })
+        }, fields))
+    if paginated:
+        next_cursor = _encode_cursor(articles[-1]) if has_more and articles else None
+        return jsonify({'items': result, 'next_cursor': next_cursor})
     return jsonify(result)
 
 def toggle_favorite(article_id):
@@ -361,26 +582,61 @@ def toggle_favorite(article_id):
         return jsonify({'message': 'Favorito agregado'}), 201
 
 
-def get_favorites(user_id):
+def get_favorites(user_id, view='full', fields=None):
+    if view not in VIEWS:
+        return jsonify({'error': f'view debe ser uno de: {", ".join(VIEWS)}'}), 400
     if not user_id:
         return jsonify({'error': 'El usuario no está autenticado o el ID de usuario no está en la sesión'}), 401
 
-    # Join Favorite -> Article for the given user
-    favorites = Favorite.query.filter_by(user_id=user_id).all()
+    # Join Favorite -> Article for the given user in a single query
+    fields = _parse_fields(fields)
+    articles = (_apply_view(Article.query, view).join(Favorite, Favorite.article_id == Article.id)
+                .filter(Favorite.user_id == user_id)
+                .order_by(Favorite.id).all())
     articles_list = []
-    for fav in favorites:
-        article = Article.query.get(fav.article_id)
-        if not article:
-            continue
-        articles_list.append({
+    if view == 'summary':
+        authors = _load_authors({a.user_id for a in articles})
+        for article in articles:
+            author_name, author_photo = authors.get(article.user_id, (None, None))
+            articles_list.append(_select_fields(_summary_dict(article, author_name, author_photo, True), fields))
+        return jsonify(articles_list), 200
+    for article in articles:
+        articles_list.append(_select_fields({
             'id': article.id,
             'title': article.title,
             'content': article.content,
-            'image_url': article.image_url,
-            'pdf_url': article.pdf_url,
+            'image_url': media_service.public_url(article.image_url),
+            'pdf_url': media_service.public_url(article.pdf_url),
             'tag': article.tag,
             'created_at': article.created_at.strftime('%d-%m-%Y') if article.created_at else None,
             'is_favorite': True
-        })
+        }, fields))
 
-    return jsonify(articles_list), 200
\ No newline at end of file
+    return jsonify(articles_list), 200
+
+
+def get_user_articles(user_id, view='full', fields=None):
+    """Articles written by `user_id` (GET /user/<id>/articles)."""
+    if view not in VIEWS:
+        return jsonify({'error': f'view debe ser uno de: {", ".join(VIEWS)}'}), 400
+    fields = _parse_fields(fields)
+    articles = _apply_view(Article.query, view).filter_by(user_id=user_id).all()
+    result = []
+    if view == 'summary':
+        authors = _load_authors({user_id})
+        author_name, author_photo = authors.get(user_id, (None, None))
+        favorite_ids = _load_favorite_ids(session.get('user_id'), [a.id for a in articles])
+        for a in articles:
+            result.append(_select_fields(_summary_dict(a, author_name, author_photo, a.id in favorite_ids), fields))
+        return jsonify(result), 200
+    for a in articles:
+        result.append(_select_fields({
+            'id': a.id,
+            'title': a.title,
+            'content': a.content,
+            'image_url': media_service.public_url(a.image_url),
+            'pdf_url': media_service.public_url(a.pdf_url),
+            'tag': a.tag,
+            'created_at': a.created_at.strftime('%d-%m-%Y') if a.created_at else None
+        }, fields))
+    return jsonify(result), 200
\ No newline at end of file
@@ -1,6 +1,7 @@
-from flask import jsonify, session
+from flask import current_app, jsonify, session
 from models.user import User 
 from models import db 
+from services.media_service import decode_data_url, externalize, public_url, store_bytes
 
 
 def register_user(data):
@@ -45,7 +46,7 @@ def get_profile():
         'first_name': user.first_name,
         'last_name': user.last_name,
         'area': user.area,
-        'photo_url': user.photo_url
+        'photo_url': public_url(user.photo_url)
     }), 200
 
 
@@ -64,10 +65,30 @@ def update_profile(data):
     if 'area' in data:
         user.area = data.get('area')
     if 'photo_url' in data:
-        user.photo_url = data.get('photo_url')
+        # inline data URLs go to the media store; the row only keeps the short URL
+        try:
+            photo_url = data.get('photo_url')
+            if photo_url and photo_url.startswith('data:') and current_app.config.get('AVATAR_REMOVE_WHITE_BG'):
+                photo_url = _remove_avatar_background(photo_url)
+            user.photo_url = externalize(photo_url)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     try:
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
-    return jsonify({'message': 'Perfil actualizado'}), 200
\ No newline at end of file
+    return jsonify({'message': 'Perfil actualizado'}), 200
+
+
+def _remove_avatar_background(data_url):
+    """Store an uploaded avatar with its white background made transparent (PNG); returns its URL."""
+    from utils.image_utils import remove_white_background_bytes
+
+    _, raw = decode_data_url(data_url)
+    try:
+        png = remove_white_background_bytes(raw, threshold=current_app.config.get('AVATAR_WHITE_BG_THRESHOLD', 240),
+                                            softness=current_app.config.get('AVATAR_WHITE_BG_SOFTNESS', 0))
+    except OSError as exc:
+        raise ValueError('la imagen de perfil no es válida') from exc
+    return store_bytes(png, 'image/png')
@@ -0,0 +1,114 @@
+"""In-memory cache of chat replies.
+
+Much of the commercial chatbot's traffic is the same opening commands
+("Preparar visita", "Tengo una objeción", ...) under the same system
+instruction, and replies are generated at a low temperature, so a repeated
+prompt can be answered from memory instead of a new Gemini round trip.
+
+- the key is a SHA-256 of the chat type, the system instruction's version and
+  the other turns (summary included), each accent-folded, lowercased and with
+  whitespace collapsed, so "Preparar visita" and "preparar  visita " match;
+- entries live CHAT_CACHE_TTL_SECONDS and at most CHAT_CACHE_MAX_ENTRIES are
+  kept, least recently used evicted first (CHAT_CACHE_TTL_SECONDS=0 disables it);
+- a request opts out with {"cache": false} in its body or Cache-Control: no-cache;
+- hits, misses, stores and evictions are counted (stats()).
+
+The cache is per process; every server process keeps its own.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from utils.text_utils import normalize_text
+
+
+def _normalize(text):
+    return ' '.join(normalize_text(text or '').split())
+
+
+def cache_key(chat_type, api_messages):
+    """Key for a conversation in the OpenAI-style format of routes/chat_routes.py (system message first).
+    A system message is identified by its `version` (services/prompt_registry.py), else by a hash of its text."""
+    system = [m.get('version') or hashlib.sha256(m['content'].encode('utf-8')).hexdigest()
+              for m in api_messages if m['role'] == 'system']
+    turns = [(m['role'], _normalize(m['content'])) for m in api_messages if m['role'] != 'system']
+    material = json.dumps({
+        'chat_type': chat_type,
+        'system': system,
+        'turns': turns,
+    }, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries=1000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, reply)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, reply):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, reply)
+            self._entries.move_to_end(key)
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'stores': self.stores,
+                'evictions': self.evictions,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide ResponseCache configured from the app config (created on first use)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = current_app.config
+            _cache = ResponseCache(
+                max_entries=int(config.get('CHAT_CACHE_MAX_ENTRIES', 1000)),
+                ttl=float(config.get('CHAT_CACHE_TTL_SECONDS', 3600)),
+            )
+        return _cache
@@ -0,0 +1,98 @@
+"""Concurrency limit for chat requests.
+
+A chat turn can wait up to a minute on Gemini, and it does so on the web
+server's request thread (streamed replies for their whole length). Unbounded,
+a burst of slow completions takes every thread and article, notification and
+auth requests queue behind them. Chat views are wrapped in
+utils/chat_decorators.bounded_chat, which admits a request only if:
+
+- fewer than CHAT_MAX_CONCURRENT chat requests are in flight (by default half
+  of WSGI_THREADS, so the other half is always left for the rest of the app);
+- its user has fewer than CHAT_MAX_PER_USER in flight.
+
+Anything beyond that is refused immediately with ChatOverloaded (a 429 with
+Retry-After) instead of waiting for a thread. A streamed reply keeps its slot
+until the response is closed: its last chunk was sent or the client
+disconnected.
+
+WSGI_THREADS is the size of asgi.py's thread pool; behind another WSGI server
+it should be set to that server's thread count. Under `python run.py`
+(Werkzeug's development server, one thread per request) there is no pool to
+protect and the limit only bounds concurrent provider calls.
+"""
+import logging
+import threading
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class ChatOverloaded(Exception):
+    """No chat slot is free for this request; retry after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ChatLimiter:
+    def __init__(self, max_concurrent=8, per_user=2, retry_after=5):
+        self.max_concurrent = max(1, max_concurrent)
+        self.per_user = max(1, per_user)
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._by_user = {}
+        self.rejected = 0
+
+    def acquire(self, user_id):
+        """Reserve a slot for `user_id`, or raise ChatOverloaded."""
+        with self._lock:
+            if self._by_user.get(user_id, 0) >= self.per_user:
+                self.rejected += 1
+                raise ChatOverloaded('Ya tienes consultas al asistente en curso; espera a que terminen',
+                                     self.retry_after)
+            if self._in_flight >= self.max_concurrent:
+                self.rejected += 1
+                raise ChatOverloaded('El asistente está ocupado, intenta de nuevo en unos segundos',
+                                     self.retry_after)
+            self._in_flight += 1
+            self._by_user[user_id] = self._by_user.get(user_id, 0) + 1
+
+    def release(self, user_id):
+        with self._lock:
+            self._in_flight -= 1
+            remaining = self._by_user.get(user_id, 0) - 1
+            if remaining > 0:
+                self._by_user[user_id] = remaining
+            else:
+                self._by_user.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'per_user': self.per_user,
+                'in_flight': self._in_flight,
+                'users': len(self._by_user),
+                'rejected': self.rejected,
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_chat_limiter():
+    """Process-wide ChatLimiter configured from the app config (created on first use)."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            config = current_app.config
+            _limiter = ChatLimiter(
+                max_concurrent=int(config.get('CHAT_MAX_CONCURRENT') or 8),
+                per_user=int(config.get('CHAT_MAX_PER_USER') or 2),
+                retry_after=int(config.get('CHAT_RETRY_AFTER_SECONDS') or 5),
+            )
+        return _limiter
@@ -0,0 +1,176 @@
+"""In-process telemetry for chat calls to the model provider.
+
+Every upstream call made by routes/chat_routes.py records one observation:
+
+- time to first byte (response headers for generateContent, first chunk for
+  streams) and total latency, in seconds;
+- prompt and completion tokens, from the reply's usageMetadata;
+- bytes of the system instruction sent;
+- the outcome: an HTTP status class, or an error class (connect_timeout,
+  read_timeout, connection, rate_limited, client_error, server_error,
+  empty_reply, stream_interrupted, client_disconnected).
+
+Reply-cache hits and requests refused by the chat limiter are counted too.
+Values go into fixed-bucket histograms (per call mode: generate | stream), so
+memory stays constant; quantiles are estimated from the buckets. GET
+/api/chat/metrics returns them as JSON, or in the Prometheus text format with
+?format=prometheus. Metrics are per process and reset on restart.
+"""
+import math
+import threading
+
+import requests
+
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+BYTES_BUCKETS = (1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+HISTOGRAMS = {
+    # name: (buckets, help)
+    'upstream_ttfb_seconds': (SECONDS_BUCKETS, 'Time to first byte of the provider reply'),
+    'upstream_latency_seconds': (SECONDS_BUCKETS, 'Total duration of the provider call'),
+    'prompt_tokens': (TOKEN_BUCKETS, 'Prompt tokens reported in usageMetadata'),
+    'completion_tokens': (TOKEN_BUCKETS, 'Completion tokens reported in usageMetadata'),
+    'system_prompt_bytes': (BYTES_BUCKETS, 'UTF-8 bytes of the system instruction sent'),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one: above the largest bound
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the max for the overflow bucket)."""
+        if not self.count:
+            return None
+        rank = math.ceil(q * self.count)
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {str(b): n for b, n in zip(self.buckets + ('+Inf',), self._cumulative())},
+        }
+
+    def _cumulative(self):
+        total, out = 0, []
+        for n in self.counts:
+            total += n
+            out.append(total)
+        return out
+
+
+def error_class(error=None, status=None):
+    """Error class of a requests exception or an upstream HTTP status (None when it's a success)."""
+    if error is not None:
+        if isinstance(error, requests.ConnectTimeout):
+            return 'connect_timeout'
+        if isinstance(error, requests.Timeout):
+            return 'read_timeout'
+        if isinstance(error, requests.ConnectionError):
+            return 'connection'
+        return 'request'
+    if status is None or status < 400:
+        return None
+    if status == 429:
+        return 'rate_limited'
+    return 'client_error' if status < 500 else 'server_error'
+
+
+class ChatMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}  # (name, mode) -> Histogram
+        self.calls = {}  # (mode, outcome) -> count
+        self.errors = {}  # error class -> count
+        self.events = {}  # 'cache_hit' | 'overloaded' -> count
+
+    def _histogram(self, name, mode):
+        key = (name, mode)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(HISTOGRAMS[name][0])
+        return self.histograms[key]
+
+    def observe_call(self, mode, status=None, error=None, ttfb=None, latency=None, usage=None, system_bytes=None):
+        """Record one provider call. `status` is the HTTP status (None when no reply arrived);
+        `error` an error class; `usage` the reply's usageMetadata."""
+        outcome = error or (f'{status // 100}xx' if status else 'unknown')
+        usage = usage or {}
+        with self._lock:
+            self.calls[(mode, outcome)] = self.calls.get((mode, outcome), 0) + 1
+            if error:
+                self.errors[error] = self.errors.get(error, 0) + 1
+            for name, value in (('upstream_ttfb_seconds', ttfb), ('upstream_latency_seconds', latency),
+                                ('prompt_tokens', usage.get('promptTokenCount')),
+                                ('completion_tokens', usage.get('candidatesTokenCount')),
+                                ('system_prompt_bytes', system_bytes)):
+                if value is not None:
+                    self._histogram(name, mode).observe(value)
+
+    def count(self, event):
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {}
+            for (name, mode), histogram in sorted(self.histograms.items()):
+                histograms.setdefault(name, {})[mode] = histogram.to_dict()
+            calls = {}
+            for (mode, outcome), n in sorted(self.calls.items()):
+                calls.setdefault(mode, {})[outcome] = n
+            return {'calls': calls, 'errors': dict(self.errors), 'events': dict(self.events),
+                    'histograms': histograms}
+
+    def prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ['# HELP chat_upstream_calls_total Provider calls by mode and outcome',
+                      '# TYPE chat_upstream_calls_total counter']
+            for (mode, outcome), n in sorted(self.calls.items()):
+                lines.append(f'chat_upstream_calls_total{{mode="{mode}",outcome="{outcome}"}} {n}')
+            lines += ['# HELP chat_events_total Reply cache hits and requests refused when overloaded',
+                      '# TYPE chat_events_total counter']
+            for event, n in sorted(self.events.items()):
+                lines.append(f'chat_events_total{{event="{event}"}} {n}')
+            for name, (_, help_text) in HISTOGRAMS.items():
+                lines += [f'# HELP chat_{name} {help_text}', f'# TYPE chat_{name} histogram']
+                for (hist_name, mode), histogram in sorted(self.histograms.items()):
+                    if hist_name != name:
+                        continue
+                    for bound, n in zip(histogram.buckets + ('+Inf',), histogram._cumulative()):
+                        lines.append(f'chat_{name}_bucket{{mode="{mode}",le="{bound}"}} {n}')
+                    lines.append(f'chat_{name}_sum{{mode="{mode}"}} {histogram.sum}')
+                    lines.append(f'chat_{name}_count{{mode="{mode}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = ChatMetrics()
+
+
+def get_chat_metrics():
+    """The process-wide ChatMetrics."""
+    return _metrics
@@ -0,0 +1,150 @@
+"""Chat model provider client (Google Gemini).
+
+One GeminiClient per process (get_chat_client(), first called by create_app)
+holds the API key and a requests.Session whose connection pool keeps TLS
+connections to the Google endpoint alive between chat requests. The key is
+resolved when the client is created; while it is missing, every use looks for it
+again, so setting GOOGLE_API_KEY (or .env) later takes effect without a restart.
+
+- CHAT_POOL_SIZE idle connections are kept;
+- CHAT_CONNECT_TIMEOUT bounds connecting, CHAT_READ_TIMEOUT the wait for the
+  reply (for streams: the silence between two chunks);
+- 429 and 5xx replies and failed connects are retried up to CHAT_MAX_RETRIES
+  times with exponential backoff (CHAT_RETRY_BACKOFF seconds, doubling) and
+  honouring Retry-After, waiting at most CHAT_RETRY_AFTER_MAX seconds for it. A
+  retry only happens before any of the reply has been read, so streams are
+  never replayed halfway.
+
+HTTP error statuses are returned, not raised; connection failures raise
+requests.RequestException.
+"""
+import logging
+import os
+import threading
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_URL = 'https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash'
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CappedRetry(Retry):
+    """Retry that waits at most `retry_after_max` seconds for a Retry-After header."""
+
+    def __init__(self, *args, retry_after_max=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after_max = retry_after_max
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.retry_after_max = self.retry_after_max
+        return retry
+
+    def get_retry_after(self, response):
+        seconds = super().get_retry_after(response)
+        if seconds is not None and self.retry_after_max is not None:
+            seconds = min(seconds, self.retry_after_max)
+        return seconds
+
+
+def resolve_api_key():
+    """GOOGLE_API_KEY from the environment (or, as a last resort, the .env file); None when missing."""
+    for name in ('GOOGLE_API_KEY', 'google_api_key', 'GOOGLEAI_API_KEY'):
+        value = os.environ.get(name)
+        if value and len(value.strip()) > 10:  # Validación básica de longitud
+            return value.strip()
+
+    # Último recurso: leer directamente del archivo .env
+    env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+    try:
+        if os.path.exists(env_path):
+            with open(env_path, 'r') as f:
+                for line in f:
+                    if line.startswith('GOOGLE_API_KEY='):
+                        return line.split('=', 1)[1].strip() or None
+    except OSError as e:
+        logger.error('Error leyendo .env directamente: %s', e)
+    return None
+
+
+class GeminiClient:
+    def __init__(self, api_key, model_url=DEFAULT_MODEL_URL, connect_timeout=10, read_timeout=60,
+                 pool_size=10, max_retries=2, backoff=0.5, retry_after_max=10):
+        self.model_url = model_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        retry = CappedRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=False,
+            status=max_retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({'POST'}),  # generateContent has no side effects
+            backoff_factor=backoff,
+            respect_retry_after_header=True,
+            retry_after_max=retry_after_max,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+        self.set_api_key(api_key)
+
+    def set_api_key(self, api_key):
+        self.api_key = api_key
+        # in a header rather than ?key= so it doesn't end up in URLs of error messages and logs
+        if api_key:
+            self.session.headers['x-goog-api-key'] = api_key
+
+    @property
+    def configured(self):
+        return bool(self.api_key)
+
+    def generate(self, payload):
+        """POST :generateContent; returns the requests.Response."""
+        return self.session.post(f'{self.model_url}:generateContent', json=payload, timeout=self.timeout)
+
+    def stream(self, payload):
+        """POST :streamGenerateContent (SSE); the caller reads and closes the streamed response."""
+        return self.session.post(f'{self.model_url}:streamGenerateContent',
+                                 params={'alt': 'sse'},
+                                 json=payload, stream=True, timeout=self.timeout)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_chat_client():
+    """Process-wide GeminiClient configured from the app config (create_app makes it at startup)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            config = current_app.config
+            _client = GeminiClient(
+                api_key=config.get('GOOGLE_API_KEY') or resolve_api_key(),
+                model_url=config.get('CHAT_MODEL_URL') or DEFAULT_MODEL_URL,
+                connect_timeout=float(config.get('CHAT_CONNECT_TIMEOUT') or 10),
+                read_timeout=float(config.get('CHAT_READ_TIMEOUT') or 60),
+                pool_size=int(config.get('CHAT_POOL_SIZE') or 10),
+                max_retries=int(config.get('CHAT_MAX_RETRIES', 2)),
+                backoff=float(config.get('CHAT_RETRY_BACKOFF', 0.5)),
+                retry_after_max=float(config.get('CHAT_RETRY_AFTER_MAX', 10)),
+            )
+            if not _client.configured:
+                logger.error('GOOGLE_API_KEY no configurada; el chatbot no funcionará')
+        elif not _client.configured:
+            api_key = current_app.config.get('GOOGLE_API_KEY') or resolve_api_key()
+            if api_key:
+                _client.set_api_key(api_key)
+                logger.info('GOOGLE_API_KEY encontrada; chatbot habilitado')
+        return _client
@@ -0,0 +1,136 @@
+"""Server-side chatbot conversations.
+
+Each user has one conversation per chat_type (models.chat_conversation), so a
+client only sends its new message and the server supplies the history:
+
+- messages are stored with an estimated token count (~4 characters per token);
+- each turn sends the newest messages that fit in CHAT_HISTORY_TOKEN_BUDGET;
+- when the unsummarized history outgrows the budget, the older messages (all but
+  the newest half of the budget) are folded into the conversation's running
+  summary by the model, which is sent ahead of the window. Summarizing in one
+  go down to half the budget means it happens every few turns, not every turn.
+  If the summary call fails, those messages are left out of the window and the
+  summary is retried on the next turn.
+"""
+import logging
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.chat_conversation import ChatConversation, ChatMessage
+from services.chat_provider import get_chat_client
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+SUMMARY_PROMPT = (
+    'Resume la siguiente conversación entre un usuario y el asistente en español, en un máximo de '
+    '{max_words} palabras. Conserva los datos concretos que el usuario dio (ciudad, médico, '
+    'especialidad, institución, producto, tipo de herida, personalidad DISC, objeciones y compromisos) '
+    'y lo que el asistente ya entregó. Responde solo con el resumen.'
+)
+
+
+def estimate_tokens(text):
+    return max(1, len(text or '') // CHARS_PER_TOKEN)
+
+
+def get_conversation(user_id, chat_type):
+    """The user's conversation for `chat_type`, created (and flushed) when missing."""
+    conversation = ChatConversation.query.filter_by(user_id=user_id, chat_type=chat_type).first()
+    if conversation is None:
+        conversation = ChatConversation(user_id=user_id, chat_type=chat_type)
+        try:
+            with db.session.begin_nested():
+                db.session.add(conversation)
+        except IntegrityError:
+            # a concurrent first turn created it between the query and the insert
+            conversation = ChatConversation.query.filter_by(user_id=user_id, chat_type=chat_type).one()
+    return conversation
+
+
+def pending_messages(conversation):
+    """Messages not folded into the summary yet, oldest first."""
+    return (ChatMessage.query
+            .filter(ChatMessage.conversation_id == conversation.id, ChatMessage.id > conversation.summarized_upto)
+            .order_by(ChatMessage.id).all())
+
+
+def history(conversation, budget, reserve=0):
+    """(summary, messages) to send before a new turn of `reserve` tokens: the running summary
+    and the newest stored messages that fit in `budget`, as frontend dicts {role, text}.
+    Updates the summary (the caller commits) when the history outgrew the budget."""
+    messages = pending_messages(conversation)
+    used = reserve + sum(m.tokens for m in messages)
+    if used > budget:
+        # keep the newest messages within half the budget; fold the rest into the summary
+        keep, kept_tokens = [], reserve
+        for m in reversed(messages):
+            if kept_tokens + m.tokens > budget // 2:
+                break
+            keep.insert(0, m)
+            kept_tokens += m.tokens
+        folded = messages[:len(messages) - len(keep)]
+        if folded:
+            summary = summarize(conversation.summary, folded)
+            if summary is not None:
+                conversation.summary = summary
+                conversation.summarized_upto = folded[-1].id
+        messages = keep
+    return conversation.summary, [{'role': m.role, 'text': m.text} for m in messages]
+
+
+def summarize(previous, messages):
+    """New running summary of `previous` plus `messages` from the chat model; None on failure."""
+    client = get_chat_client()
+    if not client.configured:
+        return None
+    max_tokens = int(current_app.config.get('CHAT_SUMMARY_MAX_TOKENS') or 400)
+    transcript = '\n'.join(f"{'Usuario' if m.role == 'user' else 'Asistente'}: {m.text}" for m in messages)
+    prompt = SUMMARY_PROMPT.format(max_words=max_tokens * 3 // 4)
+    if previous:
+        prompt += f'\n\nResumen anterior:\n{previous}'
+    prompt += f'\n\nConversación:\n{transcript}'
+    payload = {
+        'contents': [{'role': 'user', 'parts': [{'text': prompt}]}],
+        'generationConfig': {'temperature': 0.0, 'maxOutputTokens': max_tokens},
+    }
+    try:
+        resp = client.generate(payload)
+        if resp.status_code >= 400:
+            logger.warning('Conversation summary failed: HTTP %s', resp.status_code)
+            return None
+        parts = resp.json()['candidates'][0]['content'].get('parts') or []
+    except (OSError, ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+        # requests.RequestException is an OSError
+        logger.warning('Conversation summary failed: %s', e)
+        return None
+    text = ''.join(p.get('text') or '' for p in parts).strip()
+    return text or None
+
+
+def save_turn(conversation_id, user_text, reply):
+    """Store a completed turn (the user's message and the model's reply) and commit."""
+    db.session.add(ChatMessage(conversation_id=conversation_id, role='user', text=user_text,
+                               tokens=estimate_tokens(user_text)))
+    db.session.add(ChatMessage(conversation_id=conversation_id, role='model', text=reply,
+                               tokens=estimate_tokens(reply)))
+    conversation = db.session.get(ChatConversation, conversation_id)
+    if conversation is not None:
+        conversation.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+def clear_conversations(user_id, chat_type=None):
+    """Delete the user's stored conversations (one chat_type or all); the caller commits."""
+    query = ChatConversation.query.filter_by(user_id=user_id)
+    if chat_type:
+        query = query.filter_by(chat_type=chat_type)
+    ids = [c.id for c in query.all()]
+    if not ids:
+        return 0
+    ChatMessage.query.filter(ChatMessage.conversation_id.in_(ids)).delete(synchronize_session=False)
+    ChatConversation.query.filter(ChatConversation.id.in_(ids)).delete(synchronize_session=False)
+    return len(ids)
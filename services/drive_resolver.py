@@ -0,0 +1,159 @@
+"""Google Drive link resolution.
+
+Users paste Drive links in many shapes (/file/d/<id>/view, open?id=<id>,
+uc?id=<id>, folder URLs). `resolve()` maps any of them to the direct download
+URL (uc?export=download&id=<id>, with the confirm token for files too large
+for Drive's virus scan) and caches the result, with the content type and size
+returned by Drive, in the drive_resolution table for DRIVE_RESOLVE_TTL_SECONDS.
+Repeat views then skip scraping folder pages and the failed first attempt.
+Failed resolutions are cached for DRIVE_RESOLVE_FAILURE_TTL_SECONDS.
+"""
+import html
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db
+from models.drive_resolution import DriveResolution
+from services import http_client
+
+logger = logging.getLogger(__name__)
+
+_FILE_ID_RE = re.compile(r'/file/d/([A-Za-z0-9_-]+)')
+_CONFIRM_RE = re.compile(r'confirm=([0-9A-Za-z_-]+)')
+_FORM_RE = re.compile(r'<form[^>]+id="download-form"[^>]+action="([^"]+)"', re.I)
+_HIDDEN_RE = re.compile(r'<input[^>]+type="hidden"[^>]+name="([^"]+)"[^>]+value="([^"]*)"', re.I)
+
+# Bytes of a folder page or HTML interstitial scanned for a file id / confirm token
+SCAN_BYTES = 64 * 1024
+
+
+class DriveResolutionError(ValueError):
+    """The Drive link can't be turned into a downloadable file."""
+
+
+def is_drive_url(url: Optional[str]) -> bool:
+    return bool(url) and 'drive.google.com' in url
+
+
+def extract_file_id(url: str) -> Optional[str]:
+    """File id from /file/d/<id> or an id= query parameter."""
+    m = _FILE_ID_RE.search(url)
+    if m:
+        return m.group(1)
+    return parse_qs(urlparse(url).query).get('id', [None])[0]
+
+
+def download_url(file_id: str) -> str:
+    return f'https://drive.google.com/uc?export=download&id={file_id}'
+
+
+def thumbnail_url(file_id: str, width: int = 800) -> str:
+    return f'https://drive.google.com/thumbnail?id={file_id}&sz=w{width}'
+
+
+def _file_id_from_folder(url: str) -> str:
+    with http_client.open_url(url, timeout=10) as resp:
+        if resp.status >= 400:
+            raise DriveResolutionError(
+                'Unable to fetch Google Drive folder page. Ensure the folder is public or provide a direct file link.')
+        body = resp.read(SCAN_BYTES).decode('utf-8', errors='replace')
+    m = _FILE_ID_RE.search(body)
+    if not m:
+        raise DriveResolutionError(
+            'Google Drive folder URL detected but no file found in folder HTML. Provide a direct file link '
+            '(use "Compartir -> Obtener enlace" on the file) or upload the PDF.')
+    return m.group(1)
+
+
+def _confirmed_url(page: str, file_id: str) -> Optional[str]:
+    """Download URL behind Drive's "can't scan this file for viruses" page, if it is one."""
+    form = _FORM_RE.search(page)
+    if form:
+        params = {name: html.unescape(value) for name, value in _HIDDEN_RE.findall(page)}
+        params.setdefault('id', file_id)
+        return f'{html.unescape(form.group(1))}?{urlencode(params)}'
+    m = _CONFIRM_RE.search(page)
+    if m:
+        return f'{download_url(file_id)}&confirm={m.group(1)}'
+    return None
+
+
+def _probe(file_id: str):
+    """(direct_url, content_type, content_length) of a Drive file; raises DriveResolutionError."""
+    url = download_url(file_id)
+    for _ in range(2):
+        with http_client.open_url(url, timeout=15) as resp:
+            if resp.status >= 400:
+                raise DriveResolutionError(f'Google Drive returned HTTP {resp.status} for file {file_id}')
+            content_type = resp.headers.get('Content-Type') or ''
+            if not content_type.lower().startswith('text/html'):
+                length = resp.headers.get('Content-Length')
+                return url, content_type, int(length) if length and length.isdigit() else None
+            page = resp.read(SCAN_BYTES).decode('utf-8', errors='replace')
+        confirmed = _confirmed_url(page, file_id)
+        if not confirmed or confirmed == url:
+            break
+        url = confirmed
+    raise DriveResolutionError(
+        f'Google Drive file {file_id} is not publicly downloadable (sign-in or permission page returned)')
+
+
+def _save(row):
+    try:
+        db.session.merge(row)
+        db.session.commit()
+    except SQLAlchemyError:
+        logger.exception('drive resolver: failed to cache resolution of %s', row.source_url)
+        db.session.rollback()
+
+
+def resolve(url: str, refresh: bool = False) -> Optional[DriveResolution]:
+    """Resolution of a Drive link (None when `url` is not a Drive link).
+
+    Served from the drive_resolution table while fresh. Raises DriveResolutionError
+    for links that can't be downloaded (cached as failures too) and OSError when
+    Drive can't be reached (not cached)."""
+    if not is_drive_url(url):
+        return None
+    now = datetime.utcnow()
+    row = db.session.get(DriveResolution, url)
+    if row is not None and row.expires_at > now and not refresh:
+        if row.status != 'ok':
+            raise DriveResolutionError(row.error)
+        return row
+
+    config = current_app.config
+    file_id = None
+    try:
+        file_id = _file_id_from_folder(url) if '/drive/folders/' in url else extract_file_id(url)
+        if not file_id:
+            raise DriveResolutionError('No Google Drive file id found in the link')
+        direct, content_type, length = _probe(file_id)
+    except DriveResolutionError as e:
+        ttl = float(config.get('DRIVE_RESOLVE_FAILURE_TTL_SECONDS') or 300)
+        _save(DriveResolution(source_url=url, file_id=file_id, status='failed', error=str(e),
+                              resolved_at=now, expires_at=now + timedelta(seconds=ttl)))
+        raise
+    ttl = float(config.get('DRIVE_RESOLVE_TTL_SECONDS') or 86400)
+    row = DriveResolution(source_url=url, file_id=file_id, direct_url=direct, content_type=content_type,
+                          content_length=length, status='ok', error=None,
+                          resolved_at=now, expires_at=now + timedelta(seconds=ttl))
+    _save(row)
+    logger.info('drive resolver: %s -> %s (%s, %s bytes)', url, direct, content_type, length)
+    return db.session.get(DriveResolution, url) or row
+
+
+def direct_url(url: str) -> str:
+    """Direct download URL for a Drive link, or `url` unchanged (not Drive, or unresolvable)."""
+    try:
+        row = resolve(url)
+    except (DriveResolutionError, OSError) as e:
+        logger.warning('drive resolver: could not resolve %s: %s', url, e)
+        return url
+    return row.direct_url if row is not None else url
@@ -0,0 +1,134 @@
+"""Shared upstream HTTP client.
+
+Outbound fetches (the /proxy route, its disk cache, remote PDFs for thumbnails)
+go through one urllib3 PoolManager instead of a fresh `urllib.request.urlopen`
+per request, so repeat requests to the same host (Drive, video CDNs) reuse
+keep-alive connections and skip DNS/TCP/TLS setup.
+
+- UPSTREAM_MAX_HOSTS hosts keep a pool of up to UPSTREAM_POOL_SIZE idle connections;
+- UPSTREAM_CONNECT_TIMEOUT / UPSTREAM_READ_TIMEOUT bound every request;
+- responses are streamed (not preloaded); `iter_chunks()` grows the read size
+  from MIN_CHUNK_SIZE up to MAX_CHUNK_SIZE while the upstream keeps the buffer full.
+
+Network failures raise UpstreamError, an OSError, so callers keep their
+existing `except OSError` handling. HTTP error statuses are returned, not raised.
+"""
+import logging
+import threading
+from typing import Optional
+
+import urllib3
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+DEFAULT_USER_AGENT = 'Mozilla/5.0'
+
+
+class UpstreamError(OSError):
+    """The upstream could not be reached or the connection failed mid-response."""
+
+
+class UpstreamResponse:
+    """A streamed upstream response; close() returns the connection to its pool."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.status = raw.status
+        self.headers = raw.headers  # case-insensitive
+        self.url = raw.geturl() or ''
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        try:
+            return self._raw.read(amt)
+        except urllib3.exceptions.HTTPError as e:
+            raise UpstreamError(str(e)) from e
+
+    def iter_chunks(self, min_size: int = MIN_CHUNK_SIZE, max_size: int = MAX_CHUNK_SIZE):
+        """Yield the body in chunks, doubling the read size while reads come back full."""
+        size = min_size
+        read = getattr(self._raw, 'read1', self._raw.read)
+        try:
+            while True:
+                chunk = read(size)
+                if not chunk:
+                    break
+                yield chunk
+                if len(chunk) >= size and size < max_size:
+                    size *= 2
+        except urllib3.exceptions.HTTPError as e:
+            raise UpstreamError(str(e)) from e
+
+    def close(self):
+        # a connection with an unread body can't be reused: close it before handing it back
+        if not self._raw.isclosed():
+            self._raw.close()
+        self._raw.release_conn()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _config(name, default):
+    if has_app_context():
+        value = current_app.config.get(name)
+        if value is not None:
+            return value
+    return default
+
+
+def get_pool() -> urllib3.PoolManager:
+    """Process-wide connection pools (configured from the app config on first use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = urllib3.PoolManager(
+                num_pools=int(_config('UPSTREAM_MAX_HOSTS', 20)),
+                maxsize=int(_config('UPSTREAM_POOL_SIZE', 10)),
+                block=False,
+                timeout=urllib3.Timeout(
+                    connect=float(_config('UPSTREAM_CONNECT_TIMEOUT', 5)),
+                    read=float(_config('UPSTREAM_READ_TIMEOUT', 30)),
+                ),
+                # retry failed connects only; a request that reached the server is not replayed
+                retries=urllib3.Retry(connect=2, read=False, status=False, redirect=10, raise_on_redirect=False),
+            )
+        return _pool
+
+
+def open_url(url: str, headers: Optional[dict] = None, method: str = 'GET', timeout: Optional[float] = None) -> UpstreamResponse:
+    """Send a request and return the streamed response (redirects are followed).
+    The caller must close() it, or use it as a context manager."""
+    headers = dict(headers or {})
+    headers.setdefault('User-Agent', DEFAULT_USER_AGENT)
+    kwargs = {}
+    if timeout:
+        kwargs['timeout'] = urllib3.Timeout(connect=min(timeout, 5), read=timeout)
+    try:
+        raw = get_pool().request(method, url, headers=headers, preload_content=False, decode_content=False, **kwargs)
+    except (urllib3.exceptions.HTTPError, ValueError) as e:
+        raise UpstreamError(f'{url}: {e}') from e
+    return UpstreamResponse(raw)
+
+
+def fetch_bytes(url: str, headers: Optional[dict] = None, max_bytes: Optional[int] = None, timeout: Optional[float] = None):
+    """GET `url` fully; returns (status, headers, body). Raises UpstreamError when the
+    body exceeds `max_bytes` or the connection fails."""
+    with open_url(url, headers=headers, timeout=timeout) as resp:
+        parts = []
+        size = 0
+        for chunk in resp.iter_chunks():
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise UpstreamError(f'{url}: response exceeds {max_bytes} bytes')
+            parts.append(chunk)
+        return resp.status, resp.headers, b''.join(parts)
@@ -0,0 +1,198 @@
+"""Retrieval over the commercial chatbot's system instruction.
+
+The instruction (kat_system_instruction.txt, ~53 KB) is a sequence of
+"BLOQUE n — título" blocks. Instead of sending all of it on every turn:
+
+- the core blocks (CHAT_CORE_BLOCKS: role, mission, style) are always sent;
+- the other blocks are split into sections at their markdown headings
+  ("# ...", "## ...") and "PASO n" lines, and indexed with BM25 in memory;
+- each turn sends the core blocks plus the CHAT_RETRIEVAL_TOP_K sections that
+  best match the latest user messages, in their original order (sections scoring
+  below MIN_RELATIVE_SCORE of the best match are left out).
+
+Tokens are accent-folded and lowercased (utils.text_utils.normalize_text), with
+Spanish stopwords and plural endings removed. An index is built once per
+distinct instruction text and reused.
+"""
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from utils.text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+BLOCK_RE = re.compile(r'^\W*BLOQUE\s+(\d+)\s*[—–-]\s*(.*)$', re.MULTILINE)
+HEADING_RE = re.compile(r'^(?:(#{1,3})\s+(.+)|(PASO\s+\d+\b.*))$')
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+MIN_RELATIVE_SCORE = 0.3
+STOPWORDS = frozenset('''
+a al algo como con cual cuando de del desde donde el ella ellos en entre era es esa ese eso esta este esto
+estos fue ha hay la las le les lo los mas me mi muy ni no nos o para pero por que quien se si sin sobre
+son su sus tambien te tiene tu un una uno unos y ya yo cual cuales debe puede ser
+'''.split())
+
+
+class Section(NamedTuple):
+    position: int
+    block: int
+    title: str
+    text: str
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_RE.findall(normalize_text(text)):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        # objeciones -> objecion, heridas -> herida
+        if len(token) > 4 and token.endswith('es') and token[-3] not in 'aeiou':
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith('s'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def split_blocks(text: str):
+    """[(block number, heading line, body)] in order; text before the first BLOQUE is block 0."""
+    matches = list(BLOCK_RE.finditer(text))
+    if not matches:
+        return [(0, '', text.strip())]
+    blocks = []
+    if text[:matches[0].start()].strip():
+        blocks.append((0, '', text[:matches[0].start()].strip()))
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        blocks.append((int(m.group(1)), m.group(0).strip(), text[m.end():end].strip()))
+    return blocks
+
+
+def split_sections(block: int, heading: str, body: str, start: int) -> List[Section]:
+    """Split one block at its headings; each section's title carries its parent headings."""
+    sections = []
+    path = {}  # heading level -> heading text
+    title, lines = heading, []
+
+    def flush():
+        content = '\n'.join(lines).strip()
+        if content:
+            sections.append(Section(start + len(sections), block, title, content))
+
+    for line in body.splitlines():
+        m = HEADING_RE.match(line.strip())
+        if not m:
+            lines.append(line)
+            continue
+        flush()
+        lines = []
+        level = len(m.group(1)) if m.group(1) else 4
+        path = {k: v for k, v in path.items() if k < level}
+        path[level] = line.strip()
+        title = ' / '.join([heading] + [path[k] for k in sorted(path)])
+    flush()
+    return sections
+
+
+class BM25Index:
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.term_freqs = [Counter(tokenize(doc)) for doc in documents]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        doc_freq = Counter(term for tf in self.term_freqs for term in tf)
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def scores(self, query: str) -> List[float]:
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        result = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            for term in terms:
+                f = tf.get(term)
+                if f:
+                    score += self.idf[term] * f * (self.k1 + 1) / (f + norm)
+            result.append(score)
+        return result
+
+
+class KnowledgeBase:
+    """A system instruction split into always-sent core blocks and BM25-indexed sections."""
+
+    def __init__(self, text: str, core_blocks: Sequence[int] = (1, 3, 5)):
+        self.core, self.sections = [], []
+        for number, heading, body in split_blocks(text):
+            if number in core_blocks or number == 0:
+                self.core.append(f'{heading}\n\n{body}'.strip())
+            else:
+                self.sections.extend(split_sections(number, heading, body, len(self.sections)))
+        self.index = BM25Index([f'{s.title}\n{s.text}' for s in self.sections])
+        self.full_text = text
+
+    def search(self, query: str, top_k: int) -> List[Section]:
+        scores = self.index.scores(query)
+        cutoff = max(scores, default=0) * MIN_RELATIVE_SCORE
+        ranked = sorted((i for i, s in enumerate(scores) if s > 0 and s >= cutoff), key=lambda i: -scores[i])
+        return [self.sections[i] for i in ranked[:top_k]]
+
+    def system_text(self, query: str, top_k: int) -> str:
+        """Core blocks plus the top_k sections for `query`, in document order."""
+        return self.select(query, top_k)[0]
+
+    def select(self, query: str, top_k: int) -> Tuple[str, Tuple[int, ...]]:
+        """(system_text(query, top_k), positions of the sections it includes)."""
+        picked = sorted(self.search(query, top_k), key=lambda s: s.position)
+        parts = list(self.core)
+        for section in picked:
+            parts.append(f'{section.title}\n{section.text}')
+        text = '\n\n'.join(parts)
+        logger.debug('Retrieved %d sections (%d of %d chars): %s', len(picked), len(text),
+                     len(self.full_text), [s.title for s in picked])
+        return text, tuple(s.position for s in picked)
+
+
+_bases = {}
+_bases_lock = threading.Lock()
+
+
+def get_knowledge_base(text: str, core_blocks: Sequence[int] = (1, 3, 5)) -> KnowledgeBase:
+    """KnowledgeBase for `text`, built once per distinct text and core block set."""
+    key = (text, tuple(core_blocks))
+    with _bases_lock:
+        kb = _bases.get(key)
+        if kb is None:
+            if len(_bases) >= 4:
+                _bases.clear()
+            kb = _bases[key] = KnowledgeBase(text, core_blocks)
+        return kb
+
+
+def retrieval_query(messages: Sequence[dict], turns: int = 2) -> str:
+    """Text of the last `turns` user messages (frontend format: {role, text})."""
+    user_texts = [m.get('text') or '' for m in messages if m.get('role') == 'user']
+    return '\n'.join(user_texts[-turns:])
+
+
+def build_system_text(text: str, messages: Sequence[dict], top_k: int,
+                      core_blocks: Optional[Sequence[int]] = None) -> str:
+    """System instruction for one turn: the whole `text` when top_k <= 0 or there is no
+    user message yet, else its core blocks plus the top_k most relevant sections."""
+    return select_system_text(text, messages, top_k, core_blocks)[0]
+
+
+def select_system_text(text: str, messages: Sequence[dict], top_k: int,
+                       core_blocks: Optional[Sequence[int]] = None) -> Tuple[str, Optional[Tuple[int, ...]]]:
+    """(build_system_text(...), positions of the sections sent), positions being None when
+    the whole `text` is sent. Same text and positions mean the same instruction."""
+    query = retrieval_query(messages)
+    if top_k <= 0 or not query.strip():
+        return text, None
+    kb = get_knowledge_base(text, tuple(core_blocks or (1, 3, 5)))
+    if len(kb.sections) <= top_k:
+        return text, None
+    return kb.select(query, top_k)
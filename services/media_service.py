@@ -0,0 +1,211 @@
+"""Content-addressed media store.
+
+Blobs (PDF thumbnails, uploaded PDFs, cover images, profile photos) are written
+once to MEDIA_ROOT/<sha[:2]>/<sha256>.<ext> and referenced from the DB by a short
+URL (/media/<sha256>.<ext>) instead of an inline base64 data URL. Identical
+uploads share the same file. The /media route (routes/media_routes.py) serves
+them with an immutable cache policy since a name can never change content.
+"""
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from typing import Optional
+from urllib.parse import urlparse
+
+from flask import current_app, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# Read size for streamed uploads
+CHUNK_SIZE = 256 * 1024
+
+MEDIA_NAME_RE = re.compile(r'^([0-9a-f]{64})\.([a-z0-9]{1,8})$')
+
+# The only types stored: raster images (covers, avatars, thumbnails) and PDFs. Blobs are served
+# from the API origin, so types a browser would render as a document (HTML, SVG with script)
+# are refused instead of becoming script on that origin.
+_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+    'application/pdf': 'pdf',
+}
+# Extensions /media serves inline; anything else stored before the allow-list is a download
+INLINE_EXTENSIONS = frozenset(_EXTENSIONS.values())
+
+
+class MediaTooLarge(ValueError):
+    """The streamed blob exceeded the allowed size."""
+
+
+class InvalidMediaType(ValueError):
+    """The blob's type is not allowed, or it does not start with the expected file signature."""
+
+
+def media_root() -> str:
+    root = current_app.config.get('MEDIA_ROOT') or os.path.join(current_app.instance_path, 'media')
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def _extension_for(mimetype: str) -> str:
+    extension = _EXTENSIONS.get((mimetype or '').lower())
+    if extension is None:
+        raise InvalidMediaType(f'tipo de archivo no permitido: {mimetype or "desconocido"}')
+    return extension
+
+
+def path_for_name(name: str) -> Optional[str]:
+    """Disk path of a media name (<sha256>.<ext>), or None if the name is malformed."""
+    m = MEDIA_NAME_RE.match(name or '')
+    if not m:
+        return None
+    return os.path.join(media_root(), m.group(1)[:2], name)
+
+
+def media_url(name: str) -> str:
+    """URL stored in the DB for a media name: always relative (/media/<name>), so rows
+    keep working whatever host the app is deployed or reached at. public_url() adds the
+    origin when the URL is sent to a client."""
+    return f'/media/{name}'
+
+
+def public_url(url: Optional[str]) -> Optional[str]:
+    """URL to send to clients for a stored value. Media store URLs (/media/...) are prefixed
+    with MEDIA_BASE_URL, or inside a request with the current host, so <img src> works from
+    the separate frontend origin; anything else (remote links, data URLs, None) is unchanged."""
+    if not url or not url.startswith('/media/'):
+        return url
+    base = current_app.config.get('MEDIA_BASE_URL')
+    if not base and has_request_context():
+        base = request.host_url
+    return f"{(base or '').rstrip('/')}{url}"
+
+
+def public_renditions(renditions: Optional[dict]) -> Optional[dict]:
+    """A rendition map (services/rendition_service.py) with public_url() applied to its URLs."""
+    if not renditions:
+        return renditions
+    result = dict(renditions)
+    srcset = {}
+    for fmt, items in renditions.items():
+        if isinstance(items, list):
+            result[fmt] = [{**r, 'url': public_url(r.get('url'))} for r in items]
+            srcset[fmt] = ', '.join(f"{r['url']} {r['width']}w" for r in result[fmt])
+    if 'srcset' in renditions:
+        result['srcset'] = srcset
+    return result
+
+
+def stored_url(url: Optional[str]) -> Optional[str]:
+    """`url` as it should be stored: a link to a blob of the media store, on any host (e.g. an
+    absolute URL sent back by a client), becomes /media/<name>; other values are unchanged."""
+    if url and not url.startswith('/media/') and local_path_for_url(url):
+        return urlparse(url).path
+    return url
+
+
+def store_bytes(data: bytes, mimetype: str) -> str:
+    """Store `data` (deduplicated by sha256) and return its media URL.
+    Raises InvalidMediaType for a type outside the allow-list."""
+    extension = _extension_for(mimetype)
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'{digest}.{extension}'
+    path = path_for_name(name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temp file and rename, so readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    return media_url(name)
+
+
+def store_stream(stream, mimetype: str, max_bytes: Optional[int] = None, signature: Optional[bytes] = None) -> str:
+    """Copy a file-like object into the store chunk by chunk and return its media URL.
+
+    The blob is hashed while it is written to a temp file next to its final location,
+    so memory stays at one chunk regardless of size. Raises InvalidMediaType when the
+    type is not allowed or the first bytes don't match `signature` (checked before
+    reading the rest) and MediaTooLarge as soon as more than `max_bytes` were read.
+    """
+    extension = _extension_for(mimetype)
+    root = media_root()
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=root, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            if signature:
+                head = stream.read(len(signature))
+                if head != signature:
+                    raise InvalidMediaType('el archivo no tiene el formato esperado')
+                digest.update(head)
+                fh.write(head)
+                size += len(head)
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise MediaTooLarge(f'el archivo supera el máximo de {max_bytes} bytes')
+                digest.update(chunk)
+                fh.write(chunk)
+        name = f'{digest.hexdigest()}.{extension}'
+        path = path_for_name(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(tmp)  # identical blob already stored
+        else:
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return media_url(name)
+
+
+def decode_data_url(data_url: str):
+    """Return (mimetype, bytes) for a base64 data URL; raises ValueError if malformed."""
+    try:
+        header, b64 = data_url.split(',', 1)
+        mimetype = header[len('data:'):].split(';', 1)[0] or 'application/octet-stream'
+        return mimetype, base64.b64decode(''.join(b64.split()), validate=True)
+    except (ValueError, binascii.Error) as exc:
+        raise ValueError('data URL inválida') from exc
+
+
+def externalize(value: Optional[str]) -> Optional[str]:
+    """Move an inline data URL into the store and return its short URL.
+    Media store URLs are stored relative (stored_url()); any other value (remote links,
+    None) is returned unchanged."""
+    if not value or not value.startswith('data:'):
+        return stored_url(value)
+    mimetype, data = decode_data_url(value)
+    return store_bytes(data, mimetype)
+
+
+def local_path_for_url(url: Optional[str]) -> Optional[str]:
+    """If `url` points at the media store (absolute or relative), return the blob path."""
+    if not url:
+        return None
+    path = urlparse(url).path
+    if not path.startswith('/media/'):
+        return None
+    disk_path = path_for_name(path[len('/media/'):])
+    if disk_path and os.path.exists(disk_path):
+        return disk_path
+    return None
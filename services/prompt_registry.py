@@ -0,0 +1,151 @@
+"""Registry of the chatbots' system instructions.
+
+Each chat type has one prompt. Its text comes from, in order:
+
+- its file (CHAT_PROMPT_FILES, e.g. KAT_SYSTEM_INSTRUCTION_FILE=kat_system_instruction.txt);
+- its environment variable (KAT_SYSTEM_INSTRUCTION for the commercial chatbot);
+- the built-in default in routes/chat_routes.py.
+
+create_app() builds the registry (get_prompt_registry), so every prompt is
+loaded when the app starts and a prompt file that can't be read is logged then,
+not on the first chat. A prompt read from a file is reloaded when the file's
+mtime or size changes, checked at most every CHAT_PROMPT_RELOAD_SECONDS on
+use; if the file can't be read, the last loaded text stays in use.
+
+Every loaded prompt has a version (SHA-256 of its text, 16 hex digits) and its
+system block already in the Gemini `contents` format, so a turn only formats
+its own messages. The version identifies the instruction in downstream caches
+(services/chat_cache.py) without hashing its text again on every request.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+MAX_BLOCKS = 256
+
+
+def system_block(text: str) -> dict:
+    """A system instruction as a Gemini `contents` entry (v1 has no systemInstruction field)."""
+    return {'role': 'user', 'parts': [{'text': f'System instruction: {text}'}]}
+
+
+def text_version(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class PromptSource(NamedTuple):
+    default: str
+    path: Optional[str] = None
+    env: Optional[str] = None
+
+
+class Prompt(NamedTuple):
+    name: str
+    text: str
+    version: str
+    source: str  # 'file:<path>' | 'env:<name>' | 'default'
+    system_block: dict
+
+
+class PromptRegistry:
+    def __init__(self, sources: Dict[str, PromptSource], reload_interval: float = 2.0):
+        self.sources = dict(sources)
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._prompts = {}  # name -> Prompt
+        self._stamps = {}  # name -> (mtime, size) of the file it was read from
+        self._checked = {}  # name -> monotonic time of the last stat()
+        self._blocks = OrderedDict()  # version key -> system block of a partial instruction
+        for name in self.sources:
+            self._load(name)
+
+    def get(self, name: str) -> Prompt:
+        """The current prompt `name`, reloaded first if its file changed."""
+        source = self.sources[name]
+        if source.path and time.monotonic() - self._checked.get(name, 0) >= self.reload_interval:
+            with self._lock:
+                if time.monotonic() - self._checked.get(name, 0) >= self.reload_interval:
+                    self._checked[name] = time.monotonic()
+                    if self._stamp(source.path) != self._stamps.get(name):
+                        self._load(name)
+        return self._prompts[name]
+
+    def block(self, key: str, text: str) -> dict:
+        """System block for `text`, a part of a prompt identified by `key` (its version plus
+        what was selected), built once and kept for the next MAX_BLOCKS distinct keys."""
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                return block
+            block = self._blocks[key] = system_block(text)
+            if len(self._blocks) > MAX_BLOCKS:
+                self._blocks.popitem(last=False)
+            return block
+
+    def versions(self) -> Dict[str, dict]:
+        prompts = [self.get(name) for name in self.sources]
+        return {p.name: {'version': p.version, 'source': p.source, 'bytes': len(p.text.encode('utf-8'))}
+                for p in prompts}
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self, name):
+        source = self.sources[name]
+        text, origin = None, None
+        if source.path:
+            stamp = self._stamp(source.path)
+            try:
+                with open(source.path, encoding='utf-8') as f:
+                    text, origin = f.read(), f'file:{source.path}'
+                self._stamps[name] = stamp
+            except (OSError, UnicodeDecodeError) as e:
+                if name in self._prompts:
+                    logger.warning('Could not reload prompt %s from %s, keeping version %s: %s',
+                                   name, source.path, self._prompts[name].version, e)
+                    self._stamps[name] = stamp
+                    return
+                logger.warning('Could not read prompt %s from %s: %s', name, source.path, e)
+        if text is None and source.env and os.environ.get(source.env):
+            text, origin = os.environ[source.env], f'env:{source.env}'
+        if text is None:
+            text, origin = source.default, 'default'
+        version = text_version(text)
+        previous = self._prompts.get(name)
+        if previous is not None and previous.version == version:
+            return
+        self._prompts[name] = Prompt(name, text, version, origin, system_block(text))
+        logger.info('Loaded prompt %s version %s from %s (%d chars)', name, version, origin, len(text))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_prompt_registry(defaults: Dict[str, PromptSource]) -> PromptRegistry:
+    """Process-wide PromptRegistry, created by the first call (create_app makes it at startup).
+    `defaults` gives the built-in text and environment variable of each prompt; its file comes
+    from CHAT_PROMPT_FILES in the app config."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            config = current_app.config
+            files = config.get('CHAT_PROMPT_FILES') or {}
+            sources = {name: source._replace(path=files.get(name) or source.path)
+                       for name, source in defaults.items()}
+            _registry = PromptRegistry(sources, float(config.get('CHAT_PROMPT_RELOAD_SECONDS', 2)))
+        return _registry
@@ -0,0 +1,486 @@
+"""Disk cache for the /proxy endpoint.
+
+Every viewer of a PDF or video used to trigger its own upstream download, and
+every seek (Range request) another one. Objects are now fetched once into
+PROXY_CACHE_DIR, keyed by the resolved URL, and served from disk:
+
+- one upstream fetch per object: concurrent requests for the same URL share the
+  download and read the part file as it grows, so the first bytes are served
+  before the download finishes (also without a Content-Length: the body is then
+  streamed until the download ends, and Range requests for it are proxied
+  directly until its size is known);
+- Range requests (`bytes=a-b`, `bytes=a-`, `bytes=-n`) are answered from the
+  cached file with 206 + Content-Range. While the object is downloading, a
+  Range starting more than RANGE_WAIT_BYTES past what was written (a seek
+  ahead) raises NotCacheable and is proxied directly instead of waiting;
+- after PROXY_CACHE_TTL_SECONDS an entry is revalidated upstream with
+  If-None-Match / If-Modified-Since; a 304 keeps the cached body;
+- the cache is bounded to PROXY_CACHE_MAX_BYTES, evicting least recently used
+  entries; sizes and recency are kept in an in-memory index, built from the
+  directory when the cache is opened (the meta file's mtime is the last access).
+  Objects larger than PROXY_CACHE_MAX_OBJECT_BYTES, HTML pages and
+  upstream errors are not cached: `get()` raises NotCacheable and the route
+  proxies the request directly as before.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from flask import Response, current_app, request, stream_with_context
+
+from services import http_client
+from services.proxy_service import response_headers
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# Upstream headers kept with a cached object
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+# How long an object found to be uncacheable goes straight to the origin
+UNCACHEABLE_SECONDS = 300
+# Most URLs remembered as uncacheable at once (oldest forgotten first)
+MAX_UNCACHEABLE = 10000
+# How far past the downloaded bytes a Range may start and still wait for the download
+RANGE_WAIT_BYTES = 1024 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class NotCacheable(Exception):
+    """The object can't be served from the cache; proxy it directly."""
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: Optional[str], size: int):
+    """(start, end) inclusive for a single-range `Range` header, or None for the whole body.
+    Multi-range and malformed headers are ignored (the whole body is sent, as RFC 9110 allows)."""
+    if not header:
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+        if start >= size or end < start:
+            raise RangeNotSatisfiable(header)
+    else:
+        suffix = int(m.group(2))
+        if suffix == 0:
+            raise RangeNotSatisfiable(header)
+        start, end = max(size - suffix, 0), size - 1
+    return start, end
+
+
+class _Download:
+    """An upstream fetch being written to a part file; readers follow `written`."""
+
+    def __init__(self, key, url, part_path, size, headers):
+        self.key = key
+        self.url = url
+        self.part_path = part_path
+        self.size = size
+        self.headers = headers
+        self.written = 0
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def wait_for(self, offset):
+        """Block until the byte at `offset` was written (or the download ended); returns bytes written."""
+        with self.cond:
+            while self.written <= offset and not self.done:
+                self.cond.wait()
+            return self.written
+
+    def wait_done(self):
+        with self.cond:
+            while not self.done:
+                self.cond.wait()
+
+
+class CacheEntry:
+    """A cached object (complete, or still downloading when `download` is set).
+    `size` is None while a download without Content-Length is in progress."""
+
+    def __init__(self, key, size, headers, fh, download=None):
+        self.key = key
+        self.size = size
+        self.headers = headers
+        self._fh = fh
+        self.download = download
+
+    @property
+    def etag(self):
+        if self.size is None:
+            return self.headers.get('ETag')
+        return self.headers.get('ETag') or f'"{self.key[:16]}-{self.size}"'
+
+    def iter_range(self, start, end, chunk_size=CHUNK_SIZE):
+        """Yield bytes start..end (inclusive; end None: up to the end of the download),
+        waiting for an in-progress download as needed."""
+        try:
+            self._fh.seek(start)
+            pos = start
+            while end is None or pos <= end:
+                available = self.download.wait_for(pos) if self.download else self.size
+                if available <= pos:
+                    if end is not None or self.download.error is not None:
+                        logger.warning('proxy cache: download of %s failed mid-stream', self.key)
+                    return
+                want = available - pos if end is None else min(end + 1 - pos, available - pos)
+                chunk = self._fh.read(min(chunk_size, want))
+                if not chunk:
+                    return
+                pos += len(chunk)
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._fh.closed:
+            self._fh.close()
+
+
+class ProxyCache:
+    def __init__(self, root, max_bytes, max_object_bytes, ttl_seconds, timeout=15):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.ttl_seconds = ttl_seconds
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [lock, threads using it]; dropped when unused
+        self._downloads = {}
+        self._uncacheable = OrderedDict()  # key -> time until which it is proxied directly
+        self._index = OrderedDict()  # key -> body size, least recently used first
+        self._total = 0
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    # -- paths and metadata --------------------------------------------------
+    def _paths(self, key):
+        base = os.path.join(self.root, key[:2], key)
+        return base + '.json', base + '.body'
+
+    def _read_meta(self, key):
+        meta_path, _ = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        meta_path, _ = self._paths(key)
+        tmp = meta_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, meta_path)
+
+    def _mark_uncacheable(self, key):
+        now = time.time()
+        with self._lock:
+            self._uncacheable.pop(key, None)
+            self._uncacheable[key] = now + UNCACHEABLE_SECONDS
+            # same lifetime for every key, so insertion order is expiry order
+            while self._uncacheable and (len(self._uncacheable) > MAX_UNCACHEABLE
+                                         or next(iter(self._uncacheable.values())) <= now):
+                self._uncacheable.popitem(last=False)
+
+    def _is_uncacheable(self, key):
+        return self._uncacheable.get(key, 0) > time.time()
+
+    @contextmanager
+    def _key_lock(self, key):
+        with self._lock:
+            slot = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if not slot[1]:
+                    del self._key_locks[key]
+
+    def _load_index(self):
+        """Index the entries already on disk, least recently used first."""
+        entries = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-len('.json')]
+                meta_path, body_path = self._paths(key)
+                try:
+                    entries.append((os.stat(meta_path).st_mtime, key, os.stat(body_path).st_size))
+                except OSError:
+                    continue
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+
+    # -- lookup ----------------------------------------------------------------
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def local_path(self, url, user_agent=None) -> str:
+        """Path of the complete cached body of `url`, downloading it first if needed
+        (lets batch jobs reuse what viewers already fetched). Raises NotCacheable."""
+        entry = self.get(url, user_agent=user_agent)
+        download = entry.download
+        entry.close()
+        if download is not None:
+            download.wait_done()
+            if download.error is not None:
+                raise NotCacheable(url)
+        _, body_path = self._paths(self._key(url))
+        if not os.path.exists(body_path):
+            raise NotCacheable(url)
+        return body_path
+
+    def get(self, url, user_agent=None) -> CacheEntry:
+        """Cache entry for `url`, fetching or revalidating it first if needed.
+        Raises NotCacheable when the caller should proxy the request directly."""
+        key = self._key(url)
+        if self._is_uncacheable(key):
+            raise NotCacheable(url)
+        entry = self._open_fresh(key)
+        if entry is not None:
+            return entry
+        # a single thread fetches or revalidates an object; the others wait and then reuse it
+        with self._key_lock(key):
+            entry = self._open_fresh(key)
+            if entry is not None:
+                return entry
+            meta = self._read_meta(key)
+            resp = self._open_upstream(key, url, meta, user_agent)
+            if resp is None:
+                meta['validated_at'] = time.time()
+                self._write_meta(key, meta)
+                entry = self._open_fresh(key)
+                if entry is not None:
+                    return entry
+                raise NotCacheable(url)
+            download = self._start_download(key, url, resp)
+        return self._open_download(download)
+
+    def _open_fresh(self, key) -> Optional[CacheEntry]:
+        with self._lock:
+            download = self._downloads.get(key)
+        if download is not None:
+            return self._open_download(download)
+        meta = self._read_meta(key)
+        if not meta or time.time() - meta.get('validated_at', 0) > self.ttl_seconds:
+            return None
+        meta_path, body_path = self._paths(key)
+        try:
+            fh = open(body_path, 'rb')
+            os.utime(meta_path)  # LRU order when the index is rebuilt
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        return CacheEntry(key, meta['size'], meta['headers'], fh)
+
+    def _open_download(self, download) -> CacheEntry:
+        with self._lock:
+            # opened under the lock: the download renames the part file under it when done
+            fh = None if download.done else open(download.part_path, 'rb')
+        if fh is None:
+            entry = self._open_fresh(download.key)
+            if entry is None:
+                raise NotCacheable(download.url)
+            return entry
+        return CacheEntry(download.key, download.size, download.headers, fh, download)
+
+    # -- upstream ----------------------------------------------------------------
+    def _open_upstream(self, key, url, meta, user_agent):
+        """Open an upstream GET (conditional when a cached copy exists).
+        Returns None on 304 Not Modified, the open response when it should be cached."""
+        headers = {'User-Agent': user_agent or 'Mozilla/5.0'}
+        if meta:
+            if meta['headers'].get('ETag'):
+                headers['If-None-Match'] = meta['headers']['ETag']
+            if meta['headers'].get('Last-Modified'):
+                headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+        try:
+            resp = http_client.open_url(url, headers=headers, timeout=self.timeout)
+        except http_client.UpstreamError as e:
+            raise NotCacheable(url) from e
+        if resp.status == 304 and meta:
+            resp.close()
+            return None
+        length = resp.headers.get('Content-Length')
+        content_type = (resp.headers.get('Content-Type') or '').lower()
+        too_large = length is not None and length.isdigit() and int(length) > self.max_object_bytes
+        if resp.status != 200 or too_large or content_type.startswith('text/html'):
+            resp.close()
+            if resp.status < 400:
+                self._mark_uncacheable(key)
+            raise NotCacheable(url)
+        return resp
+
+    def _start_download(self, key, url, resp):
+        _, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        length = resp.headers.get('Content-Length')
+        headers = {h: resp.headers[h] for h in STORED_HEADERS if resp.headers.get(h)}
+        download = _Download(key, url, f'{body_path}.{threading.get_ident()}.part',
+                             int(length) if length and length.isdigit() else None, headers)
+        fh = open(download.part_path, 'wb')
+        with self._lock:
+            self._downloads[key] = download
+        threading.Thread(target=self._download, args=(download, resp, fh),
+                         name='proxy-cache-download', daemon=True).start()
+        return download
+
+    def _download(self, download, resp, fh):
+        _, body_path = self._paths(download.key)
+        try:
+            with resp, fh:
+                for chunk in resp.iter_chunks():
+                    if download.written + len(chunk) > self.max_object_bytes:
+                        raise NotCacheable('object exceeds PROXY_CACHE_MAX_OBJECT_BYTES')
+                    fh.write(chunk)
+                    fh.flush()
+                    with download.cond:
+                        download.written += len(chunk)
+                        download.cond.notify_all()
+            if download.size is not None and download.written != download.size:
+                raise OSError(f'truncated download ({download.written}/{download.size} bytes)')
+            with self._lock:
+                os.replace(download.part_path, body_path)
+                self._write_meta(download.key, {
+                    'url': download.url, 'size': download.written, 'headers': download.headers,
+                    'validated_at': time.time(),
+                })
+                del self._downloads[download.key]
+                self._total += download.written - self._index.pop(download.key, 0)
+                self._index[download.key] = download.written
+            self._evict()
+        except Exception as e:
+            logger.warning('proxy cache: download of %s failed: %s', download.url, e)
+            download.error = e
+            if isinstance(e, NotCacheable):
+                self._mark_uncacheable(download.key)
+            with self._lock:
+                self._downloads.pop(download.key, None)
+            try:
+                os.remove(download.part_path)
+            except OSError:
+                pass
+        finally:
+            with download.cond:
+                download.done = True
+                download.cond.notify_all()
+
+    # -- eviction ----------------------------------------------------------------
+    def _evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            victims = []
+            total = self._total
+            for key, size in self._index.items():
+                if total <= self.max_bytes:
+                    break
+                if key in self._downloads:
+                    continue
+                victims.append(key)
+                total -= size
+            for key in victims:
+                size = self._index.pop(key)
+                self._total -= size
+                # readers that already opened the body keep their file handle
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                logger.info('proxy cache: evicted %s (%s bytes)', key, size)
+
+
+def plan_response(entry: CacheEntry, url: str, request_headers):
+    """(status, headers, (start, end) or None) answering a request from `entry`.
+    Handles If-None-Match (304) and Range (206/416); a body is only sent for 200/206.
+    Shared by the Flask route and the asyncio proxy (routes/async_proxy.py).
+
+    While the size of the object is unknown (download without Content-Length), the
+    body is streamed whole with end None and no Content-Length; a Range request then
+    raises NotCacheable (the entry is closed) so the caller proxies it directly. So
+    does a Range starting more than RANGE_WAIT_BYTES past the bytes downloaded so far."""
+    headers = response_headers(entry.headers, url)
+    headers.update({
+        'Accept-Ranges': 'bytes',
+        'X-Proxy-Cache': 'STREAM' if entry.download else 'HIT',
+    })
+    if entry.etag:
+        headers['ETag'] = entry.etag
+    if entry.etag and request_headers.get('If-None-Match') == entry.etag and not request_headers.get('Range'):
+        return 304, headers, None
+    if entry.size is None:
+        if request_headers.get('Range'):
+            entry.close()
+            raise NotCacheable(url)
+        headers.pop('Content-Length', None)
+        return 200, headers, (0, None)
+    try:
+        byte_range = parse_range(request_headers.get('Range'), entry.size)
+    except RangeNotSatisfiable:
+        headers['Content-Range'] = f'bytes */{entry.size}'
+        return 416, headers, None
+    status = 200
+    start, end = 0, entry.size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        if entry.download and start > entry.download.written + RANGE_WAIT_BYTES:
+            entry.close()
+            raise NotCacheable(url)
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{entry.size}'
+    headers['Content-Length'] = str(end - start + 1 if entry.size else 0)
+    return status, headers, (start, end)
+
+
+def cached_response(entry: CacheEntry, url: str) -> Response:
+    """Flask response for the current request (handles If-None-Match and Range)."""
+    status, headers, byte_range = plan_response(entry, url, request.headers)
+    if byte_range is None:
+        entry.close()
+        return Response(status=status, headers=headers)
+    return Response(stream_with_context(entry.iter_range(*byte_range)), status=status, headers=headers)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_proxy_cache() -> Optional[ProxyCache]:
+    """Process-wide ProxyCache from the app config, or None when PROXY_CACHE_MAX_BYTES is 0."""
+    global _cache
+    config = current_app.config
+    if not config.get('PROXY_CACHE_MAX_BYTES'):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ProxyCache(
+                config.get('PROXY_CACHE_DIR') or os.path.join(current_app.instance_path, 'proxy_cache'),
+                max_bytes=int(config['PROXY_CACHE_MAX_BYTES']),
+                max_object_bytes=int(config.get('PROXY_CACHE_MAX_OBJECT_BYTES') or config['PROXY_CACHE_MAX_BYTES']),
+                ttl_seconds=float(config.get('PROXY_CACHE_TTL_SECONDS') or 300),
+            )
+        return _cache
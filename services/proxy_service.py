@@ -0,0 +1,48 @@
+"""Header rules shared by the /proxy implementations.
+
+The synchronous Flask route (routes/article_routes.py), its disk cache
+(services/proxy_cache.py) and the asyncio handler (routes/async_proxy.py) must
+send the same headers to the browser, so the filtering lives here.
+"""
+
+# Excluir cabeceras que puedan interferir con embed/streaming en el cliente
+EXCLUDED_HEADERS = frozenset([
+    'content-encoding', 'transfer-encoding', 'connection', 'x-frame-options',
+    'content-disposition', 'set-cookie', 'x-content-type-options',
+])
+
+# Upstream headers included in the proxy's debug log line
+LOGGED_HEADERS = ('content-type', 'content-length', 'accept-ranges', 'content-range', 'access-control-allow-origin')
+
+
+def forward_request_headers(request_headers) -> dict:
+    """Client headers passed on to the upstream (Range for seeking, UA and Referer for CDNs)."""
+    headers = {}
+    for name in ('Range', 'User-Agent', 'Referer'):
+        value = request_headers.get(name)
+        if value:
+            headers[name] = value
+    return headers
+
+
+def response_headers(remote_headers, url: str) -> dict:
+    """Headers to send to the browser for an upstream response.
+
+    Drops hop-by-hop and embedding-hostile headers, guesses application/pdf for
+    `.pdf` URLs without a Content-Type, forces PDFs to display inline and allows
+    any origin.
+    """
+    headers = {}
+    for k, v in remote_headers.items():
+        if k.lower() in EXCLUDED_HEADERS:
+            continue
+        headers[k] = v
+    # Si el recurso parece un PDF y no se devolvió content-type, forzarlo
+    content_type = next((v for k, v in headers.items() if k.lower() == 'content-type'), None)
+    if content_type is None and url.lower().endswith('.pdf'):
+        headers['Content-Type'] = content_type = 'application/pdf'
+    # Forzar inline para PDFs para que el navegador los muestre incrustados
+    if (content_type or '').lower().startswith('application/pdf'):
+        headers['Content-Disposition'] = 'inline'
+    headers['Access-Control-Allow-Origin'] = '*'
+    return headers
@@ -0,0 +1,211 @@
+"""Process-pool PDF rendering.
+
+PyMuPDF rendering holds the GIL and a malformed or huge PDF can spin or balloon
+indefinitely, so renders run in a pool of worker processes instead of the
+request/worker thread:
+
+- RENDER_WORKERS processes (default: CPU count) render in parallel across cores;
+- workers start from a fresh interpreter (forkserver, or spawn where it is not
+  available), not a fork of the app, and each is capped at RENDER_MEMORY_MB of
+  address space (Unix), so the cap measures the render and not the inherited app;
+- each job must finish within RENDER_TIMEOUT_SECONDS of getting a worker: on
+  timeout only that job's worker is killed (and replaced on next use), so a
+  stuck render cannot hold a core forever and other jobs in flight are unaffected.
+
+`render_pdf()` renders one PDF, `render_many()` submits a batch and waits for all.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from services import rendition_service
+
+logger = logging.getLogger(__name__)
+
+# seconds a new worker may take to start and import PyMuPDF/Pillow
+STARTUP_TIMEOUT = 60
+_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class RenderError(Exception):
+    """A render job failed, timed out or exceeded its memory cap."""
+
+
+def _limit_worker_memory(memory_mb):
+    # Runs once in every worker process, before its first job
+    if not memory_mb:
+        return
+    try:
+        import resource
+    except ImportError:  # Windows: no per-process address space limit
+        return
+    limit = int(memory_mb) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(conn, memory_mb):
+    """Worker process loop: render every PDF source received on `conn`, send back (ok, value)."""
+    _limit_worker_memory(memory_mb)
+    # import the renderers before reporting ready, so a job's deadline doesn't pay for it
+    try:
+        import fitz  # noqa: F401  (PyMuPDF)
+    except ImportError:
+        pass
+    rendition_service._load_pil()
+    conn.send(True)
+    while True:
+        try:
+            pdf_source = conn.recv()
+        except (EOFError, OSError):
+            return
+        if pdf_source is None:
+            return
+        try:
+            conn.send((True, rendition_service.render_pdf_renditions(pdf_source)))
+        except MemoryError:
+            conn.send((False, 'render exceeded memory limit'))
+        except Exception as e:
+            conn.send((False, f'{type(e).__name__}: {e}'))
+
+
+class _Worker:
+    def __init__(self, context, memory_mb):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_mb),
+                                       name='render-worker', daemon=True)
+        self.process.start()
+        child_conn.close()
+        # wait for the fresh interpreter to import the renderers
+        try:
+            ready = self.conn.poll(STARTUP_TIMEOUT) and self.conn.recv()
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            self.kill()
+            raise RenderError('render worker failed to start (memory limit?)')
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=5)
+        except (OSError, AttributeError, ValueError):
+            pass
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=5)
+        except (OSError, ValueError):
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class RenderService:
+    def __init__(self, workers=None, timeout=60.0, memory_mb=1024):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self._context = multiprocessing.get_context(_START_METHOD)
+        # one entry per worker slot: an idle _Worker, or None when its process is not started yet
+        # (first use, or killed after a timeout/crash)
+        self._idle = queue.LifoQueue()
+        for _ in range(self.workers):
+            self._idle.put(None)
+
+    def _run(self, pdf_source):
+        """Render one source on a free worker; returns the encoded renditions or a RenderError."""
+        worker = self._idle.get()
+        try:
+            if worker is None or not worker.process.is_alive():
+                worker = None
+                try:
+                    worker = _Worker(self._context, self.memory_mb)
+                except RenderError as e:
+                    logger.error('render: %s', e)
+                    return e
+            # the deadline starts now that the job has a worker, not when it was queued
+            started = time.monotonic()
+            try:
+                worker.conn.send(pdf_source)
+                if not worker.conn.poll(self.timeout):
+                    logger.error('render: job exceeded %.0fs, killing worker pid %s',
+                                 time.monotonic() - started, worker.process.pid)
+                    worker.kill()
+                    worker = None
+                    return RenderError('render timed out')
+                ok, value = worker.conn.recv()
+            except (EOFError, OSError):
+                # the worker died (e.g. hit the memory cap)
+                worker.kill()
+                logger.error('render: worker pid %s died (exit code %s), replacing it',
+                             worker.process.pid, worker.process.exitcode)
+                worker = None
+                return RenderError('render worker crashed (memory limit?)')
+            if not ok:
+                logger.error('render: job failed: %s', value)
+                return RenderError(value)
+            return value
+        finally:
+            self._idle.put(worker)
+
+    def render_many(self, pdf_sources):
+        """Render the first page of every source (bytes or file path) in parallel.
+
+        Returns a list aligned with `pdf_sources`: the encoded renditions
+        (see rendition_service.render_pdf_renditions) or a RenderError.
+        """
+        pdf_sources = list(pdf_sources)
+        if len(pdf_sources) <= 1:
+            return [self._run(src) for src in pdf_sources]
+        with ThreadPoolExecutor(max_workers=min(len(pdf_sources), self.workers)) as threads:
+            return list(threads.map(self._run, pdf_sources))
+
+    def render_pdf(self, pdf_source):
+        """Render one PDF; returns the encoded renditions (or None) and raises RenderError on failure."""
+        result = self._run(pdf_source)
+        if isinstance(result, RenderError):
+            raise result
+        return result
+
+    def shutdown(self):
+        """Stop the idle worker processes (workers still rendering are stopped when their job ends)."""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if worker is not None:
+                worker.stop()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_render_service():
+    """Process-wide RenderService configured from the app config (created on first use)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            config = current_app.config
+            _service = RenderService(
+                workers=config.get('RENDER_WORKERS'),
+                timeout=float(config.get('RENDER_TIMEOUT_SECONDS') or 60),
+                memory_mb=config.get('RENDER_MEMORY_MB'),
+            )
+        return _service
+
+
+def render_pdf_renditions(pdf_source):
+    """Render a PDF in the pool and store its renditions; returns the rendition map or None."""
+    return rendition_service.store_renditions(get_render_service().render_pdf(pdf_source))
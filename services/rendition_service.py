@@ -0,0 +1,145 @@
+"""Multi-resolution image renditions (WebP + JPEG) for article images.
+
+A source (first page of a PDF, or an uploaded cover image) is decoded once and
+downscaled to each of WIDTHS; every rendition is stored in the media store and
+described by a rendition map saved in Article.image_renditions:
+
+    {"width": 1600, "height": 2070,
+     "jpeg": [{"width": 160, "url": "..."}, ...],
+     "webp": [{"width": 160, "url": "..."}, ...],
+     "srcset": {"jpeg": "<url> 160w, <url> 320w, ...", "webp": "..."}}
+
+Views pick the smallest rendition that fits (cards, notification avatars, the
+article page) instead of downloading the same 800px JPEG everywhere.
+Requires Pillow; PDFs additionally require PyMuPDF.
+
+Rendering/encoding (render_pdf_renditions, encode_renditions) is kept separate from
+storing (store_renditions) so the CPU-heavy part can run in another process.
+"""
+import io
+import logging
+from typing import Optional
+
+from services import media_service
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 800, 1600)
+FORMATS = (('webp', 'image/webp'), ('jpeg', 'image/jpeg'))
+QUALITY = {'webp': 80, 'jpeg': 82}
+
+
+def _load_pil():
+    try:
+        from PIL import Image
+    except ModuleNotFoundError as e:
+        logger.warning('Pillow not available, cannot build image renditions: %s', e)
+        return None
+    return Image
+
+
+def encode_renditions(source) -> dict:
+    """Downscale a PIL image to every width (never upscaling) and encode each format.
+
+    Pure function (no app or DB access) so it can run in a render worker process;
+    store_renditions() then writes the result to the media store.
+    """
+    Image = _load_pil()
+    src_w, src_h = source.size
+    widths = sorted({min(w, src_w) for w in WIDTHS})
+    items = []
+    for width in widths:
+        height = max(1, round(src_h * width / src_w))
+        img = source if width == src_w else source.resize((width, height), Image.LANCZOS)
+        for fmt, mimetype in FORMATS:
+            buf = io.BytesIO()
+            img.save(buf, format=fmt.upper(), quality=QUALITY[fmt], optimize=True)
+            items.append({'format': fmt, 'mimetype': mimetype, 'width': width, 'data': buf.getvalue()})
+    return {'width': src_w, 'height': src_h, 'items': items}
+
+
+def store_renditions(encoded: Optional[dict]) -> Optional[dict]:
+    """Store encoded renditions in the media store and return the rendition map."""
+    if not encoded or not encoded.get('items'):
+        return None
+    result = {'width': encoded['width'], 'height': encoded['height']}
+    for fmt, _ in FORMATS:
+        result[fmt] = []
+    for item in encoded['items']:
+        url = media_service.store_bytes(item['data'], item['mimetype'])
+        result[item['format']].append({'width': item['width'], 'url': url})
+    result['srcset'] = {
+        fmt: ', '.join(f"{r['url']} {r['width']}w" for r in result[fmt]) for fmt, _ in FORMATS
+    }
+    return result
+
+
+def renditions_from_image(image_bytes: bytes) -> Optional[dict]:
+    """Rendition map for an uploaded image (JPEG/PNG/WebP/...), or None if it can't be decoded."""
+    Image = _load_pil()
+    if Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        img.load()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception('renditions: could not decode image')
+        return None
+    if img.mode not in ('RGB', 'L'):
+        # flatten transparency onto white so JPEG renditions look like the original
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        rgba = img.convert('RGBA')
+        background.paste(rgba, mask=rgba.split()[-1])
+        img = background
+    return store_renditions(encode_renditions(img.convert('RGB')))
+
+
+def open_pdf(fitz, pdf_source):
+    """Open a PDF given as bytes or as a file path (PyMuPDF then reads pages lazily from disk)."""
+    if isinstance(pdf_source, str):
+        return fitz.open(pdf_source, filetype='pdf')
+    return fitz.open(stream=pdf_source, filetype='pdf')
+
+
+def render_pdf_renditions(pdf_source) -> Optional[dict]:
+    """Render the first page of a PDF (bytes or file path) once at the largest width and
+    encode every rendition. Pure function, executed by the render worker processes
+    (services/render_service.py). Without Pillow only an 800px JPEG is produced."""
+    try:
+        import fitz  # PyMuPDF
+    except ModuleNotFoundError as e:
+        logger.warning('PyMuPDF not available, cannot render PDF renditions: %s', e)
+        return None
+    Image = _load_pil()
+    doc = open_pdf(fitz, pdf_source)
+    try:
+        if doc.page_count < 1:
+            return None
+        page = doc.load_page(0)
+        rect = page.rect
+        target = max(WIDTHS) if Image is not None else 800
+        scale = target / rect.width if rect.width > 0 else 1.0
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+        if Image is None:
+            return {'width': pix.width, 'height': pix.height, 'items': [
+                {'format': 'jpeg', 'mimetype': 'image/jpeg', 'width': pix.width, 'data': pix.tobytes(output='jpeg')},
+            ]}
+        img = Image.frombytes('RGB', (pix.width, pix.height), pix.samples)
+    finally:
+        doc.close()
+    return encode_renditions(img)
+
+
+def renditions_from_pdf(pdf_source) -> Optional[dict]:
+    """Rendition map for the first page of a PDF, rendered in this process."""
+    return store_renditions(render_pdf_renditions(pdf_source))
+
+
+def pick(renditions: Optional[dict], width: int, fmt: str = 'jpeg') -> Optional[str]:
+    """URL of the smallest rendition at least `width` px wide (or the largest one)."""
+    if not renditions or not renditions.get(fmt):
+        return None
+    for r in renditions[fmt]:
+        if r['width'] >= width:
+            return r['url']
+    return renditions[fmt][-1]['url']
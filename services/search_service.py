@@ -0,0 +1,115 @@
+"""Full-text search index for articles (SQLite FTS5).
+
+The `article_fts` virtual table stores an accent-folded copy of each article's
+title, content and tag, keyed by the article id (rowid). `?q=` searches join a
+MATCH against it (ranked by bm25) instead of normalizing every article on every
+request.
+"""
+import logging
+import re
+
+from sqlalchemy import Float, Integer, text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+
+from models import db
+from models.article import Article
+from utils.text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'article_fts'
+
+
+def ensure_search_index() -> bool:
+    """Create the FTS table if missing. Returns True when it was just created."""
+    exists = db.session.execute(
+        text("SELECT name FROM sqlite_master WHERE type='table' AND name=:name"), {'name': FTS_TABLE}
+    ).first()
+    if exists:
+        return False
+    db.session.execute(text(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, content, tag, tokenize='unicode61')"
+    ))
+    db.session.commit()
+    return True
+
+
+def index_article(article) -> None:
+    """Insert or replace the index row for `article` in the current session.
+    The caller commits, so the index stays in the same transaction as the article."""
+    try:
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': article.id})
+        db.session.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, title, content, tag) VALUES (:id, :title, :content, :tag)"),
+            {
+                'id': article.id,
+                'title': normalize_text(article.title),
+                'content': normalize_text(article.content),
+                'tag': normalize_text(article.tag),
+            },
+        )
+    except OperationalError:
+        # FTS5 unavailable or table missing: searching falls back to a scan
+        logger.exception('search index: failed to index article id %s', article.id)
+
+
+def remove_article(article_id) -> None:
+    """Drop the index row for `article_id` in the current session (caller commits)."""
+    try:
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': article_id})
+    except OperationalError:
+        logger.exception('search index: failed to remove article id %s', article_id)
+
+
+def rebuild_search_index(batch_size: int = 200) -> int:
+    """Re-create the index from the article table. Returns the number of indexed rows."""
+    ensure_search_index()
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    count = 0
+    last_id = 0
+    while True:
+        batch = (Article.query.filter(Article.id > last_id)
+                 .order_by(Article.id).limit(batch_size).all())
+        if not batch:
+            break
+        for article in batch:
+            index_article(article)
+        count += len(batch)
+        last_id = batch[-1].id
+    db.session.commit()
+    return count
+
+
+def _build_match_query(search_term: str) -> str:
+    # Every word must appear (implicit AND); each one is a quoted prefix match
+    words = re.findall(r'\w+', normalize_text(search_term))
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def search_index_ready() -> bool:
+    """True when the FTS table exists (FTS5 is available and ensure_search_index() ran)."""
+    try:
+        return db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"), {'name': FTS_TABLE}
+        ).first() is not None
+    except SQLAlchemyError:
+        logger.exception('search index: could not check for the FTS table')
+        db.session.rollback()
+        return False
+
+
+def match_subquery(search_term: str):
+    """Subquery (rowid, score) of the articles matching `search_term`, to join on Article.id;
+    a lower score is a better match (bm25). Matching and ranking stay in SQL, however many
+    articles match.
+
+    Returns None when the index cannot be used, so callers can fall back to a scan.
+    """
+    if not search_index_ready():
+        return None
+    match = _build_match_query(search_term)
+    where = f'{FTS_TABLE} MATCH :q' if match else '0'
+    stmt = text(f"SELECT rowid, bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} WHERE {where}")
+    if match:
+        stmt = stmt.bindparams(q=match)
+    return stmt.columns(rowid=Integer, score=Float).subquery('fts_match')
@@ -0,0 +1,213 @@
+"""Background queue for PDF thumbnails and image renditions.
+
+Writes (create/update/upload) only insert a `ThumbnailJob` row in their own
+transaction and return; a worker thread started by the app (or
+scripts/generate_pdf_thumbs.py) claims pending jobs, fetches and renders the
+PDF (or the uploaded image) and stores the thumbnail and its renditions. Failed jobs are retried with exponential backoff
+until `max_attempts`; jobs left 'running' by a crashed worker are reclaimed
+after LEASE_SECONDS.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db
+from models.article import Article
+from models.thumbnail_job import ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+LEASE_SECONDS = 300
+
+_wakeup = threading.Event()
+
+
+def enqueue_thumbnail(article_id, overwrite=False):
+    """Add a pending job for `article_id` to the current session (the caller commits).
+    Reuses an existing pending job for the same article. With `overwrite`, the
+    thumbnail replaces the current image_url instead of only filling a missing one."""
+    job = ThumbnailJob.query.filter_by(article_id=article_id, status='pending').first()
+    if job is None:
+        job = ThumbnailJob(article_id=article_id, status='pending', run_after=datetime.utcnow(), overwrite=overwrite)
+        db.session.add(job)
+    elif overwrite:
+        job.overwrite = True
+    return job
+
+
+def notify_worker():
+    """Wake the worker thread after committing new jobs (otherwise it picks them up on its next poll)."""
+    _wakeup.set()
+
+
+def get_job(job_id):
+    return ThumbnailJob.query.get(job_id)
+
+
+def latest_job_for_article(article_id):
+    return (ThumbnailJob.query.filter_by(article_id=article_id)
+            .order_by(ThumbnailJob.id.desc()).first())
+
+
+def claim_next_job():
+    """Atomically mark the oldest runnable job as 'running' and return it (None if idle).
+    Safe across threads and processes: the conditional UPDATE only succeeds for one claimant."""
+    now = datetime.utcnow()
+    runnable = or_(
+        and_(ThumbnailJob.status == 'pending', ThumbnailJob.run_after <= now),
+        and_(ThumbnailJob.status == 'running', ThumbnailJob.locked_at < now - timedelta(seconds=LEASE_SECONDS)),
+    )
+    while True:
+        candidate = db.session.query(ThumbnailJob.id, ThumbnailJob.status).filter(runnable).order_by(ThumbnailJob.id).first()
+        if candidate is None:
+            db.session.rollback()
+            return None
+        claimed = ThumbnailJob.query.filter(
+            ThumbnailJob.id == candidate.id, ThumbnailJob.status == candidate.status, runnable,
+        ).update({
+            'status': 'running',
+            'locked_at': now,
+            'attempts': ThumbnailJob.attempts + 1,
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return ThumbnailJob.query.get(candidate.id)
+        # another worker won the race; try the next one
+
+
+def release_jobs(job_ids):
+    """Put jobs an interrupted process left 'running' back in the queue right away,
+    without waiting for their lease to expire (the interrupted attempt is not counted).
+    The caller commits. Returns the number of jobs released."""
+    if not job_ids:
+        return 0
+    return ThumbnailJob.query.filter(ThumbnailJob.id.in_(job_ids), ThumbnailJob.status == 'running').update({
+        'status': 'pending',
+        'locked_at': None,
+        'run_after': datetime.utcnow(),
+        'attempts': ThumbnailJob.attempts - 1,
+    }, synchronize_session=False)
+
+
+def _backoff_seconds(attempts):
+    return min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+
+
+def run_job(job):
+    """Generate the thumbnail for a claimed job and record the outcome."""
+    from services.article_service import build_article_images
+
+    article = Article.query.get(job.article_id)
+    error = None
+    if article is None:
+        job.status = 'failed'
+        job.last_error = 'article no longer exists'
+    else:
+        try:
+            ok = build_article_images(article, overwrite=job.overwrite)
+        except Exception as e:
+            logger.exception('thumbnail queue: job %s failed', job.id)
+            ok, error = False, str(e)
+        if ok:
+            job.status = 'done'
+            job.last_error = None
+        else:
+            error = error or 'thumbnail generation failed'
+    if error:
+        job.last_error = error
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+        else:
+            job.status = 'pending'
+            job.run_after = datetime.utcnow() + timedelta(seconds=_backoff_seconds(job.attempts))
+    job.locked_at = None
+    try:
+        db.session.commit()
+    except SQLAlchemyError:
+        logger.exception('thumbnail queue: failed to save result of job %s', job.id)
+        db.session.rollback()
+    return job
+
+
+def _run_job_by_id(app, job_id):
+    # each thread needs its own app context (and therefore its own DB session)
+    with app.app_context():
+        run_job(get_job(job_id))
+
+
+def run_pending(max_jobs=None, concurrency=1):
+    """Process runnable jobs until the queue is idle (or `max_jobs` ran). Returns the jobs run.
+
+    With `concurrency` > 1 up to that many claimed jobs run at once in threads; the
+    PDF renders themselves go to the render process pool (services/render_service.py),
+    so they use several cores instead of queuing behind each other.
+    """
+    if concurrency <= 1:
+        processed = []
+        while max_jobs is None or len(processed) < max_jobs:
+            job = claim_next_job()
+            if job is None:
+                break
+            logger.info('thumbnail queue: running job %s for article %s (attempt %s)', job.id, job.article_id, job.attempts)
+            processed.append(run_job(job))
+        return processed
+
+    app = current_app._get_current_object()
+    job_ids = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='thumbnail-job') as pool:
+        while max_jobs is None or len(job_ids) < max_jobs:
+            batch = []
+            while len(batch) < concurrency and (max_jobs is None or len(job_ids) + len(batch) < max_jobs):
+                job = claim_next_job()
+                if job is None:
+                    break
+                logger.info('thumbnail queue: running job %s for article %s (attempt %s)', job.id, job.article_id, job.attempts)
+                batch.append(job.id)
+            if not batch:
+                break
+            for future in [pool.submit(_run_job_by_id, app, job_id) for job_id in batch]:
+                future.result()
+            job_ids.extend(batch)
+    db.session.expire_all()
+    return [get_job(job_id) for job_id in job_ids]
+
+
+class ThumbnailWorker(threading.Thread):
+    """Daemon thread that drains the queue, sleeping `poll_interval` seconds when idle."""
+
+    def __init__(self, app, poll_interval=5.0, concurrency=1):
+        super().__init__(name='thumbnail-worker', daemon=True)
+        self.app = app
+        self.poll_interval = poll_interval
+        self.concurrency = concurrency
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        _wakeup.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            ran = []
+            try:
+                with self.app.app_context():
+                    ran = run_pending(max_jobs=10, concurrency=self.concurrency)
+            except Exception:
+                logger.exception('thumbnail worker: unexpected error')
+            if not ran:
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
+
+
+def start_worker(app, poll_interval=5.0):
+    concurrency = int(app.config.get('THUMBNAIL_CONCURRENCY') or 1)
+    worker = ThumbnailWorker(app, poll_interval=poll_interval, concurrency=concurrency)
+    worker.start()
+    return worker
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, User  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'blog.db'),
+        'MEDIA_ROOT': str(tmp_path / 'media'),
+        'PROXY_CACHE_DIR': str(tmp_path / 'proxy_cache'),
+        'MEDIA_BASE_URL': 'http://media.test',
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='ana', email='ana@example.com')
+    user.set_password('secreto')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    """Test client logged in as `user`."""
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'] = user.id
+    return client
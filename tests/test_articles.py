@@ -0,0 +1,93 @@
+import io
+import json
+from datetime import datetime, timedelta
+
+from models import db, Article, ThumbnailJob
+from services.search_service import rebuild_search_index
+
+
+def make_article(user, **fields):
+    article = Article(title=fields.pop('title', 'Artículo'), content=fields.pop('content', 'texto'),
+                      user_id=user.id, **fields)
+    db.session.add(article)
+    db.session.commit()
+    return article
+
+
+def test_upload_pdf_returns_public_urls(client, user):
+    article = make_article(user)
+    pdf = b'%PDF-1.4\n%test\n'
+    resp = client.post(f'/article/{article.id}/upload_pdf',
+                       data={'file': (io.BytesIO(pdf), 'doc.pdf')}, content_type='multipart/form-data')
+
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body['pdf_url'].startswith('http://media.test/media/') and body['pdf_url'].endswith('.pdf')
+    assert body['thumbnail_job']['article_id'] == article.id
+    # stored relative, made absolute only in the response
+    assert db.session.get(Article, article.id).pdf_url == body['pdf_url'][len('http://media.test'):]
+    assert ThumbnailJob.query.count() == 1
+
+
+def test_upload_pdf_rejects_non_pdf(client, user):
+    article = make_article(user)
+    resp = client.post(f'/article/{article.id}/upload_pdf',
+                       data={'file': (io.BytesIO(b'<html></html>'), 'doc.pdf')}, content_type='multipart/form-data')
+    assert resp.status_code == 415
+    assert db.session.get(Article, article.id).pdf_url is None
+
+
+def test_summary_thumbnail_url_is_absolute(client, user):
+    renditions = {'jpeg': [{'width': 320, 'height': 180, 'url': '/media/a.jpg'},
+                           {'width': 640, 'height': 360, 'url': '/media/b.jpg'}]}
+    make_article(user, image_url='/media/c.jpg', image_renditions=json.dumps(renditions))
+    resp = client.get('/articles?view=summary')
+
+    assert resp.status_code == 200
+    assert resp.get_json()[0]['thumbnail_url'] == 'http://media.test/media/a.jpg'
+
+
+def test_keyset_pages_cover_every_article_once(client, user):
+    # several articles share a created_at: the cursor breaks ties by id
+    base = datetime(2025, 1, 1)
+    for i in range(7):
+        make_article(user, title=f'Artículo {i}', created_at=base + timedelta(days=i // 3))
+    expected = [a.id for a in Article.query.order_by(Article.created_at.desc(), Article.id.desc())]
+
+    seen, cursor = [], None
+    while True:
+        resp = client.get('/articles', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        assert resp.status_code == 200
+        page = resp.get_json()
+        assert len(page['items']) <= 2
+        seen.extend(item['id'] for item in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_bad_cursor_and_limit_are_rejected(client, user):
+    make_article(user)
+    assert client.get('/articles?cursor=no-es-un-cursor').status_code == 400
+    assert client.get('/articles?limit=dos').status_code == 400
+
+
+def test_tag_filters_ignore_case_and_accents(client, user):
+    make_article(user, title='Con tag', tag='Úlceras venosas')
+    make_article(user, title='Otro', tag='Otros')
+    assert [a['title'] for a in client.get('/articles?tag=ulceras VENOSAS').get_json()] == ['Con tag']
+    assert [a['title'] for a in client.get('/articles?tag_slug=ulceras-venosas').get_json()] == ['Con tag']
+
+
+def test_search_ignores_accents_and_ranks_matches(client, user):
+    make_article(user, title='Corazón', content='El corazón late. Corazón, corazón.')
+    make_article(user, title='Nada', content='sin coincidencias')
+    make_article(user, title='Mención', content='Un corazon mencionado una vez, sin tilde')
+    rebuild_search_index()
+    db.session.commit()
+
+    titles = [a['title'] for a in client.get('/articles?q=CORAZON').get_json()]
+    assert titles == ['Corazón', 'Mención']
+    assert [a['title'] for a in client.get('/articles?q=mencion').get_json()] == ['Mención']
+    assert client.get('/articles?q=inexistente').get_json() == []
@@ -0,0 +1,96 @@
+import asyncio
+import gzip
+
+import httpx
+
+from routes.async_proxy import READ_SIZE, AsyncProxy
+from services.proxy_cache import CacheEntry, plan_response
+
+BODY = bytes(range(256)) * 4096  # 1 MiB, several READ_SIZE chunks
+
+
+def call(proxy, headers=(), url='http://upstream.test/doc.pdf'):
+    """Run one GET /proxy through `proxy`; returns (status, headers, body)."""
+    messages = []
+
+    async def receive():
+        await asyncio.sleep(3600)  # the client never disconnects
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/proxy',
+             'query_string': f'url={url}'.encode(), 'headers': list(headers)}
+    asyncio.run(proxy(scope, receive, send))
+    start = messages[0]
+    return (start['status'], {k.decode(): v.decode() for k, v in start['headers']},
+            b''.join(m.get('body', b'') for m in messages[1:]))
+
+
+def upstream_proxy(app, handler):
+    app.config['PROXY_CACHE_MAX_BYTES'] = 0  # straight to the upstream
+    proxy = AsyncProxy(app)
+    proxy._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return proxy
+
+
+def test_upstream_is_asked_for_identity_encoding(app):
+    seen = {}
+
+    def handler(request):
+        seen.update(request.headers)
+        return httpx.Response(200, stream=httpx.ByteStream(BODY), headers={'Content-Type': 'application/pdf'})
+
+    status, headers, body = call(upstream_proxy(app, handler))
+    assert seen['accept-encoding'] == 'identity'
+    assert status == 200 and body == BODY
+
+
+def test_compressed_upstream_is_relayed_decoded(app):
+    compressed = gzip.compress(BODY)
+
+    def handler(request):
+        # ignores Accept-Encoding: identity
+        return httpx.Response(200, stream=httpx.ByteStream(compressed), headers={
+            'Content-Type': 'application/pdf', 'Content-Encoding': 'gzip', 'Content-Length': str(len(compressed))})
+
+    status, headers, body = call(upstream_proxy(app, handler))
+    assert status == 200
+    assert body == BODY
+    assert 'content-length' not in {k.lower() for k in headers}
+    assert 'content-encoding' not in {k.lower() for k in headers}
+
+
+def cached_entry(tmp_path):
+    path = tmp_path / 'body'
+    path.write_bytes(BODY)
+    return CacheEntry('k' * 64, len(BODY), {'Content-Type': 'application/pdf'}, open(path, 'rb'))
+
+
+def send_cached(app, entry, request_headers):
+    proxy = AsyncProxy(app)
+    plan = plan_response(entry, 'http://upstream.test/doc.pdf', request_headers)
+    messages = []
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(proxy._send_cached(entry, plan, receive, send))
+    return messages
+
+
+def test_cached_body_is_sent_whole(app, tmp_path):
+    messages = send_cached(app, cached_entry(tmp_path), {})
+    assert messages[0]['status'] == 200
+    chunks = [m['body'] for m in messages[1:]]
+    assert b''.join(chunks) == BODY
+    assert max(len(c) for c in chunks) <= READ_SIZE
+
+
+def test_cached_range(app, tmp_path):
+    messages = send_cached(app, cached_entry(tmp_path), {'Range': 'bytes=1000-'})
+    assert messages[0]['status'] == 206
+    assert b''.join(m['body'] for m in messages[1:]) == BODY[1000:]
@@ -0,0 +1,117 @@
+import pytest
+
+from services.chat_limiter import ChatLimiter, ChatOverloaded
+from utils import chat_decorators
+
+
+def test_limiter_caps_users_and_total():
+    limiter = ChatLimiter(max_concurrent=2, per_user=1, retry_after=7)
+    limiter.acquire(1)
+    with pytest.raises(ChatOverloaded):
+        limiter.acquire(1)
+    limiter.acquire(2)
+    with pytest.raises(ChatOverloaded) as exc:
+        limiter.acquire(3)
+    assert exc.value.retry_after == 7
+
+    limiter.release(1)
+    limiter.acquire(3)
+    assert limiter.stats()['in_flight'] == 2
+    assert limiter.stats()['rejected'] == 2
+
+
+def test_busy_chat_answers_429_with_retry_after(client, user, monkeypatch):
+    limiter = ChatLimiter(max_concurrent=1, per_user=1, retry_after=9)
+    monkeypatch.setattr(chat_decorators, 'get_chat_limiter', lambda: limiter)
+    limiter.acquire(user.id)
+
+    resp = client.post('/api/chat', json={'messages': [{'role': 'user', 'text': 'hola'}]})
+    assert resp.status_code == 429
+    assert resp.headers['Retry-After'] == '9'
+    assert resp.get_json()['retry'] is True
+
+    limiter.release(user.id)
+    resp = client.post('/api/chat', json={'messages': []})
+    assert resp.status_code == 200  # the greeting, without calling the provider
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_cache_key_ignores_case_accents_and_spacing():
+    from services.chat_cache import cache_key
+
+    def conversation(text, version='v1', chat_type='comercial'):
+        return chat_type, [{'role': 'system', 'content': 'instrucción', 'version': version},
+                           {'role': 'user', 'content': text}]
+
+    key = cache_key(*conversation('Preparar visita'))
+    assert cache_key(*conversation('  preparar   VISITA ')) == key
+    assert cache_key(*conversation('Preparar visíta')) == key
+    assert cache_key(*conversation('Preparar otra visita')) != key
+    assert cache_key(*conversation('Preparar visita', version='v2')) != key
+    assert cache_key(*conversation('Preparar visita', chat_type='training')) != key
+
+
+def test_response_cache_expires_and_evicts(monkeypatch):
+    from services import chat_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(chat_cache.time, 'monotonic', lambda: now[0])
+    cache = chat_cache.ResponseCache(max_entries=2, ttl=60)
+    cache.put('a', 'A')
+    cache.put('b', 'B')
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C')  # 'b' is the least recently used
+    assert cache.get('b') is None
+    now[0] += 61
+    assert cache.get('a') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def store_turns(conversation, n, chars=40):
+    """`n` turns of `chars`-character messages (chars // 4 estimated tokens each)."""
+    from services import conversation_service
+    for i in range(n):
+        conversation_service.save_turn(conversation.id, f'{i}'.ljust(chars, 'u'), f'{i}'.ljust(chars, 'm'))
+
+
+def test_history_within_budget_is_sent_whole(app, user):
+    from services import conversation_service
+    conversation = conversation_service.get_conversation(user.id, 'comercial')
+    store_turns(conversation, 2)
+    summary, messages = conversation_service.history(conversation, budget=100, reserve=10)
+    assert summary is None
+    assert [m['role'] for m in messages] == ['user', 'model', 'user', 'model']
+
+
+def test_history_over_budget_is_summarized(app, user, monkeypatch):
+    from services import conversation_service
+    folded = []
+
+    def fake_summarize(previous, messages):
+        folded.extend(messages)
+        return 'resumen'
+
+    monkeypatch.setattr(conversation_service, 'summarize', fake_summarize)
+    conversation = conversation_service.get_conversation(user.id, 'comercial')
+    store_turns(conversation, 6)  # 12 messages of 10 tokens
+
+    summary, messages = conversation_service.history(conversation, budget=60, reserve=10)
+    # the newest messages within half the budget stay; the other 10 are folded into the summary
+    assert summary == 'resumen'
+    assert len(messages) == 2 and messages[-1]['text'].startswith('5')
+    assert len(folded) == 10
+    assert conversation.summarized_upto == folded[-1].id
+    assert [m.id for m in conversation_service.pending_messages(conversation)][0] > folded[-1].id
+
+
+def test_failed_summary_leaves_the_messages_for_next_turn(app, user, monkeypatch):
+    from services import conversation_service
+    monkeypatch.setattr(conversation_service, 'summarize', lambda previous, messages: None)
+    conversation = conversation_service.get_conversation(user.id, 'comercial')
+    store_turns(conversation, 6)
+
+    summary, messages = conversation_service.history(conversation, budget=60, reserve=10)
+    assert summary is None
+    assert len(messages) == 2  # still within budget: the older messages are left out
+    assert conversation.summarized_upto == 0
+    assert len(conversation_service.pending_messages(conversation)) == 12
@@ -0,0 +1,53 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from services import chat_provider
+from services.chat_provider import GeminiClient
+
+
+def test_missing_key_is_looked_up_again(app, monkeypatch):
+    monkeypatch.setattr(chat_provider, '_client', None)
+    monkeypatch.setattr(chat_provider, 'resolve_api_key', lambda: None)
+    app.config.pop('GOOGLE_API_KEY', None)
+    assert not chat_provider.get_chat_client().configured
+
+    monkeypatch.setattr(chat_provider, 'resolve_api_key', lambda: 'k' * 20)
+    client = chat_provider.get_chat_client()
+    assert client.configured
+    assert client.session.headers['x-goog-api-key'] == 'k' * 20
+
+
+def test_retry_after_is_capped():
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                self.send_response(429)
+                self.send_header('Retry-After', '3600')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = GeminiClient('k' * 20, f'http://127.0.0.1:{server.server_port}/m', retry_after_max=0.2)
+        resp = client.generate({})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert resp.status_code == 200
+    assert len(calls) == 2
+    assert calls[1] - calls[0] < 5
@@ -0,0 +1,65 @@
+import io
+import os
+
+import pytest
+
+from services import media_service
+from services.media_service import InvalidMediaType, MediaTooLarge, store_bytes, store_stream
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+
+def test_identical_blobs_share_one_file(app):
+    first = store_bytes(PNG, 'image/png')
+    assert first == store_bytes(PNG, 'image/png')
+    assert first.startswith('/media/') and first.endswith('.png')
+    assert os.path.exists(media_service.local_path_for_url(first))
+
+
+@pytest.mark.parametrize('mimetype', ['image/svg+xml', 'text/html', 'application/octet-stream', None])
+def test_types_outside_the_allow_list_are_refused(app, mimetype):
+    with pytest.raises(InvalidMediaType):
+        store_bytes(b'<svg onload="alert(1)"/>', mimetype)
+
+
+def test_stream_signature_and_size_are_checked(app):
+    with pytest.raises(InvalidMediaType):
+        store_stream(io.BytesIO(b'<html>'), 'application/pdf', signature=b'%PDF')
+    with pytest.raises(MediaTooLarge):
+        store_stream(io.BytesIO(b'%PDF' + b'x' * 100), 'application/pdf', max_bytes=50, signature=b'%PDF')
+    # nothing half-written is left behind
+    assert not [n for n in os.listdir(media_service.media_root()) if n.endswith('.part')]
+
+    url = store_stream(io.BytesIO(b'%PDF-1.4 ok'), 'application/pdf', max_bytes=50, signature=b'%PDF')
+    assert url.endswith('.pdf')
+
+
+def test_externalize_stores_data_urls_and_relativizes_media_links(app):
+    url = media_service.externalize('data:image/png;base64,iVBORw0KGgo=')
+    assert url.startswith('/media/')
+    assert media_service.externalize(f'http://otro-host.test{url}') == url
+    assert media_service.externalize('https://example.com/a.png') == 'https://example.com/a.png'
+    with pytest.raises(InvalidMediaType):
+        media_service.externalize('data:image/svg+xml;base64,PHN2Zy8+')
+
+
+def test_media_responses(app):
+    client = app.test_client()
+    name = store_bytes(PNG, 'image/png')[len('/media/'):]
+    resp = client.get(f'/media/{name}')
+    assert resp.status_code == 200
+    assert resp.data == PNG
+    assert resp.headers['X-Content-Type-Options'] == 'nosniff'
+    assert resp.headers['Content-Disposition'].startswith('inline')
+    assert 'immutable' in resp.headers['Cache-Control']
+
+    # a type stored before the allow-list is only ever a download
+    digest = name.split('.')[0]
+    legacy = media_service.path_for_name(f'{digest}.svg')
+    with open(legacy, 'wb') as fh:
+        fh.write(b'<svg/>')
+    resp = client.get(f'/media/{digest}.svg')
+    assert resp.headers['Content-Disposition'] == 'attachment'
+
+    assert client.get('/media/../../etc/passwd').status_code == 404
+    assert client.get('/media/nothex.png').status_code == 404
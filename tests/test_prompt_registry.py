@@ -0,0 +1,31 @@
+import logging
+
+from app import create_app
+from services import prompt_registry
+from services.prompt_registry import PromptRegistry, PromptSource
+
+
+def test_create_app_loads_the_prompts(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(prompt_registry, '_registry', None)
+    monkeypatch.setenv('KAT_SYSTEM_INSTRUCTION_FILE', str(tmp_path / 'missing.txt'))
+    with caplog.at_level(logging.WARNING, logger='services.prompt_registry'):
+        create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'blog.db')})
+
+    assert prompt_registry._registry is not None
+    assert 'missing.txt' in caplog.text
+    assert prompt_registry._registry.get('comercial').source != f'file:{tmp_path / "missing.txt"}'
+
+
+def test_prompt_file_is_reloaded_when_it_changes(tmp_path):
+    path = tmp_path / 'prompt.txt'
+    path.write_text('uno', encoding='utf-8')
+    registry = PromptRegistry({'comercial': PromptSource('por defecto', path=str(path))}, reload_interval=0)
+    first = registry.get('comercial')
+    assert (first.text, first.source) == ('uno', f'file:{path}')
+
+    path.write_text('dos, más larga', encoding='utf-8')
+    second = registry.get('comercial')
+    assert second.text == 'dos, más larga' and second.version != first.version
+
+    path.unlink()
+    assert registry.get('comercial').version == second.version  # the last loaded text stays
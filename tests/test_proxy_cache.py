@@ -0,0 +1,133 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.proxy_cache import (RANGE_WAIT_BYTES, NotCacheable, ProxyCache, RangeNotSatisfiable,
+                                  parse_range, plan_response)
+
+BODY = os.urandom(3 * RANGE_WAIT_BYTES)
+
+
+class Upstream(ThreadingHTTPServer):
+    """Serves BODY at any path; with `gate` set, only the first RANGE_WAIT_BYTES until it is opened."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.gate = None
+        self.requests = 0
+
+    def url(self, path='/doc.pdf'):
+        return f'http://127.0.0.1:{self.server_port}{path}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        if self.server.gate is not None:
+            self.wfile.write(BODY[:RANGE_WAIT_BYTES])
+            self.wfile.flush()
+            self.server.gate.wait(10)
+            self.wfile.write(BODY[RANGE_WAIT_BYTES:])
+        else:
+            self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream():
+    server = Upstream()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    if server.gate is not None:
+        server.gate.set()
+    server.shutdown()
+    server.server_close()
+
+
+def make_cache(tmp_path, max_bytes=100 * len(BODY)):
+    return ProxyCache(str(tmp_path / 'cache'), max_bytes=max_bytes, max_object_bytes=len(BODY), ttl_seconds=300)
+
+
+def read_all(cache, url, headers):
+    entry = cache.get(url)
+    status, response_headers, byte_range = plan_response(entry, url, headers)
+    return status, response_headers, b''.join(entry.iter_range(*byte_range))
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range('bytes=10-19', 100) == (10, 19)
+    assert parse_range('bytes=90-', 100) == (90, 99)
+    assert parse_range('bytes=-5', 100) == (95, 99)
+    assert parse_range('bytes=0-1,5-6', 100) is None  # multi-range: the whole body
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range('bytes=100-', 100)
+
+
+def test_one_upstream_fetch_then_ranges_from_disk(tmp_path, upstream):
+    cache = make_cache(tmp_path)
+    url = upstream.url()
+    status, _, body = read_all(cache, url, {})
+    assert status == 200 and body == BODY
+
+    status, headers, body = read_all(cache, url, {'Range': 'bytes=-100'})
+    assert status == 206
+    assert headers['Content-Range'] == f'bytes {len(BODY) - 100}-{len(BODY) - 1}/{len(BODY)}'
+    assert body == BODY[-100:]
+    assert upstream.requests == 1
+    assert cache._key_locks == {}
+
+
+def test_unsatisfiable_range(tmp_path, upstream):
+    cache = make_cache(tmp_path)
+    read_all(cache, upstream.url(), {})
+    entry = cache.get(upstream.url())
+    status, headers, byte_range = plan_response(entry, upstream.url(), {'Range': f'bytes={len(BODY)}-'})
+    entry.close()
+    assert (status, byte_range) == (416, None)
+    assert headers['Content-Range'] == f'bytes */{len(BODY)}'
+
+
+def test_range_ahead_of_the_download_is_proxied(tmp_path, upstream):
+    upstream.gate = threading.Event()
+    cache = make_cache(tmp_path)
+    url = upstream.url()
+    entry = cache.get(url)
+    assert entry.download is not None
+
+    with pytest.raises(NotCacheable):
+        plan_response(entry, url, {'Range': f'bytes={len(BODY) - 100}-'})
+
+    # a Range within what was (or is about to be) downloaded waits for the download
+    entry = cache.get(url)
+    status, _, byte_range = plan_response(entry, url, {'Range': 'bytes=100-199'})
+    assert status == 206
+    assert b''.join(entry.iter_range(*byte_range)) == BODY[100:200]
+    upstream.gate.set()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, upstream):
+    cache = make_cache(tmp_path, max_bytes=2 * len(BODY))
+    first, second, third = (upstream.url(f'/{n}.pdf') for n in ('a', 'b', 'c'))
+    for url in (first, second):
+        cache.local_path(url)
+    cache.get(first).close()  # first is now the most recently used
+    cache.local_path(third)
+
+    assert cache._total == 2 * len(BODY)
+    assert set(cache._index) == {cache._key(first), cache._key(third)}
+    assert not os.path.exists(cache._paths(cache._key(second))[1])
+
+    # the index is rebuilt from disk, in the same order
+    reopened = make_cache(tmp_path, max_bytes=2 * len(BODY))
+    assert list(reopened._index) == list(cache._index)
+    assert reopened._total == cache._total
@@ -0,0 +1,53 @@
+import pytest
+
+from app import create_app
+from models import db, Article, Favorite, User
+from utils.query_counter import count_queries
+
+
+def add_articles(owner, n):
+    """`n` articles, each by its own author, every other one a favorite of `owner`."""
+    for i in range(n):
+        author = User(username=f'autor{db.session.query(User).count()}', email=f'a{i}-{n}@example.com',
+                      password='sin-login')
+        db.session.add(author)
+        db.session.flush()
+        article = Article(title=f'Artículo {i}', content='texto', user_id=author.id)
+        db.session.add(article)
+        db.session.flush()
+        if i % 2:
+            db.session.add(Favorite(user_id=owner.id, article_id=article.id))
+    db.session.commit()
+
+
+def queries_for(client, url):
+    with count_queries() as counter:
+        resp = client.get(url)
+    assert resp.status_code == 200
+    return counter.count
+
+
+@pytest.mark.parametrize('url', ['/articles', '/articles?view=summary', '/articles?limit=50', '/favorites'])
+def test_listing_query_count_does_not_grow_with_the_page(client, user, url):
+    add_articles(user, 3)
+    few = queries_for(client, url)
+    add_articles(user, 12)
+    assert queries_for(client, url) == few
+
+
+def test_query_budget_fails_requests_over_it_in_testing(tmp_path):
+    app = create_app({'TESTING': True, 'SQL_QUERY_BUDGET': '1',
+                      'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'blog.db')})
+    with app.app_context():
+        owner = User(username='ana', email='ana@example.com')
+        owner.set_password('x')
+        db.session.add(owner)
+        db.session.commit()
+        add_articles(owner, 2)
+        client = app.test_client()
+        with client.session_transaction() as s:
+            s['user_id'] = owner.id
+        with pytest.raises(AssertionError, match='SQL statements'):
+            client.get('/articles')
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Article
+from services import article_service
+from services.thumbnail_queue import (BACKOFF_BASE_SECONDS, LEASE_SECONDS, claim_next_job, enqueue_thumbnail,
+                                      release_jobs, run_pending)
+
+
+@pytest.fixture
+def article(app, user):
+    article = Article(title='Con PDF', content='texto', user_id=user.id, pdf_url='https://example.com/a.pdf')
+    db.session.add(article)
+    db.session.commit()
+    return article
+
+
+@pytest.fixture
+def outcomes(monkeypatch):
+    """Results build_article_images returns, in order (an exception is raised)."""
+    results = []
+
+    def build(article, overwrite=False):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(article_service, 'build_article_images', build)
+    return results
+
+
+def make_runnable(job):
+    job.run_after = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_pending_job_is_reused(article):
+    first = enqueue_thumbnail(article.id)
+    db.session.commit()
+    assert enqueue_thumbnail(article.id, overwrite=True) is first
+    assert first.overwrite
+
+
+def test_failed_job_is_retried_with_backoff_then_given_up(article, outcomes):
+    job = enqueue_thumbnail(article.id)
+    job.max_attempts = 3
+    db.session.commit()
+    outcomes.extend([RuntimeError('render crashed'), False, False])
+
+    started = datetime.utcnow()
+    [job] = run_pending()
+    assert (job.status, job.attempts, job.last_error) == ('pending', 1, 'render crashed')
+    assert job.run_after >= started + timedelta(seconds=BACKOFF_BASE_SECONDS)
+    assert run_pending() == []  # not runnable before its backoff
+
+    make_runnable(job)
+    [job] = run_pending()
+    assert (job.status, job.attempts) == ('pending', 2)
+    assert job.run_after >= datetime.utcnow() + timedelta(seconds=2 * BACKOFF_BASE_SECONDS - 5)
+
+    make_runnable(job)
+    [job] = run_pending()
+    assert (job.status, job.attempts) == ('failed', 3)
+
+
+def test_successful_job_is_done(article, outcomes):
+    enqueue_thumbnail(article.id)
+    db.session.commit()
+    outcomes.append(True)
+    [job] = run_pending()
+    assert (job.status, job.attempts, job.last_error) == ('done', 1, None)
+
+
+def test_stale_running_job_is_reclaimed_and_released_jobs_run_again(article):
+    job = enqueue_thumbnail(article.id)
+    db.session.commit()
+    assert claim_next_job().id == job.id
+    assert claim_next_job() is None  # leased
+
+    job.locked_at = datetime.utcnow() - timedelta(seconds=LEASE_SECONDS + 1)
+    db.session.commit()
+    reclaimed = claim_next_job()
+    assert (reclaimed.id, reclaimed.attempts) == (job.id, 2)
+
+    assert release_jobs([job.id]) == 1
+    db.session.commit()
+    db.session.refresh(job)
+    assert (job.status, job.attempts) == ('pending', 1)
+    assert claim_next_job().id == job.id
+
@@ -0,0 +1,40 @@
+from functools import wraps
+
+from flask import current_app, jsonify, session
+
+from services.chat_limiter import ChatOverloaded, get_chat_limiter
+from services.chat_metrics import get_chat_metrics
+
+
+def bounded_chat(f):
+    """
+    Decorador que limita las rutas del chatbot a CHAT_MAX_CONCURRENT consultas a la vez
+    (services/chat_limiter.py). Si no hay cupo (límite por usuario o global), devuelve 429
+    con Retry-After de inmediato. En /api/chat/stream el cupo se libera cuando se cierra la
+    respuesta (fin del stream o desconexión).
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        limiter = get_chat_limiter()
+        user_id = session.get('user_id')
+        try:
+            limiter.acquire(user_id)
+        except ChatOverloaded as e:
+            get_chat_metrics().count('overloaded')
+            response = jsonify({'error': str(e), 'retry': True, 'retry_after': e.retry_after})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+
+        try:
+            response = current_app.make_response(f(*args, **kwargs))
+        except BaseException:
+            limiter.release(user_id)
+            raise
+        if response.is_streamed:
+            response.call_on_close(lambda: limiter.release(user_id))
+        else:
+            limiter.release(user_id)
+        return response
+
+    return decorated_function
@@ -0,0 +1,39 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+
+def remove_white_background(img: Image.Image, threshold: int = 240, softness: int = 0) -> Image.Image:
+    """Return an RGBA copy of `img` with its near-white background made transparent.
+
+    A pixel is background when all of R, G and B are >= `threshold`. With
+    `softness` > 0 the alpha ramps linearly from opaque at `threshold - softness`
+    to transparent at `threshold`, and the white fringe is removed from those edge
+    pixels (their color is un-blended from white), so antialiased borders don't
+    show a halo on dark backgrounds. Works on the whole pixel array at once.
+    """
+    rgba = np.asarray(img.convert('RGBA'), dtype=np.float32)
+    rgb, alpha = rgba[..., :3], rgba[..., 3]
+    # how white a pixel is: its darkest channel
+    whiteness = rgb.min(axis=-1)
+    if softness > 0:
+        keep = np.clip((threshold - whiteness) / float(softness), 0.0, 1.0)
+    else:
+        keep = (whiteness < threshold).astype(np.float32)
+
+    partial = (keep > 0) & (keep < 1)
+    if partial.any():
+        k = keep[partial][:, None]
+        rgb[partial] = np.clip((rgb[partial] - 255.0 * (1.0 - k)) / k, 0, 255)
+    rgb[keep == 0] = 255.0
+    out = np.dstack([rgb, alpha * keep])
+    return Image.fromarray(np.rint(out).astype(np.uint8), 'RGBA')
+
+
+def remove_white_background_bytes(data: bytes, threshold: int = 240, softness: int = 0) -> bytes:
+    """remove_white_background() for encoded image bytes; returns a PNG."""
+    img = remove_white_background(Image.open(io.BytesIO(data)), threshold, softness)
+    buf = io.BytesIO()
+    img.save(buf, 'PNG', optimize=True)
+    return buf.getvalue()
@@ -0,0 +1,90 @@
+"""SQL statement counting, to catch N+1 query regressions.
+
+- `count_queries()` is a context manager for tests and scripts:
+
+      with count_queries() as counter:
+          client.get('/articles')
+      assert counter.count <= 3
+
+- `install_query_budget(app)` checks every request against
+  app.config['SQL_QUERY_BUDGET'] (env var SQL_QUERY_BUDGET). Over budget, the
+  request fails with AssertionError in debug/testing and logs a warning otherwise.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def record(self, statement):
+        self.count += 1
+        self.statements.append(statement)
+
+
+def _active_counters():
+    if not hasattr(_local, 'counters'):
+        _local.counters = []
+    return _local.counters
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters():
+        counter.record(statement)
+    if has_request_context():
+        counter = g.get('_sql_query_counter')
+        if counter is not None:
+            counter.record(statement)
+
+
+def _install_listener():
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements executed by this thread inside the block."""
+    _install_listener()
+    counter = QueryCounter()
+    _active_counters().append(counter)
+    try:
+        yield counter
+    finally:
+        _active_counters().remove(counter)
+
+
+def install_query_budget(app):
+    """Enforce app.config['SQL_QUERY_BUDGET'] statements per request (no-op if unset)."""
+    budget = app.config.get('SQL_QUERY_BUDGET')
+    if not budget:
+        return
+    budget = int(budget)
+    _install_listener()
+
+    @app.before_request
+    def _start_query_budget():
+        g._sql_query_counter = QueryCounter()
+
+    @app.after_request
+    def _check_query_budget(response):
+        counter = g.pop('_sql_query_counter', None)
+        if counter is None or counter.count <= budget:
+            return response
+        message = (f'{request.method} {request.path} ran {counter.count} SQL statements '
+                   f'(budget {budget})')
+        if app.debug or app.testing:
+            raise AssertionError(message + ':\n' + '\n'.join(counter.statements))
+        logger.warning(message)
+        return response
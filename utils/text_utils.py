@@ -0,0 +1,64 @@
+import re
+import sqlite3
+import unicodedata
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def normalize_text(s: str) -> str:
+    """Lowercase a string and strip its diacritics (accent-insensitive comparisons)."""
+    if not s:
+        return ''
+    # decompose unicode characters and remove diacritics
+    nfkd = unicodedata.normalize('NFD', s)
+    without_accents = ''.join([c for c in nfkd if not unicodedata.combining(c)])
+    return without_accents.lower()
+
+
+def slugify(s: str) -> str:
+    """Convert a string into a URL-friendly slug:
+    - remove diacritics
+    - lowercase
+    - replace non-alphanumeric groups with a single hyphen
+    - trim leading/trailing hyphens
+    """
+    if not s:
+        return ''
+    lowered = normalize_text(s)
+    # replace any sequence of non-alphanumeric characters with a hyphen
+    slug = re.sub(r'[^a-z0-9]+', '-', lowered)
+    slug = slug.strip('-')
+    return slug
+
+
+def make_excerpt(s: str, max_chars: int = 280) -> str:
+    """Plain-text preview: collapse whitespace and cut on a word boundary."""
+    if not s:
+        return ''
+    collapsed = ' '.join(s.split())
+    if len(collapsed) <= max_chars:
+        return collapsed
+    cut = collapsed[:max_chars].rsplit(' ', 1)[0]
+    return cut.rstrip('.,;:') + '…'
+
+
+def reading_time_minutes(s: str, words_per_minute: int = 200) -> int:
+    """Estimated reading time in whole minutes (at least 1)."""
+    words = len(s.split()) if s else 0
+    return max(1, -(-words // words_per_minute))
+
+
+def _register_on_connect(dbapi_connection, connection_record):
+    # Expose the Python helpers to SQLite so filters can run inside the query
+    # (e.g. WHERE fold_text(article.tag) = :tag) instead of over loaded rows.
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    dbapi_connection.create_function('fold_text', 1, normalize_text, deterministic=True)
+    dbapi_connection.create_function('slugify', 1, slugify, deterministic=True)
+
+
+def register_sqlite_functions():
+    """Register fold_text()/slugify() on every new SQLite connection (idempotent)."""
+    if not event.contains(Engine, 'connect', _register_on_connect):
+        event.listen(Engine, 'connect', _register_on_connect)